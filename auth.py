@@ -1,6 +1,7 @@
 import streamlit as st
 from datetime import datetime
 import base64
+from social import SocialManager
 
 class AuthManager:
     def __init__(self, db_manager):
@@ -93,10 +94,15 @@ class AuthManager:
     
     def update_profile(self, user_id, display_name, bio):
         """Update user profile"""
-        return self.db.execute_query("""
+        updated = self.db.execute_query("""
             UPDATE users SET display_name = %s, bio = %s
             WHERE user_id = %s
         """, (display_name, bio, user_id), fetch=False)
+        
+        if updated:
+            # Posts carry a copy of the author's name for the feed
+            SocialManager(self.db).sync_post_authors(user_id)
+        return updated
     
     def update_profile_photo(self, user_id, photo_data):
         """Update user profile photo"""
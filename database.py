@@ -1,6 +1,9 @@
 import os
+import csv
+import io
 import psycopg2
 from psycopg2 import pool
+from psycopg2.extras import RealDictCursor, execute_values
 import pandas as pd
 import bcrypt
 import secrets
@@ -8,13 +11,98 @@ import time
 import re
 import logging
 import json
+import threading
+import weakref
+from collections import deque
 from typing import Optional, Dict, Any, List, Tuple
 
 class DatabaseSecurityError(Exception):
     """Custom exception for database security violations"""
     pass
 
+class BatchedInsertQueue:
+    """Buffers rows for one INSERT ... VALUES %s statement and writes them in
+    batches from a daemon thread, for fire-and-forget writes such as audit logs.
+    """
+    
+    def __init__(self, insert_query: str, name: str = "batched-insert",
+                 flush_interval: float = 1.0, batch_size: int = 500, max_size: int = 10000):
+        self.insert_query = insert_query
+        self.name = name
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.max_size = max_size
+        self.dropped = 0
+        self.failed = 0
+        self.logger = logging.getLogger(__name__)
+        self._rows = deque()
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._db = None
+        self._thread = None
+    
+    def put(self, db_manager, row: Tuple):
+        """Queue one row; rows should carry their own timestamp so batching keeps the timeline"""
+        with self._lock:
+            self._db = db_manager
+            if len(self._rows) >= self.max_size:
+                self.dropped += 1
+                self.logger.warning(f"{self.name} queue full, dropped {self.dropped} rows")
+                return
+            self._rows.append(row)
+            pending = len(self._rows)
+            
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name=f"{self.name}-flush", daemon=True)
+                self._thread.start()
+        
+        if pending >= self.batch_size:
+            self._wakeup.set()
+    
+    def _run(self):
+        while True:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            self.flush()
+    
+    def flush(self):
+        """Write all queued rows in one batched INSERT, falling back to row-by-row on failure"""
+        with self._lock:
+            if not self._rows:
+                return
+            rows = list(self._rows)
+            self._rows.clear()
+            db_manager = self._db
+        
+        try:
+            if db_manager.execute_values(self.insert_query, rows, page_size=self.batch_size):
+                return
+        except Exception as e:
+            self.logger.error(f"Failed to flush {self.name} rows: {e}")
+        
+        # One bad row (e.g. a deleted user_id) fails the whole batch; retry row
+        # by row so only the rows that really can't be written are lost
+        failed = 0
+        for row in rows:
+            try:
+                if not db_manager.execute_values(self.insert_query, [row]):
+                    failed += 1
+            except Exception:
+                failed += 1
+        
+        if failed:
+            with self._lock:
+                self.failed += failed
+                total = self.failed
+            self.logger.error(f"Failed to write {failed} of {len(rows)} {self.name} rows ({total} in total)")
+
 class DatabaseManager:
+    # One pool per process, shared by the DatabaseManager each rerun builds
+    _pools = {}
+    _pool_lock = threading.Lock()
+    # Names of server-side prepared statements per pooled connection
+    _prepared = weakref.WeakKeyDictionary()
+    
     def __init__(self):
         self.logger = logging.getLogger(__name__)
         self.connection_params = {
@@ -36,11 +124,16 @@ class DatabaseManager:
 
     def _init_connection_pool(self):
         """Initialize connection pool for better performance"""
+        key = tuple(sorted(self.connection_params.items()))
         try:
-            self.connection_pool = psycopg2.pool.SimpleConnectionPool(
-                1, 20, **self.connection_params
-            )
-            self.logger.info("Database connection pool initialized")
+            with self._pool_lock:
+                if key not in self._pools:
+                    # Threaded pool: background flushers and concurrent readers share it
+                    self._pools[key] = psycopg2.pool.ThreadedConnectionPool(
+                        5, 25, **self.connection_params
+                    )
+                    self.logger.info("Database connection pool initialized")
+            self.connection_pool = self._pools[key]
         except Exception as e:
             self.logger.error(f"Failed to create connection pool: {e}")
 
@@ -332,31 +425,47 @@ class DatabaseManager:
                 sanitized.append(param)
         return tuple(sanitized) if isinstance(params, tuple) else sanitized
 
-    def execute_query(self, query, params=None, fetch=True):
-        """Execute database query with security validation"""
+    def _empty_result(self, fetch=True, as_df=True):
+        """Empty/failed result in the shape the caller asked for"""
+        if not fetch:
+            return False
+        return pd.DataFrame() if as_df else []
+
+    def execute_query(self, query, params=None, fetch=True, as_df=True):
+        """Execute database query with security validation
+
+        With as_df=False, fetched rows come back as a list of dicts instead
+        of a DataFrame, which is much cheaper for small lookups.
+        """
         if not self._validate_query(query):
             self.logger.error("Query blocked by security validation")
-            return pd.DataFrame() if fetch else False
+            return self._empty_result(fetch, as_df)
         
         if params:
             params = self._sanitize_params(params)
         
         conn = self.get_direct_connection()
         if not conn:
-            return pd.DataFrame() if fetch else False
+            return self._empty_result(fetch, as_df)
         
         try:
-            cursor = conn.cursor()
+            cursor = conn.cursor() if as_df else conn.cursor(cursor_factory=RealDictCursor)
             cursor.execute("SET statement_timeout = %s", (self.max_query_time * 1000,))
             cursor.execute(query, params)
             
             if fetch:
+                rows = cursor.fetchmany(self.max_result_rows) if cursor.description else []
+                # Commit so INSERT/UPDATE ... RETURNING writes are not rolled back by the pool
+                conn.commit()
+                
+                if not as_df:
+                    return rows
+                
                 if cursor.description:
                     columns = [desc[0] for desc in cursor.description]
-                    result = cursor.fetchmany(self.max_result_rows)
                     
-                    if result:
-                        df = pd.DataFrame(result, columns=columns)
+                    if rows:
+                        df = pd.DataFrame(rows, columns=columns)
                         return df
                     else:
                         return pd.DataFrame(columns=columns)
@@ -373,7 +482,212 @@ class DatabaseManager:
                     conn.rollback()
                 except:
                     pass
-            return pd.DataFrame() if fetch else False
+            return self._empty_result(fetch, as_df)
+        finally:
+            self.return_connection(conn)
+
+    def fetch_one(self, query, params=None):
+        """Execute a query and return only its first row as a tuple, or None"""
+        if not self._validate_query(query):
+            self.logger.error("Query blocked by security validation")
+            return None
+        
+        if params:
+            params = self._sanitize_params(params)
+        
+        conn = self.get_direct_connection()
+        if not conn:
+            return None
+        
+        try:
+            cursor = conn.cursor()
+            cursor.execute("SET statement_timeout = %s", (self.max_query_time * 1000,))
+            cursor.execute(query, params)
+            row = cursor.fetchone() if cursor.description else None
+            conn.commit()
+            return row
+                
+        except Exception as e:
+            self.logger.error(f"Database operation failed: {str(e)}")
+            if conn:
+                try:
+                    conn.rollback()
+                except:
+                    pass
+            return None
+        finally:
+            self.return_connection(conn)
+
+    def fetch_one_scalar(self, query, params=None):
+        """Execute a query and return the first column of the first row, or None"""
+        row = self.fetch_one(query, params)
+        return row[0] if row else None
+
+    def execute_prepared(self, name, query, params=None, scalar=False, one=False):
+        """Run a hot statement through a server-side prepared statement.
+        
+        query uses the usual %s placeholders; it is PREPAREd once per pooled
+        connection under name and then EXECUTEd, so the server skips parsing
+        and planning on repeat calls. Returns True/False; with scalar=True the
+        first column of the first row, and with one=True the first row as a
+        dict ({} when there is no row, None on failure).
+        """
+        failed = None if scalar or one else False
+        if not self._validate_query(query):
+            self.logger.error("Query blocked by security validation")
+            return failed
+        
+        params = self._sanitize_params(params) if params else ()
+        
+        conn = self.get_direct_connection()
+        if not conn:
+            return failed
+        
+        try:
+            prepared = self._prepared.setdefault(conn, set())
+            cursor = conn.cursor(cursor_factory=RealDictCursor) if one else conn.cursor()
+            cursor.execute("SET statement_timeout = %s", (self.max_query_time * 1000,))
+            if name not in prepared:
+                counter = iter(range(1, len(params) + 1))
+                body = re.sub(r'%s', lambda _: f"${next(counter)}", query)
+                cursor.execute(f"PREPARE {name} AS {body}")
+                prepared.add(name)
+            
+            placeholders = ", ".join(["%s"] * len(params))
+            cursor.execute(f"EXECUTE {name}({placeholders})" if params else f"EXECUTE {name}", params)
+            row = cursor.fetchone() if (scalar or one) and cursor.description else None
+            conn.commit()
+            if one:
+                return dict(row) if row else {}
+            if scalar:
+                return row[0] if row else None
+            return True
+                
+        except Exception as e:
+            self.logger.error(f"Database operation failed: {str(e)}")
+            try:
+                conn.rollback()
+                # Start this connection's statement set over rather than guess what survived
+                conn.cursor().execute("DEALLOCATE ALL")
+                conn.commit()
+            except:
+                pass
+            self._prepared.pop(conn, None)
+            return failed
+        finally:
+            self.return_connection(conn)
+
+    def copy_rows(self, setup_sql, copy_sql, rows, finish_sql):
+        """Bulk-load rows with COPY ... FROM STDIN (CSV) in one transaction.
+        
+        setup_sql typically creates a temporary staging table, copy_sql is the
+        COPY statement for it and finish_sql moves the staged rows into place.
+        """
+        if not rows:
+            return True
+        
+        for query in (setup_sql, finish_sql):
+            if not self._validate_query(query):
+                self.logger.error("Query blocked by security validation")
+                return False
+        
+        buffer = io.StringIO()
+        csv.writer(buffer).writerows(self._sanitize_params(row) for row in rows)
+        buffer.seek(0)
+        
+        conn = self.get_direct_connection()
+        if not conn:
+            return False
+        
+        try:
+            cursor = conn.cursor()
+            cursor.execute("SET statement_timeout = %s", (self.max_query_time * 1000,))
+            cursor.execute(setup_sql)
+            cursor.copy_expert(copy_sql, buffer)
+            cursor.execute(finish_sql)
+            conn.commit()
+            return True
+                
+        except Exception as e:
+            self.logger.error(f"Database bulk copy failed: {str(e)}")
+            if conn:
+                try:
+                    conn.rollback()
+                except:
+                    pass
+            return False
+        finally:
+            self.return_connection(conn)
+
+    def read_via_copy(self, query, params=None, parse_dates=None):
+        """Run a SELECT through COPY ... TO STDOUT (CSV) and parse it with pandas.
+        
+        For large result sets: rows are parsed by pandas' C reader instead of
+        being built cell by cell as Python objects. The row cap of
+        execute_query does not apply, so the query should carry its own LIMIT.
+        """
+        if not self._validate_query(query):
+            self.logger.error("Query blocked by security validation")
+            return pd.DataFrame()
+        
+        if params:
+            params = self._sanitize_params(params)
+        
+        conn = self.get_direct_connection()
+        if not conn:
+            return pd.DataFrame()
+        
+        try:
+            cursor = conn.cursor()
+            cursor.execute("SET statement_timeout = %s", (self.max_query_time * 1000,))
+            select_sql = cursor.mogrify(query, params).decode()
+            buffer = io.StringIO()
+            cursor.copy_expert(f"COPY ({select_sql}) TO STDOUT WITH (FORMAT CSV, HEADER)", buffer)
+            conn.commit()
+            buffer.seek(0)
+            return pd.read_csv(buffer, parse_dates=parse_dates)
+                
+        except Exception as e:
+            self.logger.error(f"Database bulk read failed: {str(e)}")
+            if conn:
+                try:
+                    conn.rollback()
+                except:
+                    pass
+            return pd.DataFrame()
+        finally:
+            self.return_connection(conn)
+
+    def execute_values(self, query, rows, page_size=100, template=None):
+        """Execute a multi-row INSERT/UPDATE with a single VALUES %s placeholder"""
+        if not rows:
+            return True
+        
+        if not self._validate_query(query):
+            self.logger.error("Query blocked by security validation")
+            return False
+        
+        rows = [self._sanitize_params(row) for row in rows]
+        
+        conn = self.get_direct_connection()
+        if not conn:
+            return False
+        
+        try:
+            cursor = conn.cursor()
+            cursor.execute("SET statement_timeout = %s", (self.max_query_time * 1000,))
+            execute_values(cursor, query, rows, template=template, page_size=page_size)
+            conn.commit()
+            return True
+                
+        except Exception as e:
+            self.logger.error(f"Database batch operation failed: {str(e)}")
+            if conn:
+                try:
+                    conn.rollback()
+                except:
+                    pass
+            return False
         finally:
             self.return_connection(conn)
 
@@ -507,6 +821,12 @@ class DatabaseManager:
             "ALTER TABLE trades ADD COLUMN IF NOT EXISTS trade_session_id UUID DEFAULT gen_random_uuid()",
             "ALTER TABLE user_achievements ADD COLUMN IF NOT EXISTS rarity VARCHAR(20) DEFAULT 'Common'",
             "ALTER TABLE user_achievements ADD COLUMN IF NOT EXISTS points INTEGER DEFAULT 0",
+            # Trigram indexes so substring ILIKE searches on users are index-bound
+            "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+            "CREATE INDEX IF NOT EXISTS users_username_trgm ON users USING gin (username gin_trgm_ops)",
+            "CREATE INDEX IF NOT EXISTS users_email_trgm ON users USING gin (email gin_trgm_ops)",
+            # Unused prefix index from an earlier migration; only added write cost
+            "DROP INDEX IF EXISTS users_username_lower_prefix",
         ]
         
         for migration in migrations:
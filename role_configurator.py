@@ -434,7 +434,44 @@ class RoleConfigurator:
         except Exception as e:
             print(f"Error getting role permissions: {str(e)}")
             return set()
-    
+
+    def get_permission_counts(self) -> Dict[int, int]:
+        """Get the effective permission count for every role in one query"""
+        try:
+            result = self.db.execute_query("""
+                WITH RECURSIVE role_inheritance AS (
+                    -- Base case: every role maps to itself
+                    SELECT role_id AS base_role_id, role_id, parent_role_id, inherit_permissions
+                    FROM role_hierarchy
+
+                    UNION ALL
+
+                    -- Recursive case: parent roles if inheritance is enabled
+                    SELECT ri.base_role_id, rh.role_id, rh.parent_role_id, rh.inherit_permissions
+                    FROM role_hierarchy rh
+                    JOIN role_inheritance ri ON rh.role_id = ri.parent_role_id
+                    WHERE ri.inherit_permissions = TRUE
+                )
+                SELECT ri.base_role_id AS role_id, COUNT(DISTINCT rpm.permission_id) AS permission_count
+                FROM role_inheritance ri
+                JOIN role_permissions_mapping rpm ON ri.role_id = rpm.role_id
+                WHERE rpm.granted = TRUE
+                AND (rpm.expires_at IS NULL OR rpm.expires_at > CURRENT_TIMESTAMP)
+                GROUP BY ri.base_role_id
+            """)
+
+            if result is not None:
+                if hasattr(result, 'empty') and not result.empty:
+                    return dict(zip(result['role_id'].tolist(), result['permission_count'].tolist()))
+                elif isinstance(result, list):
+                    return {row[0]: row[1] for row in result}
+
+            return {}
+
+        except Exception as e:
+            print(f"Error getting permission counts: {str(e)}")
+            return {}
+
     def create_role(self, role_data: Dict[str, Any]) -> Optional[int]:
         """Create a new role with specified configuration"""
         try:
@@ -342,30 +342,25 @@ def render_role_management_dashboard(role_configurator) -> None:
     
     if roles_data:
         # Level distribution
-        level_counts = {}
-        for role in roles_data:
-            level = role.get('level', 0)
-            level_counts[f"Level {level}"] = level_counts.get(f"Level {level}", 0) + 1
-        
+        levels = pd.Series([role.get('level', 0) for role in roles_data], name='level')
+        level_counts = levels.value_counts().sort_index()
+
         col1, col2 = st.columns(2)
-        
+
         with col1:
             fig_levels = px.pie(
-                values=list(level_counts.values()),
-                names=list(level_counts.keys()),
+                values=level_counts.values,
+                names=[f"Level {level}" for level in level_counts.index],
                 title="Roles by Hierarchy Level"
             )
             st.plotly_chart(fig_levels, use_container_width=True)
         
         with col2:
             # Permission distribution by role
-            perm_counts = []
-            role_names = []
-            
-            for role in roles_data[:10]:  # Top 10 roles
-                permissions = role_configurator.get_role_permissions(role['role_id'])
-                perm_counts.append(len(permissions))
-                role_names.append(role['display_name'])
+            counts = role_configurator.get_permission_counts()
+            top_roles = roles_data[:10]  # Top 10 roles
+            perm_counts = [counts.get(role['role_id'], 0) for role in top_roles]
+            role_names = [role['display_name'] for role in top_roles]
             
             if perm_counts:
                 fig_perms = px.bar(
@@ -1,81 +1,129 @@
+from __future__ import annotations
+
+import atexit
 import logging
-from typing import Dict, List, Optional, Any, Set
-from datetime import datetime, timedelta
-import json
+import threading
+from collections import OrderedDict
+from time import monotonic
+from typing import Dict, FrozenSet, List, Optional, Any, Set, Tuple
+from datetime import datetime, timezone
+
+from database import BatchedInsertQueue
+
+
+# All available permissions and their descriptions
+_PERMISSION_DESCRIPTIONS = {
+    # User Management
+    'users.view': 'View user profiles and information',
+    'users.edit': 'Edit user profiles and settings',
+    'users.delete': 'Delete user accounts',
+    'users.ban': 'Ban/unban users',
+    'users.promote': 'Change user roles',
+    
+    # Trading and Economy
+    'trading.basic': 'Basic trading functionality',
+    'trading.advanced': 'Advanced trading features',
+    'trading.admin': 'Administrative trading controls',
+    'currency.grant': 'Grant virtual currency to users',
+    'currency.adjust': 'Adjust user currency balances',
+    
+    # Characters and Tier Lists
+    'characters.view': 'View character tier lists',
+    'characters.edit': 'Edit character information',
+    'characters.create': 'Create new characters',
+    'characters.delete': 'Delete characters',
+    'characters.values': 'Modify character values and tiers',
+    
+    # Content Moderation
+    'content.moderate': 'Moderate user-generated content',
+    'content.delete': 'Delete inappropriate content',
+    'reports.handle': 'Handle user reports',
+    'chat.moderate': 'Moderate chat and communications',
+    
+    # Analytics and Data
+    'analytics.view': 'View analytics and statistics',
+    'analytics.export': 'Export data and reports',
+    'logs.view': 'View system logs',
+    'logs.admin': 'Access administrative logs',
+    
+    # System Administration
+    'system.settings': 'Modify system settings',
+    'system.maintenance': 'Perform system maintenance',
+    'system.backup': 'Create and manage backups',
+    'database.access': 'Direct database access',
+    
+    # Role Management
+    'roles.view': 'View roles and permissions',
+    'roles.edit': 'Edit roles and permissions',
+    'roles.create': 'Create new custom roles',
+    'roles.delete': 'Delete custom roles',
+    'roles.assign': 'Assign roles to users',
+    
+    # Achievements and Events
+    'achievements.manage': 'Manage achievements and rewards',
+    'events.create': 'Create special events',
+    'events.manage': 'Manage ongoing events',
+    
+    # Security
+    'security.audit': 'View security audit logs',
+    'security.manage': 'Manage security settings',
+    'ip.ban': 'Ban IP addresses',
+    
+    # Communication
+    'notifications.send': 'Send notifications to users',
+    'announcements.create': 'Create system announcements',
+    'messages.admin': 'Administrative messaging'
+}
+
+# Permission names only, for membership checks
+_PERMISSION_NAMES = frozenset(_PERMISSION_DESCRIPTIONS)
+
+
+# Managers are rebuilt on every Streamlit rerun, so a single module-level
+# queue is shared by all RoleManager instances
+_audit_queue = BatchedInsertQueue("""
+    INSERT INTO permission_audit 
+    (user_id, action, target_type, target_id, permission_used, success, timestamp)
+    VALUES %s
+""", name="permission-audit")
+atexit.register(_audit_queue.flush)
+
+# Whether init_role_extensions has created the effective-permissions view, the
+# role_closure table and roles.is_superuser; checked once per process
+_role_schema_state: Optional[bool] = None
+
 
 class RoleManager:
     """Advanced role and permission management system"""
     
+    # Role listing caches are shared by all instances because the app builds a
+    # new RoleManager on every rerun: (cached_at, value)
+    _roles_cache: Optional[Tuple[float, List[Dict[str, Any]]]] = None
+    _role_perms_cache: Dict[str, Tuple[float, List[str]]] = {}
+    _roles_ttl = 60  # seconds
+    
+    # Per-user permission cache, shared for the same reason: user_id -> (cached_at, permissions)
+    _perm_cache: "OrderedDict[int, Tuple[float, FrozenSet[str]]]" = OrderedDict()
+    _perm_ttl = 30  # seconds
+    _perm_cache_size = 4096
+    _perm_cache_lock = threading.Lock()
+    
+    # The lookup schema only needs creating once per process, not per instance
+    _extensions_initialized = False
+    
     def __init__(self, db_manager):
         self.db = db_manager
         self.logger = logging.getLogger(__name__)
         
-        # Define all available permissions first
-        self.ALL_PERMISSIONS = {
-            # User Management
-            'users.view': 'View user profiles and information',
-            'users.edit': 'Edit user profiles and settings',
-            'users.delete': 'Delete user accounts',
-            'users.ban': 'Ban/unban users',
-            'users.promote': 'Change user roles',
-            
-            # Trading and Economy
-            'trading.basic': 'Basic trading functionality',
-            'trading.advanced': 'Advanced trading features',
-            'trading.admin': 'Administrative trading controls',
-            'currency.grant': 'Grant virtual currency to users',
-            'currency.adjust': 'Adjust user currency balances',
-            
-            # Characters and Tier Lists
-            'characters.view': 'View character tier lists',
-            'characters.edit': 'Edit character information',
-            'characters.create': 'Create new characters',
-            'characters.delete': 'Delete characters',
-            'characters.values': 'Modify character values and tiers',
-            
-            # Content Moderation
-            'content.moderate': 'Moderate user-generated content',
-            'content.delete': 'Delete inappropriate content',
-            'reports.handle': 'Handle user reports',
-            'chat.moderate': 'Moderate chat and communications',
-            
-            # Analytics and Data
-            'analytics.view': 'View analytics and statistics',
-            'analytics.export': 'Export data and reports',
-            'logs.view': 'View system logs',
-            'logs.admin': 'Access administrative logs',
-            
-            # System Administration
-            'system.settings': 'Modify system settings',
-            'system.maintenance': 'Perform system maintenance',
-            'system.backup': 'Create and manage backups',
-            'database.access': 'Direct database access',
-            
-            # Role Management
-            'roles.view': 'View roles and permissions',
-            'roles.edit': 'Edit roles and permissions',
-            'roles.create': 'Create new custom roles',
-            'roles.delete': 'Delete custom roles',
-            'roles.assign': 'Assign roles to users',
-            
-            # Achievements and Events
-            'achievements.manage': 'Manage achievements and rewards',
-            'events.create': 'Create special events',
-            'events.manage': 'Manage ongoing events',
-            
-            # Security
-            'security.audit': 'View security audit logs',
-            'security.manage': 'Manage security settings',
-            'ip.ban': 'Ban IP addresses',
-            
-            # Communication
-            'notifications.send': 'Send notifications to users',
-            'announcements.create': 'Create system announcements',
-            'messages.admin': 'Administrative messaging'
-        }
+        # Shared module-level data, not a per-instance copy
+        self.ALL_PERMISSIONS = _PERMISSION_DESCRIPTIONS
+        self._permission_categories = self._build_permission_categories()
         
         # Initialize tables only - skip automatic role setup to prevent conflicts
         self.init_role_tables()
+        
+        if not RoleManager._extensions_initialized:
+            RoleManager._extensions_initialized = self.init_role_extensions()
 
     def init_role_tables(self):
         """Initialize role management tables"""
@@ -89,7 +137,7 @@ class RoleManager:
                     permission_id SERIAL PRIMARY KEY,
                     permission_name VARCHAR(100) UNIQUE NOT NULL,
                     description TEXT,
-                    category VARCHAR(50),
+                    category VARCHAR(50) GENERATED ALWAYS AS (split_part(permission_name, '.', 1)) STORED,
                     is_system BOOLEAN DEFAULT TRUE
                 )
             """, fetch=False)
@@ -165,6 +213,167 @@ class RoleManager:
         except Exception as e:
             self.logger.error(f"Failed to initialize role tables: {e}")
 
+    def init_role_extensions(self) -> bool:
+        """Add the lookup schema on top of the existing role tables.
+        
+        Unlike init_role_tables this only adds or converts objects (columns,
+        constraint, closure table, effective-permissions view, indexes) and
+        each step is idempotent, so it is safe to run against the live tables.
+        Returns whether the effective-permissions view is in place.
+        """
+        try:
+            # Derive permissions.category from permission_name. A plain column
+            # can't be altered into a generated one, so swap it out once.
+            self.db.execute_query("""
+                DO $$ BEGIN
+                    IF EXISTS (
+                        SELECT 1 FROM information_schema.columns
+                        WHERE table_name = 'permissions' AND column_name = 'category'
+                        AND is_generated = 'NEVER'
+                    ) THEN
+                        ALTER TABLE permissions DROP COLUMN category;
+                    END IF;
+                    ALTER TABLE permissions ADD COLUMN IF NOT EXISTS category VARCHAR(50)
+                        GENERATED ALWAYS AS (split_part(permission_name, '.', 1)) STORED;
+                END $$
+            """, fetch=False)
+            
+            # Enforce the minimum role name length in the database as well
+            self.db.execute_query("""
+                DO $$ BEGIN
+                    ALTER TABLE roles ADD CONSTRAINT roles_name_length CHECK (length(role_name) >= 2);
+                EXCEPTION WHEN duplicate_object THEN NULL;
+                END $$
+            """, fetch=False)
+            
+            # Superuser roles implicitly hold every permission without role_permissions rows
+            self.db.execute_query("""
+                ALTER TABLE roles ADD COLUMN IF NOT EXISTS is_superuser BOOLEAN DEFAULT FALSE
+            """, fetch=False)
+            
+            # Transitive closure of role_hierarchy (strict ancestors only),
+            # rebuilt by rebuild_role_closure
+            self.db.execute_query("""
+                CREATE TABLE IF NOT EXISTS role_closure (
+                    ancestor_id INTEGER REFERENCES roles(role_id) ON DELETE CASCADE,
+                    descendant_id INTEGER REFERENCES roles(role_id) ON DELETE CASCADE,
+                    PRIMARY KEY (descendant_id, ancestor_id)
+                )
+            """, fetch=False)
+            
+            # Flattened user -> permission lookup including inherited grants; expiry
+            # is kept as a column and filtered at read time so expirations never
+            # wait on a refresh
+            view_created = self.db.execute_query("""
+                CREATE MATERIALIZED VIEW IF NOT EXISTS user_effective_permissions AS
+                SELECT ur.user_id, p.permission_name,
+                       CASE WHEN bool_or(ur.expires_at IS NULL) THEN NULL
+                            ELSE MAX(ur.expires_at) END AS expires_at
+                FROM user_roles ur
+                JOIN roles r ON ur.role_id = r.role_id
+                JOIN (
+                    SELECT role_id AS descendant_id, role_id AS ancestor_id FROM roles
+                    UNION ALL
+                    SELECT descendant_id, ancestor_id FROM role_closure
+                ) granting ON granting.descendant_id = r.role_id
+                JOIN roles gr ON granting.ancestor_id = gr.role_id
+                JOIN role_permissions rp ON gr.role_id = rp.role_id
+                JOIN permissions p ON rp.permission_id = p.permission_id
+                WHERE ur.is_active = TRUE AND r.is_active = TRUE AND gr.is_active = TRUE
+                GROUP BY ur.user_id, p.permission_name
+            """, fetch=False)
+            
+            # Unique index required for REFRESH MATERIALIZED VIEW CONCURRENTLY
+            view_indexed = self.db.execute_query("""
+                CREATE UNIQUE INDEX IF NOT EXISTS idx_user_effective_permissions
+                ON user_effective_permissions(user_id, permission_name)
+            """, fetch=False)
+            
+            indexes = [
+                """CREATE INDEX IF NOT EXISTS idx_user_roles_expiring ON user_roles(expires_at)
+                   WHERE is_active AND expires_at IS NOT NULL""",
+                "CREATE INDEX IF NOT EXISTS idx_permissions_category ON permissions(category)",
+                # Audit log tab: newest-first range scans, with and without an action filter
+                "CREATE INDEX IF NOT EXISTS permission_audit_ts_desc ON permission_audit(timestamp DESC, action)",
+                "CREATE INDEX IF NOT EXISTS permission_audit_action_ts ON permission_audit(action, timestamp DESC)",
+                # Covering indexes so get_user_max_priority is answered by index-only scans
+                """CREATE INDEX IF NOT EXISTS idx_user_roles_active_lookup ON user_roles(user_id)
+                   INCLUDE (role_id, expires_at, is_active) WHERE is_active""",
+                """CREATE INDEX IF NOT EXISTS idx_roles_active_priority ON roles(role_id)
+                   INCLUDE (priority, is_active) WHERE is_active"""
+            ]
+            
+            for index in indexes:
+                self.db.execute_query(index, fetch=False)
+            
+            if not (view_created and view_indexed):
+                return False
+            
+            # Let _role_schema_ready() see the new view even if it was checked earlier
+            global _role_schema_state
+            _role_schema_state = None
+            
+            self.rebuild_role_closure()
+            
+            self.logger.info("Role lookup schema initialized")
+            return True
+            
+        except Exception as e:
+            self.logger.error(f"Failed to initialize role lookup schema: {e}")
+            return False
+
+    @staticmethod
+    def _compute_role_closure(edges: List[Tuple[int, int]]) -> Dict[int, Set[int]]:
+        """Warshall's algorithm over (parent, child) edges: role -> all of its ancestors"""
+        ancestors: Dict[int, Set[int]] = {}
+        for parent, child in edges:
+            ancestors.setdefault(parent, set())
+            ancestors.setdefault(child, set()).add(parent)
+        
+        roles = list(ancestors)
+        for k in roles:
+            for i in roles:
+                if k in ancestors[i]:
+                    ancestors[i] |= ancestors[k]
+        
+        return ancestors
+
+    def rebuild_role_closure(self):
+        """Recompute role_closure from role_hierarchy; call whenever the hierarchy changes"""
+        try:
+            result = self.db.execute_query("""
+                SELECT parent_role_id, child_role_id
+                FROM role_hierarchy
+                WHERE parent_role_id IS NOT NULL AND child_role_id IS NOT NULL
+            """, as_df=False)
+            
+            closure = self._compute_role_closure(
+                [(row['parent_role_id'], row['child_role_id']) for row in result]
+            )
+            pairs = [(ancestor, descendant)
+                     for descendant, ancestors in closure.items()
+                     for ancestor in ancestors if ancestor != descendant]
+            ancestor_ids = [ancestor for ancestor, _ in pairs]
+            descendant_ids = [descendant for _, descendant in pairs]
+            
+            # Drop stale pairs, then add new ones, so readers never see an empty closure
+            self.db.execute_query("""
+                DELETE FROM role_closure
+                WHERE (ancestor_id, descendant_id) NOT IN (
+                    SELECT unnest(%s::int[]), unnest(%s::int[])
+                )
+            """, (ancestor_ids, descendant_ids), fetch=False)
+            self.db.execute_query("""
+                INSERT INTO role_closure (ancestor_id, descendant_id)
+                SELECT unnest(%s::int[]), unnest(%s::int[])
+                ON CONFLICT DO NOTHING
+            """, (ancestor_ids, descendant_ids), fetch=False)
+            
+            self.refresh_effective_permissions()
+            
+        except Exception as e:
+            self.logger.error(f"Failed to rebuild role closure: {e}")
+
     def _setup_default_roles(self):
         """Setup default system roles and permissions"""
         try:
@@ -234,6 +443,8 @@ class RoleManager:
             
             for role_data in default_roles:
                 self._create_default_role(role_data)
+            self._invalidate_roles()
+            self.refresh_effective_permissions()
                 
             self.logger.info("Default roles and permissions setup completed")
             
@@ -243,27 +454,15 @@ class RoleManager:
     def _insert_permissions(self):
         """Insert all permissions into the database"""
         try:
-            # Check if permissions already exist
-            result = self.db.execute_query("SELECT COUNT(*) as count FROM permissions")
-            if not result.empty and result.iloc[0]['count'] > 0:
-                return
-            
-            # Group permissions by category
-            categories = {}
-            for perm, desc in self.ALL_PERMISSIONS.items():
-                category = perm.split('.')[0]
-                if category not in categories:
-                    categories[category] = []
-                categories[category].append((perm, desc))
-            
-            # Insert permissions
-            for category, perms in categories.items():
-                for perm_name, description in perms:
-                    self.db.execute_query("""
-                        INSERT INTO permissions (permission_name, description, category)
-                        VALUES (%s, %s, %s)
-                        ON CONFLICT (permission_name) DO NOTHING
-                    """, (perm_name, description, category), fetch=False)
+            # category is generated by the database from permission_name
+            rows = list(self.ALL_PERMISSIONS.items())
+            
+            # ON CONFLICT keeps this idempotent, so no existence check is needed
+            self.db.execute_values("""
+                INSERT INTO permissions (permission_name, description)
+                VALUES %s
+                ON CONFLICT (permission_name) DO NOTHING
+            """, rows)
                     
         except Exception as e:
             self.logger.error(f"Failed to insert permissions: {e}")
@@ -271,11 +470,13 @@ class RoleManager:
     def _create_default_role(self, role_data):
         """Create a default role with its permissions"""
         try:
-            # Insert role
-            result = self.db.execute_query("""
-                INSERT INTO roles (role_name, display_name, description, color, priority, is_system, created_by)
-                VALUES (%s, %s, %s, %s, %s, %s, %s)
-                ON CONFLICT (role_name) DO NOTHING
+            is_superuser = role_data['permissions'] == 'all'
+            
+            # Insert role (or refresh the superuser flag on an existing one)
+            role_id = self.db.fetch_one_scalar("""
+                INSERT INTO roles (role_name, display_name, description, color, priority, is_system, is_superuser, created_by)
+                VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+                ON CONFLICT (role_name) DO UPDATE SET is_superuser = EXCLUDED.is_superuser
                 RETURNING role_id
             """, (
                 role_data['name'],
@@ -284,47 +485,36 @@ class RoleManager:
                 role_data['color'],
                 role_data['priority'],
                 True,
+                is_superuser,
                 1  # created_by system user
             ))
             
-            if result.empty:
-                # Role already exists, get its ID
-                result = self.db.execute_query(
-                    "SELECT role_id FROM roles WHERE role_name = %s",
-                    (role_data['name'],)
-                )
-            
-            if not result.empty:
-                role_id = int(result.iloc[0]['role_id'])  # Convert numpy.int64 to Python int
-                
-                # Assign permissions to role
-                permissions_to_assign = role_data['permissions']
-                if permissions_to_assign == 'all':
-                    permissions_to_assign = list(self.ALL_PERMISSIONS.keys())
-                
-                for perm_name in permissions_to_assign:
-                    perm_result = self.db.execute_query(
-                        "SELECT permission_id FROM permissions WHERE permission_name = %s",
-                        (perm_name,)
-                    )
-                    
-                    if not perm_result.empty:
-                        perm_id = int(perm_result.iloc[0]['permission_id'])  # Convert numpy.int64 to Python int
-                        # Check if permission assignment already exists to avoid foreign key errors
-                        existing_assignment = self.db.execute_query("""
-                            SELECT id FROM role_permissions 
-                            WHERE role_id = %s AND permission_id = %s
-                        """, (role_id, perm_id))
-                        
-                        if existing_assignment.empty:
-                            self.db.execute_query("""
-                                INSERT INTO role_permissions (role_id, permission_id, granted_by)
-                                VALUES (%s, %s, %s)
-                            """, (role_id, perm_id, 1), fetch=False)
+            # Superuser roles need no per-permission rows
+            if role_id is not None and not is_superuser:
+                self._grant_permissions(role_id, role_data['permissions'], 1)
                         
         except Exception as e:
             self.logger.error(f"Failed to create default role {role_data['name']}: {e}")
 
+    def _grant_permissions(self, role_id: int, permission_names: List[str], granted_by: int) -> int:
+        """Grant permissions to a role in one round trip; returns the number of new grants"""
+        if not permission_names:
+            return 0
+        
+        inserted = self.db.fetch_one_scalar("""
+            WITH granted AS (
+                INSERT INTO role_permissions (role_id, permission_id, granted_by)
+                SELECT %s, permission_id, %s
+                FROM permissions
+                WHERE permission_name = ANY(%s)
+                ON CONFLICT (role_id, permission_id) DO NOTHING
+                RETURNING 1
+            )
+            SELECT COUNT(*) FROM granted
+        """, (role_id, granted_by, list(permission_names)))
+        
+        return inserted or 0
+
     def create_custom_role(self, creator_id: int, role_name: str, display_name: str, 
                           description: str, permissions: List[str], color: str = '#808080',
                           priority: int = 30) -> Dict[str, Any]:
@@ -334,56 +524,35 @@ class RoleManager:
             if not self.has_permission(creator_id, 'roles.create'):
                 return {'success': False, 'error': 'Insufficient permissions to create roles'}
             
-            # Validate role name
+            # Validate role name locally (mirrors the roles_name_length CHECK)
             if not role_name or len(role_name) < 2:
                 return {'success': False, 'error': 'Role name must be at least 2 characters'}
             
-            # Check if role already exists
-            existing = self.db.execute_query(
-                "SELECT role_id FROM roles WHERE role_name = %s",
-                (role_name,)
-            )
-            if not existing.empty:
-                return {'success': False, 'error': 'Role name already exists'}
-            
             # Validate permissions
-            valid_perms = []
-            for perm in permissions:
-                if perm in self.ALL_PERMISSIONS:
-                    valid_perms.append(perm)
+            valid_perms = [perm for perm in permissions if perm in _PERMISSION_NAMES]
             
-            # Create role
-            result = self.db.execute_query("""
+            # Create role; the unique constraint doubles as the existence check
+            role_id = self.db.fetch_one_scalar("""
                 INSERT INTO roles (role_name, display_name, description, color, priority, is_system, created_by)
                 VALUES (%s, %s, %s, %s, %s, %s, %s)
+                ON CONFLICT (role_name) DO NOTHING
                 RETURNING role_id
             """, (role_name, display_name, description, color, priority, False, creator_id))
             
-            if result.empty:
-                return {'success': False, 'error': 'Failed to create role'}
-            
-            role_id = int(result.iloc[0]['role_id'])  # Convert numpy.int64 to Python int
+            if role_id is None:
+                return {'success': False, 'error': 'Role name already exists'}
             
             # Assign permissions
-            for perm_name in valid_perms:
-                perm_result = self.db.execute_query(
-                    "SELECT permission_id FROM permissions WHERE permission_name = %s",
-                    (perm_name,)
-                )
-                
-                if not perm_result.empty:
-                    perm_id = int(perm_result.iloc[0]['permission_id'])  # Convert numpy.int64 to Python int
-                    self.db.execute_query("""
-                        INSERT INTO role_permissions (role_id, permission_id, granted_by)
-                        VALUES (%s, %s, %s)
-                    """, (role_id, perm_id, creator_id), fetch=False)
+            granted_count = self._grant_permissions(role_id, valid_perms, creator_id)
+            self._invalidate_roles()
             
             self._log_permission_action(creator_id, 'role_created', 'role', role_id, 'roles.create')
             
             return {
                 'success': True,
                 'role_id': role_id,
-                'message': f'Custom role "{display_name}" created successfully'
+                'permission_count': granted_count,
+                'message': f'Custom role "{display_name}" created successfully with {granted_count} permissions'
             }
             
         except Exception as e:
@@ -398,37 +567,52 @@ class RoleManager:
             if not self.has_permission(assigner_id, 'roles.assign'):
                 return {'success': False, 'error': 'Insufficient permissions to assign roles'}
             
-            # Get role ID
-            role_result = self.db.execute_query(
-                "SELECT role_id, priority FROM roles WHERE role_name = %s AND is_active = TRUE",
-                (role_name,)
-            )
-            
-            if role_result.empty:
-                return {'success': False, 'error': 'Role not found'}
-            
-            role_id = int(role_result.iloc[0]['role_id'])  # Convert numpy.int64 to Python int
-            role_priority = int(role_result.iloc[0]['priority'])  # Convert numpy.int64 to Python int
-            
-            # Check if assigner can assign this role (can't assign roles higher than their own)
-            assigner_max_priority = self.get_user_max_priority(assigner_id)
-            if role_priority >= assigner_max_priority:
+            # Validate priority and assign in one statement; a removed (inactive)
+            # assignment is reactivated rather than violating UNIQUE(user_id, role_id)
+            result = self.db.execute_query("""
+                WITH target AS (
+                    SELECT role_id, priority FROM roles
+                    WHERE role_name = %s AND is_active = TRUE
+                ),
+                assigner AS (
+                    SELECT COALESCE(MAX(r.priority), 0) AS max_priority
+                    FROM user_roles ur
+                    JOIN roles r ON ur.role_id = r.role_id
+                    WHERE ur.user_id = %s
+                    AND ur.is_active = TRUE
+                    AND r.is_active = TRUE
+                    AND (ur.expires_at IS NULL OR ur.expires_at > CURRENT_TIMESTAMP)
+                )
+                INSERT INTO user_roles (user_id, role_id, assigned_by, expires_at)
+                SELECT %s, target.role_id, %s, %s
+                FROM target, assigner
+                WHERE target.priority < assigner.max_priority
+                ON CONFLICT (user_id, role_id) DO UPDATE
+                SET is_active = TRUE, assigned_by = EXCLUDED.assigned_by,
+                    assigned_at = CURRENT_TIMESTAMP, expires_at = EXCLUDED.expires_at
+                WHERE user_roles.is_active = FALSE
+                RETURNING role_id
+            """, (role_name, assigner_id, user_id, assigner_id, expires_at), as_df=False)
+            
+            if not result:
+                # Only the failure path pays for working out why
+                already_assigned = self.db.fetch_one_scalar("""
+                    SELECT EXISTS (
+                        SELECT 1 FROM user_roles ur
+                        WHERE ur.user_id = %s AND ur.role_id = r.role_id AND ur.is_active = TRUE
+                    ) AS already_assigned
+                    FROM roles r
+                    WHERE r.role_name = %s AND r.is_active = TRUE
+                """, (user_id, role_name))
+                
+                if already_assigned is None:
+                    return {'success': False, 'error': 'Role not found'}
+                if already_assigned:
+                    return {'success': False, 'error': 'User already has this role'}
                 return {'success': False, 'error': 'Cannot assign role with equal or higher priority'}
             
-            # Check if user already has this role
-            existing = self.db.execute_query("""
-                SELECT id FROM user_roles 
-                WHERE user_id = %s AND role_id = %s AND is_active = TRUE
-            """, (user_id, role_id))
-            
-            if not existing.empty:
-                return {'success': False, 'error': 'User already has this role'}
-            
-            # Assign role
-            self.db.execute_query("""
-                INSERT INTO user_roles (user_id, role_id, assigned_by, expires_at)
-                VALUES (%s, %s, %s, %s)
-            """, (user_id, role_id, assigner_id, expires_at), fetch=False)
+            self._invalidate(user_id)
+            self.refresh_effective_permissions()
             
             self._log_permission_action(assigner_id, 'role_assigned', 'user', user_id, 'roles.assign')
             
@@ -445,32 +629,52 @@ class RoleManager:
             if not self.has_permission(remover_id, 'roles.assign'):
                 return {'success': False, 'error': 'Insufficient permissions to remove roles'}
             
-            # Get role info
-            role_result = self.db.execute_query("""
-                SELECT r.role_id, r.priority, r.is_system
-                FROM roles r
-                WHERE r.role_name = %s
-            """, (role_name,))
-            
-            if role_result.empty:
-                return {'success': False, 'error': 'Role not found'}
-            
-            role_id = int(role_result.iloc[0]['role_id'])  # Convert numpy.int64 to Python int
-            role_priority = int(role_result.iloc[0]['priority'])  # Convert numpy.int64 to Python int
-            is_system = bool(role_result.iloc[0]['is_system'])  # Convert to Python bool
-            
-            # Prevent removal of system roles from owners
-            if is_system and role_name in ['owner', 'admin']:
-                remover_max_priority = self.get_user_max_priority(remover_id)
-                if role_priority >= remover_max_priority:
-                    return {'success': False, 'error': 'Cannot remove system role with equal or higher priority'}
-            
-            # Remove role
+            # Deactivate in one statement; owner/admin system roles are protected
+            # unless the remover outranks them
             result = self.db.execute_query("""
-                UPDATE user_roles 
+                WITH target AS (
+                    SELECT role_id, role_name, priority, is_system FROM roles
+                    WHERE role_name = %s
+                ),
+                remover AS (
+                    SELECT COALESCE(MAX(r.priority), 0) AS max_priority
+                    FROM user_roles ur
+                    JOIN roles r ON ur.role_id = r.role_id
+                    WHERE ur.user_id = %s
+                    AND ur.is_active = TRUE
+                    AND r.is_active = TRUE
+                    AND (ur.expires_at IS NULL OR ur.expires_at > CURRENT_TIMESTAMP)
+                )
+                UPDATE user_roles
                 SET is_active = FALSE
-                WHERE user_id = %s AND role_id = %s AND is_active = TRUE
-            """, (user_id, role_id), fetch=False)
+                FROM target, remover
+                WHERE user_roles.user_id = %s
+                AND user_roles.role_id = target.role_id
+                AND user_roles.is_active = TRUE
+                AND NOT (
+                    target.is_system
+                    AND target.role_name IN ('owner', 'admin')
+                    AND target.priority >= remover.max_priority
+                )
+                RETURNING user_roles.role_id
+            """, (role_name, remover_id, user_id), as_df=False)
+            
+            if not result:
+                # Nothing was deactivated: the role is missing, protected, or simply not held
+                role_row = self.db.fetch_one("""
+                    SELECT priority, is_system FROM roles WHERE role_name = %s LIMIT 1
+                """, (role_name,))
+                
+                if role_row is None:
+                    return {'success': False, 'error': 'Role not found'}
+                
+                role_priority, is_system = role_row
+                if is_system and role_name in ['owner', 'admin']:
+                    if role_priority >= self.get_user_max_priority(remover_id):
+                        return {'success': False, 'error': 'Cannot remove system role with equal or higher priority'}
+            
+            self._invalidate(user_id)
+            self.refresh_effective_permissions()
             
             self._log_permission_action(remover_id, 'role_removed', 'user', user_id, 'roles.assign')
             
@@ -482,92 +686,154 @@ class RoleManager:
 
     def has_permission(self, user_id: int, permission: str) -> bool:
         """Check if user has a specific permission"""
+        return permission in self.get_user_permissions(user_id)
+
+    def _role_schema_ready(self) -> bool:
+        """Check once per process whether the extended role schema has been created"""
+        global _role_schema_state
+        if _role_schema_state is None:
+            exists = self.db.fetch_one_scalar(
+                "SELECT to_regclass('user_effective_permissions') IS NOT NULL"
+            )
+            if exists is None:
+                return False  # Lookup failed; try again next time
+            _role_schema_state = bool(exists)
+        return _role_schema_state
+
+    def refresh_effective_permissions(self):
+        """Rebuild user_effective_permissions after role or grant changes"""
+        if not self._role_schema_ready():
+            return
+        
         try:
-            # Get user's active roles and their permissions
-            result = self.db.execute_query("""
-                SELECT DISTINCT p.permission_name
-                FROM user_roles ur
-                JOIN roles r ON ur.role_id = r.role_id
-                JOIN role_permissions rp ON r.role_id = rp.role_id
-                JOIN permissions p ON rp.permission_id = p.permission_id
-                WHERE ur.user_id = %s 
-                AND ur.is_active = TRUE 
-                AND r.is_active = TRUE
-                AND (ur.expires_at IS NULL OR ur.expires_at > CURRENT_TIMESTAMP)
-            """, (user_id,))
-            
-            if result.empty:
-                return False
-            
-            user_permissions = set(result['permission_name'].tolist())
-            return permission in user_permissions
-            
+            self.db.execute_query(
+                "REFRESH MATERIALIZED VIEW CONCURRENTLY user_effective_permissions",
+                fetch=False
+            )
         except Exception as e:
-            self.logger.error(f"Failed to check permission: {e}")
-            return False
+            self.logger.error(f"Failed to refresh effective permissions: {e}")
+
+    def _get_cached_permissions(self, user_id: int) -> Optional[FrozenSet[str]]:
+        """Return the cached permission set for a user if it is still fresh"""
+        with self._perm_cache_lock:
+            cached = self._perm_cache.get(user_id)
+            if cached is not None and monotonic() - cached[0] < self._perm_ttl:
+                self._perm_cache.move_to_end(user_id)
+                return cached[1]
+        return None
 
     def get_user_permissions(self, user_id: int) -> Set[str]:
         """Get all permissions for a user"""
+        cached = self._get_cached_permissions(user_id)
+        if cached is not None:
+            return cached
+        
         try:
-            result = self.db.execute_query("""
-                SELECT DISTINCT p.permission_name
-                FROM user_roles ur
-                JOIN roles r ON ur.role_id = r.role_id
-                JOIN role_permissions rp ON r.role_id = rp.role_id
-                JOIN permissions p ON rp.permission_id = p.permission_id
-                WHERE ur.user_id = %s 
-                AND ur.is_active = TRUE 
-                AND r.is_active = TRUE
-                AND (ur.expires_at IS NULL OR ur.expires_at > CURRENT_TIMESTAMP)
-            """, (user_id,))
-            
-            if result.empty:
-                return set()
-            
-            return set(result['permission_name'].tolist())
+            if self._role_schema_ready():
+                row = self.db.fetch_one("""
+                    SELECT EXISTS (
+                        SELECT 1
+                        FROM user_roles ur
+                        JOIN roles r ON ur.role_id = r.role_id
+                        WHERE ur.user_id = %s
+                        AND r.is_superuser = TRUE
+                        AND ur.is_active = TRUE
+                        AND r.is_active = TRUE
+                        AND (ur.expires_at IS NULL OR ur.expires_at > CURRENT_TIMESTAMP)
+                    ), ARRAY(
+                        SELECT permission_name
+                        FROM user_effective_permissions
+                        WHERE user_id = %s 
+                        AND (expires_at IS NULL OR expires_at > CURRENT_TIMESTAMP)
+                    )
+                """, (user_id, user_id))
+                if row is None:
+                    return frozenset()  # Lookup failed; don't cache an empty set
+                is_superuser, granted = row
+                permissions = _PERMISSION_NAMES if is_superuser else frozenset(granted)
+            else:
+                result = self.db.execute_query("""
+                    SELECT DISTINCT p.permission_name
+                    FROM user_roles ur
+                    JOIN roles r ON ur.role_id = r.role_id
+                    JOIN role_permissions rp ON r.role_id = rp.role_id
+                    JOIN permissions p ON rp.permission_id = p.permission_id
+                    WHERE ur.user_id = %s 
+                    AND ur.is_active = TRUE 
+                    AND r.is_active = TRUE
+                    AND (ur.expires_at IS NULL OR ur.expires_at > CURRENT_TIMESTAMP)
+                """, (user_id,), as_df=False)
+                permissions = frozenset(row['permission_name'] for row in result)
+            
+            with self._perm_cache_lock:
+                self._perm_cache[user_id] = (monotonic(), permissions)
+                self._perm_cache.move_to_end(user_id)
+                if len(self._perm_cache) > self._perm_cache_size:
+                    self._perm_cache.popitem(last=False)
+            
+            return permissions
             
         except Exception as e:
             self.logger.error(f"Failed to get user permissions: {e}")
-            return set()
+            return frozenset()
+
+    def _invalidate(self, user_id: Optional[int] = None):
+        """Drop cached permissions for a user, or for everyone when no user is given"""
+        with self._perm_cache_lock:
+            if user_id is None:
+                self._perm_cache.clear()
+            else:
+                self._perm_cache.pop(user_id, None)
+
+    def _invalidate_roles(self):
+        """Drop the shared role listing caches after a role or grant changes"""
+        RoleManager._roles_cache = None
+        RoleManager._role_perms_cache.clear()
 
     def get_user_roles(self, user_id: int) -> List[Dict[str, Any]]:
         """Get all roles for a user"""
         try:
-            result = self.db.execute_query("""
-                SELECT r.role_name, r.display_name, r.description, r.color, r.priority,
+            return self.db.execute_query("""
+                SELECT r.role_name AS name, r.display_name, r.description, r.color, r.priority,
                        ur.assigned_at, ur.expires_at, ur.is_active
                 FROM user_roles ur
                 JOIN roles r ON ur.role_id = r.role_id
                 WHERE ur.user_id = %s
                 ORDER BY r.priority DESC
-            """, (user_id,))
-            
-            if result.empty:
-                return []
-            
-            roles = []
-            for _, row in result.iterrows():
-                roles.append({
-                    'name': row['role_name'],
-                    'display_name': row['display_name'],
-                    'description': row['description'],
-                    'color': row['color'],
-                    'priority': row['priority'],
-                    'assigned_at': row['assigned_at'],
-                    'expires_at': row['expires_at'],
-                    'is_active': row['is_active']
-                })
-            
-            return roles
+            """, (user_id,), as_df=False)
             
         except Exception as e:
             self.logger.error(f"Failed to get user roles: {e}")
             return []
 
+    def get_user_roles_bulk(self, user_ids: List[int]) -> Dict[int, List[Dict[str, Any]]]:
+        """Get active roles for several users in one query"""
+        roles_by_user = {user_id: [] for user_id in user_ids}
+        if not user_ids:
+            return roles_by_user
+        
+        try:
+            result = self.db.execute_query("""
+                SELECT ur.user_id, r.role_name AS name, r.display_name, r.description, r.color,
+                       r.priority, ur.assigned_at, ur.expires_at, ur.is_active
+                FROM user_roles ur
+                JOIN roles r ON ur.role_id = r.role_id
+                WHERE ur.user_id = ANY(%s) AND ur.is_active = TRUE
+                ORDER BY ur.user_id, r.priority DESC
+            """, (list(user_ids),), as_df=False)
+            
+            for row in result:
+                roles_by_user.setdefault(row['user_id'], []).append(row)
+            return roles_by_user
+            
+        except Exception as e:
+            self.logger.error(f"Failed to get user roles in bulk: {e}")
+            return roles_by_user
+
     def get_user_max_priority(self, user_id: int) -> int:
         """Get user's highest role priority"""
         try:
-            result = self.db.execute_query("""
+            max_priority = self.db.fetch_one_scalar("""
                 SELECT MAX(r.priority) as max_priority
                 FROM user_roles ur
                 JOIN roles r ON ur.role_id = r.role_id
@@ -577,10 +843,7 @@ class RoleManager:
                 AND (ur.expires_at IS NULL OR ur.expires_at > CURRENT_TIMESTAMP)
             """, (user_id,))
             
-            if result.empty or result.iloc[0]['max_priority'] is None:
-                return 0
-            
-            return int(result.iloc[0]['max_priority'])
+            return max_priority if max_priority is not None else 0
             
         except Exception as e:
             self.logger.error(f"Failed to get user max priority: {e}")
@@ -588,31 +851,20 @@ class RoleManager:
 
     def get_all_roles(self) -> List[Dict[str, Any]]:
         """Get all available roles"""
+        cached = RoleManager._roles_cache
+        if cached is not None and monotonic() - cached[0] < self._roles_ttl:
+            return cached[1]
+        
         try:
-            result = self.db.execute_query("""
-                SELECT role_id, role_name, display_name, description, color, priority, 
-                       is_system, is_active, created_at
+            roles = self.db.execute_query("""
+                SELECT role_id AS id, role_name AS name, display_name, description, color, priority, 
+                       is_system, created_at
                 FROM roles
                 WHERE is_active = TRUE
                 ORDER BY priority DESC
-            """)
-            
-            if result.empty:
-                return []
-            
-            roles = []
-            for _, row in result.iterrows():
-                roles.append({
-                    'id': row['role_id'],
-                    'name': row['role_name'],
-                    'display_name': row['display_name'],
-                    'description': row['description'],
-                    'color': row['color'],
-                    'priority': row['priority'],
-                    'is_system': row['is_system'],
-                    'created_at': row['created_at']
-                })
+            """, as_df=False)
             
+            RoleManager._roles_cache = (monotonic(), roles)
             return roles
             
         except Exception as e:
@@ -621,53 +873,175 @@ class RoleManager:
 
     def get_role_permissions(self, role_name: str) -> List[str]:
         """Get all permissions for a specific role"""
+        cached = RoleManager._role_perms_cache.get(role_name)
+        if cached is not None and monotonic() - cached[0] < self._roles_ttl:
+            return cached[1]
+        
         try:
-            result = self.db.execute_query("""
-                SELECT p.permission_name
-                FROM roles r
-                JOIN role_permissions rp ON r.role_id = rp.role_id
-                JOIN permissions p ON rp.permission_id = p.permission_id
-                WHERE r.role_name = %s AND r.is_active = TRUE
-            """, (role_name,))
-            
-            if result.empty:
-                return []
-            
-            return result['permission_name'].tolist()
+            if self._role_schema_ready():
+                # Superuser roles hold every permission without mapping rows
+                result = self.db.execute_query("""
+                    SELECT p.permission_name
+                    FROM roles r
+                    JOIN permissions p ON r.is_superuser OR EXISTS (
+                        SELECT 1 FROM role_permissions rp
+                        WHERE rp.role_id = r.role_id AND rp.permission_id = p.permission_id
+                    )
+                    WHERE r.role_name = %s AND r.is_active = TRUE
+                """, (role_name,), as_df=False)
+            else:
+                result = self.db.execute_query("""
+                    SELECT p.permission_name
+                    FROM roles r
+                    JOIN role_permissions rp ON r.role_id = rp.role_id
+                    JOIN permissions p ON rp.permission_id = p.permission_id
+                    WHERE r.role_name = %s AND r.is_active = TRUE
+                """, (role_name,), as_df=False)
+            
+            permissions = [row['permission_name'] for row in result]
+            RoleManager._role_perms_cache[role_name] = (monotonic(), permissions)
+            return permissions
             
         except Exception as e:
             self.logger.error(f"Failed to get role permissions: {e}")
             return []
 
+    def get_role_permissions_bulk(self, role_names: List[str]) -> Dict[str, List[str]]:
+        """Get permissions for several roles in one query"""
+        now = monotonic()
+        permissions = {}
+        missing = []
+        for role_name in role_names:
+            cached = RoleManager._role_perms_cache.get(role_name)
+            if cached is not None and now - cached[0] < self._roles_ttl:
+                permissions[role_name] = cached[1]
+            else:
+                missing.append(role_name)
+        
+        if not missing:
+            return permissions
+        
+        try:
+            if self._role_schema_ready():
+                result = self.db.execute_query("""
+                    SELECT r.role_name, p.permission_name
+                    FROM roles r
+                    JOIN permissions p ON r.is_superuser OR EXISTS (
+                        SELECT 1 FROM role_permissions rp
+                        WHERE rp.role_id = r.role_id AND rp.permission_id = p.permission_id
+                    )
+                    WHERE r.role_name = ANY(%s) AND r.is_active = TRUE
+                """, (missing,), as_df=False)
+            else:
+                result = self.db.execute_query("""
+                    SELECT r.role_name, p.permission_name
+                    FROM roles r
+                    JOIN role_permissions rp ON r.role_id = rp.role_id
+                    JOIN permissions p ON rp.permission_id = p.permission_id
+                    WHERE r.role_name = ANY(%s) AND r.is_active = TRUE
+                """, (missing,), as_df=False)
+            
+            fetched = {role_name: [] for role_name in missing}
+            for row in result:
+                fetched[row['role_name']].append(row['permission_name'])
+            
+            for role_name, perms in fetched.items():
+                RoleManager._role_perms_cache[role_name] = (now, perms)
+            permissions.update(fetched)
+            return permissions
+            
+        except Exception as e:
+            self.logger.error(f"Failed to get role permissions in bulk: {e}")
+            return permissions
+
+    def get_role_permission_counts(self) -> Dict[str, int]:
+        """Get the number of permissions held by each active role"""
+        try:
+            if self._role_schema_ready():
+                result = self.db.execute_query("""
+                    SELECT r.role_name,
+                           CASE WHEN r.is_superuser THEN (SELECT COUNT(*) FROM permissions)
+                                ELSE COUNT(rp.permission_id) END AS permission_count
+                    FROM roles r
+                    LEFT JOIN role_permissions rp ON r.role_id = rp.role_id
+                    WHERE r.is_active = TRUE
+                    GROUP BY r.role_id, r.role_name, r.is_superuser
+                """, as_df=False)
+            else:
+                result = self.db.execute_query("""
+                    SELECT r.role_name, COUNT(rp.permission_id) AS permission_count
+                    FROM roles r
+                    LEFT JOIN role_permissions rp ON r.role_id = rp.role_id
+                    WHERE r.is_active = TRUE
+                    GROUP BY r.role_id, r.role_name
+                """, as_df=False)
+            
+            return {row['role_name']: row['permission_count'] for row in result}
+            
+        except Exception as e:
+            self.logger.error(f"Failed to get role permission counts: {e}")
+            return {}
+
     def _log_permission_action(self, user_id: int, action: str, target_type: str, 
                               target_id: int, permission_used: str, success: bool = True):
         """Log permission-related actions for audit trail"""
         try:
-            self.db.execute_query("""
-                INSERT INTO permission_audit 
-                (user_id, action, target_type, target_id, permission_used, success)
-                VALUES (%s, %s, %s, %s, %s, %s)
-            """, (user_id, action, target_type, target_id, permission_used, success), fetch=False)
+            _audit_queue.put(self.db, (
+                user_id, action, target_type, target_id, permission_used, success,
+                datetime.now(timezone.utc)
+            ))
             
         except Exception as e:
             self.logger.error(f"Failed to log permission action: {e}")
 
-    def cleanup_expired_roles(self):
+    def flush_audit(self):
+        """Write any queued audit rows immediately"""
+        _audit_queue.flush()
+
+    def cleanup_expired_roles(self, batch_size: int = 10000):
         """Remove expired role assignments"""
         try:
-            result = self.db.execute_query("""
-                UPDATE user_roles 
-                SET is_active = FALSE
-                WHERE expires_at < CURRENT_TIMESTAMP AND is_active = TRUE
-            """, fetch=False)
+            total = 0
+            while True:
+                # Bounded batches; SKIP LOCKED lets concurrent cleanups split the work
+                result = self.db.execute_query("""
+                    WITH expired AS (
+                        SELECT id FROM user_roles
+                        WHERE is_active = TRUE AND expires_at < CURRENT_TIMESTAMP
+                        LIMIT %s
+                        FOR UPDATE SKIP LOCKED
+                    )
+                    UPDATE user_roles
+                    SET is_active = FALSE
+                    FROM expired
+                    WHERE user_roles.id = expired.id
+                    RETURNING user_roles.user_id
+                """, (batch_size,), as_df=False)
+                
+                if not result:
+                    break
+                
+                for row in result:
+                    self._invalidate(row['user_id'])
+                total += len(result)
+                
+                if len(result) < batch_size:
+                    break
+            
+            if total:
+                self.refresh_effective_permissions()
             
-            self.logger.info("Expired role assignments cleaned up")
+            self.logger.info(f"Expired role assignments cleaned up ({total} deactivated)")
             
         except Exception as e:
             self.logger.error(f"Failed to cleanup expired roles: {e}")
 
     def get_permission_categories(self) -> Dict[str, List[Dict[str, str]]]:
         """Get permissions organized by category"""
+        return self._permission_categories
+
+    def _build_permission_categories(self) -> Dict[str, List[Dict[str, str]]]:
+        """Group ALL_PERMISSIONS by category; built once since the permission set is static"""
         categories = {}
         for perm, desc in self.ALL_PERMISSIONS.items():
             category = perm.split('.')[0].title()
@@ -678,4 +1052,4 @@ class RoleManager:
                 'description': desc
             })
         
-        return categories
\ No newline at end of file
+        return categories
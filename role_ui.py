@@ -1,15 +1,198 @@
+import html
 import streamlit as st
 import pandas as pd
-from datetime import datetime, timedelta
+import numpy as np
+from functools import lru_cache, wraps
+from itertools import zip_longest
+from time import monotonic
+from datetime import date, datetime, time, timedelta, timezone
 from typing import Dict, List, Any
 
+_MIDNIGHT = time(0, 0)
+
+ROLE_BADGE_TEMPLATE = (
+    '<div style="background-color: {color}20; border-left: 4px solid {color}; '
+    'padding: 8px; margin: 4px 0; border-radius: 4px;">'
+    '<strong>{display_name}</strong>{suffix}<br><small>{detail}</small></div>'
+)
+
+AUDIT_PAGE_SIZE = 100
+
+# Session-cached permissions are reloaded after this long, matching RoleManager._perm_ttl,
+# so a revoked permission stops working in other sessions within seconds
+PERMISSION_CACHE_TTL = 30  # seconds
+
+# One statement text for every filter combination; a NULL action means "All"
+# and a NULL cursor means the newest page. Pages are keyset-paginated on
+# (timestamp, id); the summary covers every matching entry.
+AUDIT_LOG_QUERY = """
+    WITH filtered AS (
+        SELECT 
+            pa.id,
+            pa.timestamp,
+            pa.user_id,
+            pa.action,
+            pa.target_type,
+            pa.target_id,
+            pa.permission_used,
+            pa.success,
+            pa.ip_address
+        FROM permission_audit pa
+        WHERE pa.timestamp >= CURRENT_TIMESTAMP - INTERVAL '1 day' * %s
+          AND (%s::text IS NULL OR pa.action = %s)
+    ), recent AS (
+        SELECT * FROM filtered
+        WHERE %s::timestamptz IS NULL OR (timestamp, id) < (%s::timestamptz, %s::int)
+        ORDER BY timestamp DESC, id DESC
+        LIMIT %s
+    )
+    SELECT recent.id, recent.timestamp, u.username, recent.action, recent.target_type,
+           recent.target_id, recent.permission_used, recent.success, recent.ip_address,
+           stats.*
+    FROM recent
+    LEFT JOIN users u ON recent.user_id = u.user_id
+    CROSS JOIN (
+        SELECT COUNT(*) AS total_actions,
+               COALESCE(AVG(success::int), 0) * 100 AS success_rate,
+               COUNT(DISTINCT user_id) AS unique_users,
+               COUNT(DISTINCT action) AS unique_actions
+        FROM filtered
+    ) stats
+    ORDER BY recent.timestamp DESC, recent.id DESC
+"""
+
+# Audit query column -> display header, in display order
+AUDIT_LOG_COLUMNS = {
+    'timestamp': 'Timestamp',
+    'username': 'User',
+    'action': 'Action',
+    'target': 'Target',
+    'permission_used': 'Permission',
+    'success_icon': 'Success',
+    'ip_address': 'IP Address'
+}
+
+@st.cache_resource(ttl=30)
+def _audit_page(_db, days_back: int, action, cursor) -> pd.DataFrame:
+    """One formatted audit log page, shared read-only between reruns"""
+    cursor_ts, cursor_id = cursor if cursor else (None, None)
+    audit_result = _db.execute_query(
+        AUDIT_LOG_QUERY,
+        (days_back, action, action, cursor_ts, cursor_ts, cursor_id, AUDIT_PAGE_SIZE)
+    )
+    if audit_result.empty:
+        return audit_result
+    
+    # Format the data for display in place (vectorized over the whole page)
+    target_id = audit_result['target_id'].astype('Int64')
+    has_target = target_id.fillna(0) != 0
+    audit_result['timestamp'] = pd.to_datetime(audit_result['timestamp'])
+    audit_result['username'] = audit_result['username'].fillna('Unknown')
+    audit_result['target'] = np.where(
+        has_target,
+        audit_result['target_type'].astype(str) + ' #' + target_id.astype(str),
+        'N/A'
+    )
+    audit_result['success_icon'] = np.where(audit_result['success'].fillna(False).astype(bool), '✅', '❌')
+    audit_result['ip_address'] = audit_result['ip_address'].map(str, na_action='ignore')
+    return audit_result
+
+def _role_badges_html(roles: List[Dict[str, Any]], detail) -> str:
+    """Render a list of role badges as one HTML string; detail(role) -> (suffix, detail)"""
+    parts = []
+    for role in roles:
+        suffix, extra = detail(role)
+        parts.append(ROLE_BADGE_TEMPLATE.format(
+            color=html.escape(role['color'] or ''),
+            display_name=html.escape(role['display_name'] or ''),
+            suffix=html.escape(suffix),
+            detail=html.escape(extra)
+        ))
+    return "".join(parts)
+
+@st.cache_data(ttl=60)
+def _cached_all_roles(_rm) -> List[Dict[str, Any]]:
+    """All active roles, shared across reruns"""
+    return [dict(role) for role in _rm.get_all_roles()]
+
+@st.cache_data(ttl=60)
+def _cached_permission_categories(_rm) -> Dict[str, List[Dict[str, str]]]:
+    """Permission catalog grouped by category, shared across reruns"""
+    return _rm.get_permission_categories()
+
+@st.cache_data(ttl=60)
+def _cached_role_permissions(_rm, role_names: tuple) -> Dict[str, List[str]]:
+    """Permissions for each of the given roles, fetched in one query"""
+    return _rm.get_role_permissions_bulk(list(role_names))
+
+@st.cache_data(ttl=30)
+def _search_users(_db, query: str) -> List[Dict[str, Any]]:
+    """Users whose username or email contains query, keyed on the query text"""
+    users_result = _db.execute_query("""
+        SELECT user_id, username, email, display_name, role
+        FROM users 
+        WHERE username ILIKE '%%' || %s || '%%'
+           OR email ILIKE '%%' || %s || '%%'
+        ORDER BY username
+        LIMIT 20
+    """, (query, query))
+    return users_result.to_dict('records')
+
+@st.cache_data(ttl=60)
+def _cached_role_permission_counts(_rm) -> Dict[str, int]:
+    """Number of permissions per role name, shared across reruns"""
+    return _rm.get_role_permission_counts()
+
+def _clear_role_caches():
+    """Drop cached role data after a create/assign/remove"""
+    _cached_all_roles.clear()
+    _cached_role_permissions.clear()
+    _cached_role_permission_counts.clear()
+
+@lru_cache(maxsize=None)
+def _categorize(permissions: tuple) -> Dict[str, List[str]]:
+    """Group permission names by their prefix, e.g. 'roles.view' -> 'Roles'"""
+    categories = {}
+    for perm in permissions:
+        categories.setdefault(perm.split('.', 1)[0].title(), []).append(perm)
+    return categories
+
+def _load_permissions(role_manager, user_id: int) -> frozenset:
+    """Fetch a user's effective permissions into the session cache"""
+    perms = frozenset(role_manager.get_user_permissions(user_id))
+    st.session_state.setdefault('_perm_cache', {})[user_id] = (monotonic(), perms)
+    return perms
+
+def _cached_permissions(user_id: int):
+    """Session-cached permissions, or None once they are older than PERMISSION_CACHE_TTL"""
+    cached = st.session_state.get('_perm_cache', {}).get(user_id)
+    if cached is not None and monotonic() - cached[0] < PERMISSION_CACHE_TTL:
+        return cached[1]
+    return None
+
+def _current_permissions(role_manager, user_id: int) -> frozenset:
+    """Effective permissions loaded for this rerun, fetched on a miss"""
+    perms = _cached_permissions(user_id)
+    if perms is None:
+        perms = _load_permissions(role_manager, user_id)
+    return perms
+
+def _invalidate_permissions(*user_ids: int):
+    """Forget cached permissions after roles change"""
+    cache = st.session_state.get('_perm_cache', {})
+    for user_id in user_ids:
+        cache.pop(user_id, None)
+
 def show_role_management(role_manager, current_user_id: int):
     """Display role management interface for administrators"""
     
     st.title("🔐 Advanced Role & Permission Management")
     
+    # Load permissions once per rerun; the tabs read them from the session cache
+    perms = _load_permissions(role_manager, current_user_id)
+    
     # Check if user has permission to access role management
-    if not role_manager.has_permission(current_user_id, 'roles.view'):
+    if 'roles.view' not in perms:
         st.error("🚫 Access Denied: You don't have permission to view role management.")
         return
     
@@ -37,11 +220,13 @@ def show_role_management(role_manager, current_user_id: int):
     with tab5:
         show_audit_log_tab(role_manager, current_user_id)
 
+@st.fragment
 def show_user_roles_tab(role_manager, current_user_id: int):
     """Show user role assignment interface"""
     st.header("👥 User Role Management")
     
-    if not role_manager.has_permission(current_user_id, 'roles.assign'):
+    can_assign = 'roles.assign' in _current_permissions(role_manager, current_user_id)
+    if not can_assign:
         st.warning("⚠️ You can view roles but cannot assign/remove them.")
     
     # Search for users
@@ -51,68 +236,59 @@ def show_user_roles_tab(role_manager, current_user_id: int):
         user_search = st.text_input("🔍 Search for user by username or email", key="user_search")
     
     with col2:
-        if st.button("🔍 Search Users"):
-            if user_search:
-                # Search for users in database
-                users_result = role_manager.db.execute_query("""
-                    SELECT user_id, username, email, display_name, role
-                    FROM users 
-                    WHERE username ILIKE %s OR email ILIKE %s
-                    ORDER BY username
-                    LIMIT 20
-                """, (f"%{user_search}%", f"%{user_search}%"))
-                
-                if not users_result.empty:
-                    st.session_state['searched_users'] = users_result
-                else:
-                    st.info("No users found matching your search.")
+        query = (user_search or "").strip()
+        if st.button("🔍 Search Users") and query:
+            users = _search_users(role_manager.db, query)
+            st.session_state['last_query'] = query
+            
+            if users:
+                st.session_state['searched_users'] = users
+            else:
+                st.info("No users found matching your search.")
     
     # Display searched users
     if 'searched_users' in st.session_state:
         st.subheader("Search Results")
         
-        for _, user in st.session_state['searched_users'].iterrows():
+        searched_users = st.session_state['searched_users']
+        roles_by_user = role_manager.get_user_roles_bulk(
+            [user['user_id'] for user in searched_users]
+        )
+        
+        # Role choices are the same for every user row
+        available_roles = _cached_all_roles(role_manager) if can_assign else []
+        role_names = [r['name'] for r in available_roles]
+        name_to_display = {r['name']: r['display_name'] for r in available_roles}
+        # Fixed once per session so the date_input default doesn't drift across reruns
+        default_expiry = st.session_state.setdefault('_default_exp', date.today() + timedelta(days=30))
+        
+        for user in searched_users:
             with st.expander(f"👤 {user['username']} ({user['email']})"):
                 col1, col2 = st.columns([2, 1])
                 
                 with col1:
                     # Show current roles
-                    user_roles = role_manager.get_user_roles(user['user_id'])
+                    user_roles = roles_by_user.get(user['user_id'], [])
                     
                     st.write("**Current Roles:**")
                     if user_roles:
-                        for role in user_roles:
-                            if role['is_active']:
-                                color = role['color']
-                                expires_text = ""
-                                if role['expires_at']:
-                                    expires_text = f" (expires: {role['expires_at'].strftime('%Y-%m-%d')})"
-                                
-                                st.markdown(f"""
-                                <div style="
-                                    background-color: {color}20; 
-                                    border-left: 4px solid {color}; 
-                                    padding: 8px; 
-                                    margin: 4px 0;
-                                    border-radius: 4px;
-                                ">
-                                    <strong>{role['display_name']}</strong>{expires_text}<br>
-                                    <small>{role['description']}</small>
-                                </div>
-                                """, unsafe_allow_html=True)
+                        st.markdown(_role_badges_html(
+                            [role for role in user_roles if role['is_active']],
+                            lambda role: (
+                                f" (expires: {role['expires_at'].strftime('%Y-%m-%d')})" if role['expires_at'] else "",
+                                role['description'] or ""
+                            )
+                        ), unsafe_allow_html=True)
                     else:
                         st.info("No active roles assigned")
                 
                 with col2:
-                    if role_manager.has_permission(current_user_id, 'roles.assign'):
+                    if can_assign:
                         # Role assignment form
-                        available_roles = role_manager.get_all_roles()
-                        role_options = [(r['name'], r['display_name']) for r in available_roles]
-                        
                         selected_role = st.selectbox(
                             "Assign Role:",
-                            options=[r[0] for r in role_options],
-                            format_func=lambda x: next(r[1] for r in role_options if r[0] == x),
+                            options=role_names,
+                            format_func=name_to_display.__getitem__,
                             key=f"role_select_{user['user_id']}"
                         )
                         
@@ -123,7 +299,7 @@ def show_user_roles_tab(role_manager, current_user_id: int):
                         if add_expiration:
                             expiration_date = st.date_input(
                                 "Expires on:",
-                                value=datetime.now().date() + timedelta(days=30),
+                                value=default_expiry,
                                 key=f"exp_date_{user['user_id']}"
                             )
                         
@@ -131,7 +307,7 @@ def show_user_roles_tab(role_manager, current_user_id: int):
                         
                         with col_assign:
                             if st.button("➕ Assign", key=f"assign_{user['user_id']}"):
-                                exp_datetime = datetime.combine(expiration_date, datetime.min.time()) if expiration_date else None
+                                exp_datetime = datetime.combine(expiration_date, _MIDNIGHT, tzinfo=timezone.utc) if expiration_date else None
                                 result = role_manager.assign_role_to_user(
                                     current_user_id, 
                                     user['user_id'], 
@@ -139,6 +315,8 @@ def show_user_roles_tab(role_manager, current_user_id: int):
                                     exp_datetime
                                 )
                                 if result['success']:
+                                    _clear_role_caches()
+                                    _invalidate_permissions(current_user_id, user['user_id'])
                                     st.success(result['message'])
                                     st.rerun()
                                 else:
@@ -152,6 +330,8 @@ def show_user_roles_tab(role_manager, current_user_id: int):
                                     selected_role
                                 )
                                 if result['success']:
+                                    _clear_role_caches()
+                                    _invalidate_permissions(current_user_id, user['user_id'])
                                     st.success(result['message'])
                                     st.rerun()
                                 else:
@@ -161,76 +341,52 @@ def show_role_management_tab(role_manager, current_user_id: int):
     """Show existing role management"""
     st.header("🛡️ System Roles Overview")
     
-    roles = role_manager.get_all_roles()
+    roles = _cached_all_roles(role_manager)
     
     if not roles:
         st.info("No roles found in the system.")
         return
     
-    # Display roles in a grid
-    cols_per_row = 2
-    for i in range(0, len(roles), cols_per_row):
-        cols = st.columns(cols_per_row)
+    # One styled table instead of a card per role, tinted with each role's color
+    colors = [r['color'] for r in roles]
+    df = pd.DataFrame({
+        'Role': [r['display_name'] for r in roles],
+        'Priority': [r['priority'] for r in roles],
+        'Type': ['System' if r['is_system'] else 'Custom' for r in roles],
+        'Created': [r['created_at'].strftime('%Y-%m-%d') if r['created_at'] else 'N/A' for r in roles],
+        'Description': [r['description'] for r in roles]
+    })
+    styled = df.style.apply(
+        lambda row: [f"background-color: {colors[row.name]}22"] * len(row),
+        axis=1
+    )
+    st.dataframe(styled, hide_index=True, use_container_width=True)
+    
+    # Show permissions for one role at a time
+    name_to_display = {r['name']: r['display_name'] for r in roles}
+    selected_role = st.selectbox(
+        "View Permissions",
+        options=list(name_to_display),
+        format_func=name_to_display.__getitem__,
+        key="view_perms_role"
+    )
+    
+    with st.expander(f"Permissions for {name_to_display[selected_role]}"):
+        permissions = _cached_role_permissions(role_manager, (selected_role,))[selected_role]
         
-        for j, role in enumerate(roles[i:i+cols_per_row]):
-            with cols[j]:
-                # Role card
-                st.markdown(f"""
-                <div style="
-                    border: 2px solid {role['color']};
-                    border-radius: 8px;
-                    padding: 16px;
-                    margin: 8px 0;
-                    background: linear-gradient(135deg, {role['color']}10, {role['color']}05);
-                ">
-                    <h4 style="color: {role['color']}; margin: 0;">
-                        {role['display_name']} 
-                        <span style="font-size: 0.7em; color: #666;">
-                            (Priority: {role['priority']})
-                        </span>
-                    </h4>
-                    <p style="margin: 8px 0; color: #666; font-size: 0.9em;">
-                        {role['description']}
-                    </p>
-                    <div style="display: flex; gap: 8px; align-items: center; font-size: 0.8em;">
-                        <span style="background: {'#28a745' if not role['is_system'] else '#6c757d'}; 
-                                     color: white; padding: 2px 6px; border-radius: 12px;">
-                            {'Custom' if not role['is_system'] else 'System'}
-                        </span>
-                        <span style="color: #666;">
-                            Created: {role['created_at'].strftime('%Y-%m-%d') if role['created_at'] else 'N/A'}
-                        </span>
-                    </div>
-                </div>
-                """, unsafe_allow_html=True)
-                
-                # Show permissions for this role
-                if st.button(f"View Permissions", key=f"view_perms_{role['id']}"):
-                    permissions = role_manager.get_role_permissions(role['name'])
-                    
-                    if permissions:
-                        st.write(f"**Permissions for {role['display_name']}:**")
-                        
-                        # Group permissions by category
-                        perm_categories = {}
-                        for perm in permissions:
-                            category = perm.split('.')[0].title()
-                            if category not in perm_categories:
-                                perm_categories[category] = []
-                            perm_categories[category].append(perm)
-                        
-                        for category, perms in perm_categories.items():
-                            st.write(f"**{category}:**")
-                            for perm in perms:
-                                st.write(f"  • {perm}")
-                    else:
-                        st.info("No permissions assigned to this role.")
+        if permissions:
+            for category, perms in _categorize(tuple(permissions)).items():
+                st.write(f"**{category}:**")
+                for perm in perms:
+                    st.write(f"  • {perm}")
+        else:
+            st.info("No permissions assigned to this role.")
 
 def show_custom_roles_tab(role_manager, current_user_id: int):
     """Show custom role creation interface"""
     st.header("⚙️ Create Custom Roles")
     
-    if not role_manager.has_permission(current_user_id, 'roles.create'):
+    if 'roles.create' not in _current_permissions(role_manager, current_user_id):
         st.error("🚫 Access Denied: You don't have permission to create custom roles.")
         return
     
@@ -266,33 +422,36 @@ def show_custom_roles_tab(role_manager, current_user_id: int):
         st.subheader("Select Permissions")
         
         # Get permission categories
-        perm_categories = role_manager.get_permission_categories()
+        perm_categories = _cached_permission_categories(role_manager)
         selected_permissions = []
         
-        # Create columns for permission categories
-        num_categories = len(perm_categories)
+        name_to_desc = {
+            perm['name']: perm['description']
+            for permissions in perm_categories.values()
+            for perm in permissions
+        }
+        
+        # One multiselect per category; "All" is read on submit, so it works inside the form
         cols_per_row = 3
+        category_rows = zip_longest(*[iter(perm_categories.items())] * cols_per_row)
         
-        for i in range(0, num_categories, cols_per_row):
+        for row in category_rows:
             cols = st.columns(cols_per_row)
-            categories_slice = list(perm_categories.items())[i:i+cols_per_row]
             
-            for j, (category, permissions) in enumerate(categories_slice):
-                if j < len(cols):
-                    with cols[j]:
-                        st.write(f"**{category}**")
-                        
-                        # Select all checkbox for category
-                        select_all = st.checkbox(f"Select All {category}", key=f"select_all_{category}")
-                        
-                        for perm in permissions:
-                            default_checked = select_all
-                            if st.checkbox(
-                                perm['description'], 
-                                value=default_checked,
-                                key=f"perm_{perm['name']}"
-                            ):
-                                selected_permissions.append(perm['name'])
+            for col, item in zip(cols, row):
+                if item is None:
+                    continue
+                category, permissions = item
+                with col:
+                    options = [perm['name'] for perm in permissions]
+                    select_all = st.checkbox(f"All {category}", key=f"select_all_{category}")
+                    chosen = st.multiselect(
+                        f"{category} permissions",
+                        options=options,
+                        format_func=name_to_desc.__getitem__,
+                        key=f"ms_{category}"
+                    )
+                    selected_permissions.extend(options if select_all else chosen)
         
         # Form submission
         if st.form_submit_button("🎯 Create Custom Role"):
@@ -314,6 +473,8 @@ def show_custom_roles_tab(role_manager, current_user_id: int):
                 )
                 
                 if result['success']:
+                    _clear_role_caches()
+                    _invalidate_permissions(current_user_id)
                     st.success(f"✅ {result['message']}")
                     st.rerun()
                 else:
@@ -324,7 +485,7 @@ def show_permission_overview_tab(role_manager, current_user_id: int):
     st.header("📊 Permission System Overview")
     
     # Permission categories overview
-    perm_categories = role_manager.get_permission_categories()
+    perm_categories = _cached_permission_categories(role_manager)
     
     st.subheader("📋 Available Permissions by Category")
     
@@ -338,12 +499,14 @@ def show_permission_overview_tab(role_manager, current_user_id: int):
     # Role hierarchy visualization
     st.subheader("🏗️ Role Hierarchy & Priority Levels")
     
-    roles = role_manager.get_all_roles()
+    roles = _cached_all_roles(role_manager)
     if roles:
+        permission_counts = _cached_role_permission_counts(role_manager)
+        
         # Create a dataframe for better visualization
         role_data = []
         for role in roles:
-            permissions_count = len(role_manager.get_role_permissions(role['name']))
+            permissions_count = permission_counts.get(role['name'], 0)
             role_data.append({
                 'Role': role['display_name'],
                 'Priority': role['priority'],
@@ -374,49 +537,32 @@ def show_permission_overview_tab(role_manager, current_user_id: int):
     # Current user's permissions
     st.subheader("🔐 Your Current Permissions")
     
-    user_permissions = role_manager.get_user_permissions(current_user_id)
+    user_permissions = _current_permissions(role_manager, current_user_id)
     user_roles = role_manager.get_user_roles(current_user_id)
     
     col1, col2 = st.columns(2)
     
     with col1:
         st.write("**Your Roles:**")
-        for role in user_roles:
-            if role['is_active']:
-                st.markdown(f"""
-                <div style="
-                    background-color: {role['color']}20; 
-                    border-left: 4px solid {role['color']}; 
-                    padding: 8px; 
-                    margin: 4px 0;
-                    border-radius: 4px;
-                ">
-                    <strong>{role['display_name']}</strong><br>
-                    <small>Priority: {role['priority']}</small>
-                </div>
-                """, unsafe_allow_html=True)
+        st.markdown(_role_badges_html(
+            [role for role in user_roles if role['is_active']],
+            lambda role: ("", f"Priority: {role['priority']}")
+        ), unsafe_allow_html=True)
     
     with col2:
         st.write(f"**Your Permissions ({len(user_permissions)}):**")
         if user_permissions:
-            # Group by category
-            user_perm_categories = {}
-            for perm in user_permissions:
-                category = perm.split('.')[0].title()
-                if category not in user_perm_categories:
-                    user_perm_categories[category] = []
-                user_perm_categories[category].append(perm)
-            
-            for category, perms in user_perm_categories.items():
-                st.write(f"**{category}:** {', '.join([p.split('.')[1] for p in perms])}")
+            for category, perms in _categorize(tuple(sorted(user_permissions))).items():
+                st.write(f"**{category}:** {', '.join([p.split('.', 1)[1] for p in perms])}")
         else:
             st.info("No permissions assigned")
 
+@st.fragment
 def show_audit_log_tab(role_manager, current_user_id: int):
     """Show permission audit log"""
     st.header("📋 Permission Audit Log")
     
-    if not role_manager.has_permission(current_user_id, 'logs.view'):
+    if 'logs.view' not in _current_permissions(role_manager, current_user_id):
         st.error("🚫 Access Denied: You don't have permission to view audit logs.")
         return
     
@@ -440,92 +586,91 @@ def show_audit_log_tab(role_manager, current_user_id: int):
     
     with col3:
         if st.button("🔄 Refresh Log"):
-            st.rerun()
+            _audit_page.clear()
+            st.rerun(scope="fragment")
+    
+    # Cursor stack for keyset pagination; reset whenever the filters change
+    action = action_filter if action_filter != "All" else None
+    if st.session_state.get('audit_filters') != (days_back, action):
+        st.session_state['audit_filters'] = (days_back, action)
+        st.session_state['audit_cursors'] = []
+    cursors = st.session_state['audit_cursors']
     
     # Get audit log data
     try:
-        query = """
-            SELECT 
-                pa.timestamp,
-                u.username,
-                pa.action,
-                pa.target_type,
-                pa.target_id,
-                pa.permission_used,
-                pa.success,
-                pa.ip_address
-            FROM permission_audit pa
-            LEFT JOIN users u ON pa.user_id = u.user_id
-            WHERE pa.timestamp >= CURRENT_TIMESTAMP - INTERVAL '%s days'
-        """
-        params = [days_back]
-        
-        if action_filter != "All":
-            query += " AND pa.action = %s"
-            params.append(action_filter)
-        
-        query += " ORDER BY pa.timestamp DESC LIMIT 100"
-        
-        audit_result = role_manager.db.execute_query(query, params)
+        audit_result = _audit_page(role_manager.db, days_back, action, cursors[-1] if cursors else None)
         
         if not audit_result.empty:
-            # Format the data for display
-            audit_data = []
-            for _, row in audit_result.iterrows():
-                audit_data.append({
-                    'Timestamp': row['timestamp'].strftime('%Y-%m-%d %H:%M:%S'),
-                    'User': row['username'] or 'Unknown',
-                    'Action': row['action'],
-                    'Target': f"{row['target_type']} #{row['target_id']}" if row['target_id'] else 'N/A',
-                    'Permission': row['permission_used'],
-                    'Success': '✅' if row['success'] else '❌',
-                    'IP Address': str(row['ip_address']) if row['ip_address'] else 'N/A'
-                })
-            
             # Display as dataframe
-            df = pd.DataFrame(audit_data)
-            st.dataframe(df, hide_index=True, use_container_width=True)
+            display = audit_result[list(AUDIT_LOG_COLUMNS)].rename(columns=AUDIT_LOG_COLUMNS)
+            st.dataframe(
+                display,
+                column_config={
+                    "Timestamp": st.column_config.DatetimeColumn(
+                        "Timestamp",
+                        format="YYYY-MM-DD HH:mm:ss"
+                    ),
+                    "IP Address": st.column_config.TextColumn("IP Address")
+                },
+                hide_index=True,
+                use_container_width=True
+            )
+            
+            col_newer, col_older = st.columns(2)
+            with col_newer:
+                if st.button("⬅️ Newer", disabled=not cursors, key="audit_newer"):
+                    cursors.pop()
+                    st.rerun(scope="fragment")
+            with col_older:
+                if st.button("Older ➡️", disabled=len(audit_result) < AUDIT_PAGE_SIZE, key="audit_older"):
+                    last = audit_result.iloc[-1]
+                    cursors.append((last['timestamp'].to_pydatetime(), int(last['id'])))
+                    st.rerun(scope="fragment")
             
-            # Summary statistics
+            # Summary statistics (computed alongside the page in SQL)
+            stats = audit_result.iloc[0]
             st.subheader("📊 Audit Summary")
             col1, col2, col3, col4 = st.columns(4)
             
             with col1:
-                st.metric("Total Actions", len(audit_data))
+                st.metric("Total Actions", int(stats['total_actions']))
             
             with col2:
-                success_rate = (audit_result['success'].sum() / len(audit_result)) * 100
-                st.metric("Success Rate", f"{success_rate:.1f}%")
+                st.metric("Success Rate", f"{float(stats['success_rate']):.1f}%")
             
             with col3:
-                unique_users = audit_result['username'].nunique()
-                st.metric("Active Users", unique_users)
+                st.metric("Active Users", int(stats['unique_users']))
             
             with col4:
-                unique_actions = audit_result['action'].nunique()
-                st.metric("Action Types", unique_actions)
+                st.metric("Action Types", int(stats['unique_actions']))
         else:
             st.info("No audit log entries found for the selected criteria.")
             
     except Exception as e:
         st.error(f"Failed to load audit log: {str(e)}")
 
+def _deny(message: str):
+    """Report a failed permission check from check_permission_decorator"""
+    st.error(message)
+    return None
+
 def check_permission_decorator(permission_required: str):
     """Decorator to check permissions before executing functions"""
+    denied = f"🚫 Access Denied: This action requires '{permission_required}' permission."
+    
     def decorator(func):
+        @wraps(func)
         def wrapper(*args, **kwargs):
-            # Assuming role_manager and current_user_id are available in the context
-            if 'role_manager' in st.session_state and 'current_user_id' in st.session_state:
-                role_manager = st.session_state['role_manager']
-                current_user_id = st.session_state['current_user_id']
-                
-                if role_manager.has_permission(current_user_id, permission_required):
-                    return func(*args, **kwargs)
-                else:
-                    st.error(f"🚫 Access Denied: This action requires '{permission_required}' permission.")
-                    return None
-            else:
-                st.error("🚫 Authentication required.")
-                return None
+            current_user_id = st.session_state.get('current_user_id')
+            perms = _cached_permissions(current_user_id)
+            
+            if perms is None:
+                # Not loaded yet or expired; fetch through the stored role manager
+                role_manager = st.session_state.get('role_manager')
+                if role_manager is None or current_user_id is None:
+                    return _deny("🚫 Authentication required.")
+                perms = _load_permissions(role_manager, current_user_id)
+            
+            return func(*args, **kwargs) if permission_required in perms else _deny(denied)
         return wrapper
-    return decorator
\ No newline at end of file
+    return decorator
@@ -3,39 +3,139 @@ Advanced Settings Management System
 Handles user preferences, configuration persistence, and settings validation
 """
 
+import atexit
 import json
-from typing import Dict, Any, Optional, List
-from datetime import datetime
+import pandas as pd
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+from time import monotonic, sleep
+from typing import Dict, Any, Optional, List, Tuple
+from datetime import datetime, timezone
+
+from database import BatchedInsertQueue
+
+
+_TRUTHY = frozenset(('true', '1', 'yes', 'on'))
+
+# Exact Python type -> data_type; subclasses fall back to isinstance checks
+_DATA_TYPES = {
+    bool: 'boolean',
+    int: 'integer',
+    float: 'float',
+    dict: 'json',
+    list: 'json',
+    str: 'string',
+}
+
+
+# (category, key, value) overrides applied on top of the defaults for each template
+_TEMPLATE_OVERRIDES = {
+    'minimal': (
+        ('appearance', 'animations_enabled', False),
+        ('appearance', 'particles_enabled', False),
+        ('notifications', 'email_notifications', False),
+        ('performance', 'reduce_animations', True),
+    ),
+    'performance': (
+        ('appearance', 'animations_enabled', False),
+        ('appearance', 'particles_enabled', False),
+        ('performance', 'reduce_animations', True),
+        ('performance', 'limit_chart_data', True),
+        ('performance', 'compress_images', True),
+    ),
+    'accessibility': (
+        ('accessibility', 'screen_reader_support', True),
+        ('accessibility', 'large_text', True),
+        ('accessibility', 'reduced_motion', True),
+        ('appearance', 'high_contrast', True),
+    ),
+    'advanced': (
+        ('trading', 'detailed_analytics', True),
+        ('notifications', 'email_notifications', True),
+        ('performance', 'show_performance_metrics', True),
+    ),
+}
+
+# Shared by every SettingsManager, since one is built per Streamlit rerun
+_audit_queue = BatchedInsertQueue("""
+    INSERT INTO settings_audit (user_id, category, setting_key, old_value, new_value, change_reason, changed_at)
+    VALUES %s
+""", name="settings-audit")
+atexit.register(_audit_queue.flush)
 
 
 class SettingsManager:
     """Comprehensive settings management with database persistence"""
     
-    def __init__(self, db_manager):
+    # Per-user settings cache shared by all instances, since the app builds a
+    # new SettingsManager on every rerun; user_id -> (loaded_at, settings)
+    _settings_cache: "OrderedDict[int, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+    _settings_cache_size = 4096
+    _settings_ttl = 60
+    _settings_cache_lock = threading.Lock()
+    
+    # Optional shared cache for multi-worker deployments
+    _redis_ttl = 300
+    _redis_lock_ttl = 5
+    
+    # Categories and templates only change through the seeding in
+    # init_settings_tables, so they are loaded once per process
+    _categories_cache: Optional[List[Dict[str, Any]]] = None
+    _templates_cache: Optional[List[Dict[str, Any]]] = None
+    
+    # Bulk saves larger than this are staged with COPY instead of multi-VALUES
+    _copy_threshold = 500
+    
+    def __init__(self, db_manager, redis_client=None):
         self.db = db_manager
+        self.redis = redis_client
         self.default_settings = self._get_default_settings()
-        self.init_settings_tables()
+        # Fresh nested copies come from parsing this, never from mutating default_settings
+        self._default_settings_json = json.dumps(self.default_settings)
+        if SettingsManager._categories_cache is None:
+            self.init_settings_tables()
+            self.refresh_static_caches()
     
     def init_settings_tables(self):
         """Initialize settings storage tables"""
         try:
-            # User settings table
+            # All settings DDL in one round-trip
             self.db.execute_query("""
+                -- One-byte-per-row storage type tag instead of a VARCHAR
+                DO $$
+                BEGIN
+                    IF NOT EXISTS (SELECT 1 FROM pg_type WHERE typname = 'setting_type') THEN
+                        CREATE TYPE setting_type AS ENUM ('string', 'boolean', 'integer', 'float', 'json');
+                    END IF;
+                END $$;
+                
                 CREATE TABLE IF NOT EXISTS user_settings (
                     setting_id SERIAL PRIMARY KEY,
                     user_id INTEGER NOT NULL REFERENCES users(user_id) ON DELETE CASCADE,
                     category VARCHAR(50) NOT NULL,
                     setting_key VARCHAR(100) NOT NULL,
                     setting_value TEXT NOT NULL,
-                    data_type VARCHAR(20) DEFAULT 'string',
+                    data_type setting_type DEFAULT 'string',
                     created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
                     updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
                     UNIQUE(user_id, category, setting_key)
-                )
-            """, fetch=False)
-            
-            # Settings categories table
-            self.db.execute_query("""
+                );
+                
+                -- Older installs stored data_type as VARCHAR(20)
+                DO $$
+                BEGIN
+                    IF (SELECT data_type FROM information_schema.columns
+                        WHERE table_name = 'user_settings' AND column_name = 'data_type') = 'character varying' THEN
+                        ALTER TABLE user_settings ALTER COLUMN data_type DROP DEFAULT;
+                        ALTER TABLE user_settings ALTER COLUMN data_type TYPE setting_type
+                            USING (CASE WHEN data_type IN ('boolean', 'integer', 'float', 'json')
+                                        THEN data_type ELSE 'string' END)::setting_type;
+                        ALTER TABLE user_settings ALTER COLUMN data_type SET DEFAULT 'string';
+                    END IF;
+                END $$;
+                
+                -- Settings categories
                 CREATE TABLE IF NOT EXISTS settings_categories (
                     category_id SERIAL PRIMARY KEY,
                     category_name VARCHAR(50) UNIQUE NOT NULL,
@@ -44,25 +144,31 @@ class SettingsManager:
                     icon VARCHAR(20),
                     sort_order INTEGER DEFAULT 0,
                     is_active BOOLEAN DEFAULT TRUE
-                )
-            """, fetch=False)
-            
-            # Settings templates for different user types
-            self.db.execute_query("""
+                );
+                
+                -- Settings templates for different user types
                 CREATE TABLE IF NOT EXISTS settings_templates (
                     template_id SERIAL PRIMARY KEY,
                     template_name VARCHAR(50) UNIQUE NOT NULL,
                     display_name VARCHAR(100) NOT NULL,
                     description TEXT,
                     user_type VARCHAR(20) DEFAULT 'regular',
-                    settings_json TEXT NOT NULL,
+                    settings_json JSONB NOT NULL,
                     is_default BOOLEAN DEFAULT FALSE,
                     created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
-                )
-            """, fetch=False)
-            
-            # Settings audit log
-            self.db.execute_query("""
+                );
+                
+                -- Older installs stored templates as TEXT
+                DO $$
+                BEGIN
+                    IF (SELECT data_type FROM information_schema.columns
+                        WHERE table_name = 'settings_templates' AND column_name = 'settings_json') = 'text' THEN
+                        ALTER TABLE settings_templates
+                            ALTER COLUMN settings_json TYPE JSONB USING settings_json::jsonb;
+                    END IF;
+                END $$;
+                
+                -- Settings audit log
                 CREATE TABLE IF NOT EXISTS settings_audit (
                     audit_id SERIAL PRIMARY KEY,
                     user_id INTEGER NOT NULL REFERENCES users(user_id),
@@ -73,7 +179,13 @@ class SettingsManager:
                     change_reason VARCHAR(200),
                     changed_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
                     ip_address VARCHAR(45)
-                )
+                );
+                
+                -- Indexes for the per-user settings load and the audit log page
+                CREATE INDEX IF NOT EXISTS idx_settings_audit_user_time
+                    ON settings_audit(user_id, changed_at DESC);
+                CREATE INDEX IF NOT EXISTS idx_user_settings_user ON user_settings(user_id)
+                    INCLUDE (category, setting_key, setting_value, data_type);
             """, fetch=False)
             
             self._insert_default_categories()
@@ -82,7 +194,8 @@ class SettingsManager:
         except Exception as e:
             print(f"Settings table initialization error: {str(e)}")
     
-    def _get_default_settings(self) -> Dict[str, Any]:
+    @staticmethod
+    def _get_default_settings() -> Dict[str, Any]:
         """Define comprehensive default settings"""
         return {
             'appearance': {
@@ -172,15 +285,11 @@ class SettingsManager:
             ('accessibility', 'Accessibility', 'Accessibility and user assistance', '♿', 6)
         ]
         
-        for category, display_name, description, icon, sort_order in categories:
-            try:
-                self.db.execute_query("""
-                    INSERT INTO settings_categories (category_name, display_name, description, icon, sort_order)
-                    VALUES (%s, %s, %s, %s, %s)
-                    ON CONFLICT (category_name) DO NOTHING
-                """, (category, display_name, description, icon, sort_order), fetch=False)
-            except Exception:
-                pass
+        self.db.execute_values("""
+            INSERT INTO settings_categories (category_name, display_name, description, icon, sort_order)
+            VALUES %s
+            ON CONFLICT (category_name) DO NOTHING
+        """, categories)
     
     def _insert_default_templates(self):
         """Insert default settings templates"""
@@ -191,49 +300,102 @@ class SettingsManager:
             ('advanced', 'Advanced User', 'Full feature set enabled', 'premium')
         ]
         
-        for template_name, display_name, description, user_type in templates:
-            settings_json = json.dumps(self._get_template_settings(template_name))
-            try:
-                self.db.execute_query("""
-                    INSERT INTO settings_templates (template_name, display_name, description, user_type, settings_json)
-                    VALUES (%s, %s, %s, %s, %s)
-                    ON CONFLICT (template_name) DO NOTHING
-                """, (template_name, display_name, description, user_type, settings_json), fetch=False)
-            except Exception:
-                pass
-    
-    def _get_template_settings(self, template_name: str) -> Dict[str, Any]:
-        """Get settings for specific template"""
-        base_settings = self.default_settings.copy()
-        
-        if template_name == 'minimal':
-            base_settings['appearance']['animations_enabled'] = False
-            base_settings['appearance']['particles_enabled'] = False
-            base_settings['notifications']['email_notifications'] = False
-            base_settings['performance']['reduce_animations'] = True
-            
-        elif template_name == 'performance':
-            base_settings['appearance']['animations_enabled'] = False
-            base_settings['appearance']['particles_enabled'] = False
-            base_settings['performance']['reduce_animations'] = True
-            base_settings['performance']['limit_chart_data'] = True
-            base_settings['performance']['compress_images'] = True
-            
-        elif template_name == 'accessibility':
-            base_settings['accessibility']['screen_reader_support'] = True
-            base_settings['accessibility']['large_text'] = True
-            base_settings['accessibility']['reduced_motion'] = True
-            base_settings['appearance']['high_contrast'] = True
-            
-        elif template_name == 'advanced':
-            base_settings['trading']['detailed_analytics'] = True
-            base_settings['notifications']['email_notifications'] = True
-            base_settings['performance']['show_performance_metrics'] = True
+        rows = [
+            (template_name, display_name, description, user_type,
+             self._template_settings_json(template_name))
+            for template_name, display_name, description, user_type in templates
+        ]
         
-        return base_settings
+        self.db.execute_values("""
+            INSERT INTO settings_templates (template_name, display_name, description, user_type, settings_json)
+            VALUES %s
+            ON CONFLICT (template_name) DO NOTHING
+        """, rows, template="(%s, %s, %s, %s, %s::jsonb)")
+    
+    @staticmethod
+    @lru_cache(maxsize=None)
+    def _template_settings_json(template_name: str) -> str:
+        """Serialized settings for a template, built once per process"""
+        base_settings = SettingsManager._get_default_settings()
+        for category, key, value in _TEMPLATE_OVERRIDES.get(template_name, ()):
+            base_settings[category][key] = value
+        return json.dumps(base_settings)
+    
+    def _get_cached_settings(self, user_id: int) -> Optional[Dict[str, Any]]:
+        """Return cached settings for a user if still fresh"""
+        with self._settings_cache_lock:
+            cached = SettingsManager._settings_cache.get(user_id)
+            if cached is None or monotonic() - cached[0] >= self._settings_ttl:
+                return None
+            SettingsManager._settings_cache.move_to_end(user_id)
+            return cached[1]
+    
+    def _cache_settings(self, user_id: int, settings: Dict[str, Any]):
+        """Store a user's settings, evicting the least recently used entry"""
+        cache = SettingsManager._settings_cache
+        with self._settings_cache_lock:
+            cache[user_id] = (monotonic(), settings)
+            cache.move_to_end(user_id)
+            if len(cache) > self._settings_cache_size:
+                cache.popitem(last=False)
+    
+    def _invalidate(self, user_id: int):
+        """Drop a user's cached settings after a write"""
+        with self._settings_cache_lock:
+            SettingsManager._settings_cache.pop(user_id, None)
+        if self.redis is not None:
+            try:
+                self.redis.delete(self._redis_key(user_id))
+            except Exception as e:
+                print(f"Error invalidating cached settings: {str(e)}")
+    
+    @staticmethod
+    def _redis_key(user_id: int) -> str:
+        return f"v1:app:user:{user_id}:settings"
+    
+    def _redis_get(self, user_id: int) -> Optional[Dict[str, Any]]:
+        """Read a user's settings from Redis, or None on a miss or error"""
+        try:
+            data = self.redis.get(self._redis_key(user_id))
+            return json.loads(data) if data else None
+        except Exception as e:
+            print(f"Error reading cached settings: {str(e)}")
+            return None
+    
+    def _redis_lock(self, user_id: int) -> bool:
+        """Claim the right to rebuild a user's entry so concurrent misses don't all hit the DB"""
+        try:
+            return bool(self.redis.set(f"{self._redis_key(user_id)}:lock", 1, nx=True, ex=self._redis_lock_ttl))
+        except Exception:
+            return True
+    
+    def _redis_set(self, user_id: int, settings: Dict[str, Any]):
+        try:
+            key = self._redis_key(user_id)
+            self.redis.set(key, json.dumps(settings), ex=self._redis_ttl)
+            self.redis.delete(f"{key}:lock")
+        except Exception as e:
+            print(f"Error caching settings: {str(e)}")
     
     def get_user_settings(self, user_id: int) -> Dict[str, Any]:
-        """Get complete user settings with defaults for missing values"""
+        """Get complete user settings with defaults for missing values.
+        
+        The returned dict is shared with the cache and must not be mutated.
+        """
+        cached = self._get_cached_settings(user_id)
+        if cached is not None:
+            return cached
+        
+        if self.redis is not None:
+            cached = self._redis_get(user_id)
+            if cached is None and not self._redis_lock(user_id):
+                # Another worker is rebuilding this entry; give it a moment
+                sleep(0.05)
+                cached = self._redis_get(user_id)
+            if cached is not None:
+                self._cache_settings(user_id, cached)
+                return cached
+        
         try:
             result = self.db.execute_query("""
                 SELECT category, setting_key, setting_value, data_type
@@ -241,35 +403,25 @@ class SettingsManager:
                 WHERE user_id = %s
             """, (user_id,))
             
-            # Handle DataFrame result properly
-            if result is not None and hasattr(result, 'empty'):
-                if result.empty:
-                    result = None
-                else:
-                    result = result.values.tolist()
-            
             # Start with defaults
-            user_settings = self.default_settings.copy()
-            
-            # Override with user's saved settings
-            if result and len(result) > 0:
-                for row in result:
-                    category = row[0]
-                    key = row[1]
-                    value = row[2]
-                    data_type = row[3]
-                    
-                    # Convert value based on data type
-                    converted_value = self._convert_setting_value(value, data_type)
-                    
-                    if category in user_settings:
-                        user_settings[category][key] = converted_value
-            
+            user_settings = json.loads(self._default_settings_json)
+            
+            # Override with user's saved settings, converting one data type at a time
+            if result is not None and not result.empty:
+                for data_type, group in result.groupby('data_type', sort=False, dropna=False):
+                    values = self._convert_setting_column(group['setting_value'], data_type)
+                    for category, key, value in zip(group['category'], group['setting_key'], values):
+                        if category in user_settings:
+                            user_settings[category][key] = value
+            
+            self._cache_settings(user_id, user_settings)
+            if self.redis is not None:
+                self._redis_set(user_id, user_settings)
             return user_settings
             
         except Exception as e:
             print(f"Error getting user settings: {str(e)}")
-            return self.default_settings
+            return json.loads(self._default_settings_json)
     
     def save_user_setting(self, user_id: int, category: str, key: str, value: Any, change_reason: str = None) -> bool:
         """Save individual user setting with audit trail"""
@@ -277,6 +429,10 @@ class SettingsManager:
             # Get old value for audit
             old_value = self.get_user_setting(user_id, category, key)
             
+            # Nothing to write or audit if the effective value is unchanged
+            if self._same_value(old_value, value):
+                return True
+            
             # Determine data type
             data_type = self._get_data_type(value)
             
@@ -284,7 +440,7 @@ class SettingsManager:
             str_value = self._convert_to_string(value)
             
             # Save setting
-            self.db.execute_query("""
+            saved = self.db.execute_query("""
                 INSERT INTO user_settings (user_id, category, setting_key, setting_value, data_type, updated_at)
                 VALUES (%s, %s, %s, %s, %s, CURRENT_TIMESTAMP)
                 ON CONFLICT (user_id, category, setting_key)
@@ -293,6 +449,9 @@ class SettingsManager:
                     data_type = EXCLUDED.data_type,
                     updated_at = CURRENT_TIMESTAMP
             """, (user_id, category, key, str_value, data_type), fetch=False)
+            if not saved:
+                return False
+            self._invalidate(user_id)
             
             # Add audit entry
             self._log_setting_change(user_id, category, key, old_value, value, change_reason)
@@ -306,9 +465,58 @@ class SettingsManager:
     def save_user_settings_bulk(self, user_id: int, settings: Dict[str, Any]) -> bool:
         """Save multiple settings at once"""
         try:
+            # Current values for the audit trail, fetched once for the whole batch
+            old_settings = self.get_user_settings(user_id)
+            
+            rows = []
+            changes = []
             for category, category_settings in settings.items():
                 for key, value in category_settings.items():
-                    self.save_user_setting(user_id, category, key, value, "Bulk update")
+                    old_value = old_settings.get(category, {}).get(key)
+                    if self._same_value(old_value, value):
+                        continue
+                    rows.append((user_id, category, key, self._convert_to_string(value), self._get_data_type(value)))
+                    changes.append((category, key, old_value, value))
+            
+            if not rows:
+                return True
+            
+            if len(rows) > self._copy_threshold:
+                # Large imports: stage with COPY, then upsert in one statement
+                saved = self.db.copy_rows("""
+                    CREATE TEMP TABLE tmp_settings (
+                        user_id INTEGER, category VARCHAR(50), setting_key VARCHAR(100),
+                        setting_value TEXT, data_type VARCHAR(20)
+                    ) ON COMMIT DROP
+                """, "COPY tmp_settings FROM STDIN WITH CSV", rows, """
+                    INSERT INTO user_settings (user_id, category, setting_key, setting_value, data_type, updated_at)
+                    SELECT DISTINCT ON (user_id, category, setting_key)
+                           user_id, category, setting_key, setting_value, data_type::setting_type, CURRENT_TIMESTAMP
+                    FROM tmp_settings
+                    ON CONFLICT (user_id, category, setting_key)
+                    DO UPDATE SET 
+                        setting_value = EXCLUDED.setting_value,
+                        data_type = EXCLUDED.data_type,
+                        updated_at = CURRENT_TIMESTAMP
+                """)
+            else:
+                saved = self.db.execute_values("""
+                    INSERT INTO user_settings (user_id, category, setting_key, setting_value, data_type, updated_at)
+                    VALUES %s
+                    ON CONFLICT (user_id, category, setting_key)
+                    DO UPDATE SET 
+                        setting_value = EXCLUDED.setting_value,
+                        data_type = EXCLUDED.data_type,
+                        updated_at = CURRENT_TIMESTAMP
+                """, rows, page_size=1000, template="(%s, %s, %s, %s, %s, CURRENT_TIMESTAMP)")
+            
+            if not saved:
+                return False
+            self._invalidate(user_id)
+            
+            for category, key, old_value, value in changes:
+                self._log_setting_change(user_id, category, key, old_value, value, "Bulk update")
+            
             return True
         except Exception as e:
             print(f"Error bulk saving settings: {str(e)}")
@@ -316,45 +524,32 @@ class SettingsManager:
     
     def get_user_setting(self, user_id: int, category: str, key: str) -> Any:
         """Get specific user setting with fallback to default"""
-        try:
-            result = self.db.execute_query("""
-                SELECT setting_value, data_type
-                FROM user_settings
-                WHERE user_id = %s AND category = %s AND setting_key = %s
-            """, (user_id, category, key))
-            
-            if result and len(result) > 0:
-                value = result[0][0]
-                data_type = result[0][1]
-                return self._convert_setting_value(value, data_type)
-            
-            # Return default if not found
-            if category in self.default_settings and key in self.default_settings[category]:
-                return self.default_settings[category][key]
-            
-            return None
-            
-        except Exception as e:
-            print(f"Error getting user setting: {str(e)}")
-            return None
+        return self.get_user_settings(user_id).get(category, {}).get(
+            key, self.default_settings.get(category, {}).get(key)
+        )
     
     def reset_user_settings(self, user_id: int, category: str = None) -> bool:
         """Reset user settings to defaults"""
+        self._invalidate(user_id)
         try:
             if category:
                 # Reset specific category
-                self.db.execute_query("""
+                deleted = self.db.execute_query("""
                     DELETE FROM user_settings
                     WHERE user_id = %s AND category = %s
                 """, (user_id, category), fetch=False)
+                if not deleted:
+                    return False
                 
                 self._log_setting_change(user_id, category, '*', 'custom', 'default', f"Reset {category} category")
             else:
                 # Reset all settings
-                self.db.execute_query("""
+                deleted = self.db.execute_query("""
                     DELETE FROM user_settings
                     WHERE user_id = %s
                 """, (user_id,), fetch=False)
+                if not deleted:
+                    return False
                 
                 self._log_setting_change(user_id, '*', '*', 'custom', 'default', "Reset all settings")
             
@@ -366,14 +561,17 @@ class SettingsManager:
     
     def apply_settings_template(self, user_id: int, template_name: str) -> bool:
         """Apply settings template to user"""
+        self._invalidate(user_id)
         try:
-            result = self.db.execute_query("""
+            template_settings = self.db.fetch_one_scalar("""
                 SELECT settings_json FROM settings_templates
                 WHERE template_name = %s
             """, (template_name,))
             
-            if result and len(result) > 0:
-                template_settings = json.loads(result[0][0])
+            if template_settings is not None:
+                # JSONB comes back already decoded
+                if isinstance(template_settings, str):
+                    template_settings = json.loads(template_settings)
                 success = self.save_user_settings_bulk(user_id, template_settings)
                 
                 if success:
@@ -399,6 +597,7 @@ class SettingsManager:
     
     def import_user_settings(self, user_id: int, settings_data: Dict[str, Any]) -> bool:
         """Import user settings from JSON"""
+        self._invalidate(user_id)
         try:
             if 'settings' in settings_data:
                 return self.save_user_settings_bulk(user_id, settings_data['settings'])
@@ -407,82 +606,80 @@ class SettingsManager:
             print(f"Error importing settings: {str(e)}")
             return False
     
+    def refresh_static_caches(self):
+        """Reload settings categories and templates from the database"""
+        SettingsManager._categories_cache = self._load_settings_categories()
+        SettingsManager._templates_cache = self._load_available_templates()
+    
     def get_settings_categories(self) -> List[Dict[str, Any]]:
         """Get available settings categories"""
+        return list(SettingsManager._categories_cache or [])
+    
+    def get_available_templates(self) -> List[Dict[str, Any]]:
+        """Get available settings templates"""
+        return list(SettingsManager._templates_cache or [])
+    
+    def _load_settings_categories(self) -> List[Dict[str, Any]]:
+        """Load active settings categories"""
         try:
-            result = self.db.execute_query("""
-                SELECT category_name, display_name, description, icon, sort_order
+            return self.db.execute_query("""
+                SELECT category_name AS name, display_name, description, icon, sort_order
                 FROM settings_categories
                 WHERE is_active = TRUE
                 ORDER BY sort_order
-            """)
-            
-            if result:
-                return [
-                    {
-                        'name': row[0],
-                        'display_name': row[1],
-                        'description': row[2],
-                        'icon': row[3],
-                        'sort_order': row[4]
-                    }
-                    for row in result
-                ]
-            return []
+            """, as_df=False)
             
         except Exception as e:
             print(f"Error getting settings categories: {str(e)}")
             return []
     
-    def get_available_templates(self) -> List[Dict[str, Any]]:
-        """Get available settings templates"""
+    def _load_available_templates(self) -> List[Dict[str, Any]]:
+        """Load settings templates"""
         try:
-            result = self.db.execute_query("""
-                SELECT template_name, display_name, description, user_type
+            return self.db.execute_query("""
+                SELECT template_name AS name, display_name, description, user_type
                 FROM settings_templates
                 ORDER BY template_name
-            """)
-            
-            if result:
-                return [
-                    {
-                        'name': row[0],
-                        'display_name': row[1],
-                        'description': row[2],
-                        'user_type': row[3]
-                    }
-                    for row in result
-                ]
-            return []
+            """, as_df=False)
             
         except Exception as e:
             print(f"Error getting templates: {str(e)}")
             return []
     
-    def _convert_setting_value(self, value: str, data_type: str) -> Any:
-        """Convert string value to appropriate data type"""
+    def _convert_setting_column(self, values: pd.Series, data_type: str) -> List[Any]:
+        """Convert a column of stored strings sharing one data type to Python values"""
         if data_type == 'boolean':
-            return value.lower() in ('true', '1', 'yes', 'on')
+            return values.str.lower().isin(_TRUTHY).tolist()
         elif data_type == 'integer':
-            return int(value)
+            return pd.to_numeric(values).astype('int64').tolist()
         elif data_type == 'float':
-            return float(value)
+            return pd.to_numeric(values).astype(float).tolist()
         elif data_type == 'json':
-            return json.loads(value)
+            return values.map(json.loads).tolist()
         else:
-            return value
+            return values.tolist()
+    
+    @staticmethod
+    def _same_value(old_value: Any, value: Any) -> bool:
+        """Whether saving value would leave the stored setting unchanged (True is not 1)"""
+        return type(old_value) is type(value) and old_value == value
     
     def _convert_to_string(self, value: Any) -> str:
         """Convert value to string for storage"""
+        if value is True:
+            return 'true'
+        if value is False:
+            return 'false'
         if isinstance(value, (dict, list)):
             return json.dumps(value)
-        elif isinstance(value, bool):
-            return str(value).lower()
-        else:
-            return str(value)
+        return str(value)
     
     def _get_data_type(self, value: Any) -> str:
         """Determine data type of value"""
+        data_type = _DATA_TYPES.get(type(value))
+        if data_type is not None:
+            return data_type
+        
         if isinstance(value, bool):
             return 'boolean'
         elif isinstance(value, int):
@@ -496,39 +693,25 @@ class SettingsManager:
     
     def _log_setting_change(self, user_id: int, category: str, key: str, old_value: Any, new_value: Any, reason: str = None):
         """Log setting change for audit trail"""
-        try:
-            self.db.execute_query("""
-                INSERT INTO settings_audit (user_id, category, setting_key, old_value, new_value, change_reason)
-                VALUES (%s, %s, %s, %s, %s, %s)
-            """, (user_id, category, key, str(old_value), str(new_value), reason), fetch=False)
-        except Exception:
-            pass  # Don't fail if audit logging fails
+        # Guests (user_id -1) have no users row, so their entries could never be written
+        if user_id is None or user_id <= 0:
+            return
+        _audit_queue.put(self.db, (
+            user_id, category, key, str(old_value), str(new_value), reason, datetime.now(timezone.utc)
+        ))
     
     def get_settings_audit_log(self, user_id: int, days: int = 30) -> List[Dict[str, Any]]:
         """Get settings change audit log"""
         try:
-            result = self.db.execute_query("""
-                SELECT category, setting_key, old_value, new_value, change_reason, changed_at
+            return self.db.execute_query("""
+                SELECT category, setting_key AS key, old_value, new_value,
+                       change_reason AS reason, changed_at AS timestamp
                 FROM settings_audit
-                WHERE user_id = %s AND changed_at >= CURRENT_TIMESTAMP - INTERVAL '%s days'
+                WHERE user_id = %s AND changed_at >= CURRENT_TIMESTAMP - make_interval(days => %s)
                 ORDER BY changed_at DESC
                 LIMIT 100
-            """, (user_id, days))
-            
-            if result:
-                return [
-                    {
-                        'category': row[0],
-                        'key': row[1],
-                        'old_value': row[2],
-                        'new_value': row[3],
-                        'reason': row[4],
-                        'timestamp': row[5]
-                    }
-                    for row in result
-                ]
-            return []
+            """, (user_id, int(days)), as_df=False)
             
         except Exception as e:
             print(f"Error getting audit log: {str(e)}")
-            return []
\ No newline at end of file
+            return []
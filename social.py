@@ -1,14 +1,44 @@
 import pandas as pd
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
+from time import monotonic
 import logging
+import pickle
+import threading
+
+# Leaderboards are served from these materialized views and refreshed in the background
+LEADERBOARD_VIEWS = ('mv_leaderboard_profit', 'mv_leaderboard_achievements')
+LEADERBOARD_REFRESH_INTERVAL = 300
+
+_refresher_lock = threading.Lock()
+_refresher_thread = None
+
+# Overlaps independent social reads on separate pooled connections
+_read_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="social-read")
 
 class SocialManager:
     """Enhanced social features for the gaming platform"""
     
-    def __init__(self, db_manager):
+    # Slow-changing read results shared by all instances; key -> (loaded_at, result)
+    _query_cache: "OrderedDict[str, tuple]" = OrderedDict()
+    _query_cache_size = 1024
+    # Read by script threads, the read executor and the leaderboard refresher
+    _query_cache_lock = threading.Lock()
+    _leaderboard_ttl = 300
+    _trending_ttl = 60
+    _groups_ttl = 60
+    
+    # The schema and its migrations only need running once per process, not per instance
+    _tables_initialized = False
+    
+    def __init__(self, db_manager, redis_client=None):
         self.db_manager = db_manager
+        self.redis = redis_client
         self.logger = logging.getLogger(__name__)
-        self.init_social_tables()
+        
+        if not SocialManager._tables_initialized:
+            SocialManager._tables_initialized = bool(self.init_social_tables())
     
     def init_social_tables(self):
         """Initialize social feature database tables"""
@@ -35,10 +65,15 @@ class SocialManager:
             likes_count INTEGER DEFAULT 0,
             comments_count INTEGER DEFAULT 0,
             visibility VARCHAR(20) DEFAULT 'public',
+            author_username VARCHAR(255),
+            author_display_name VARCHAR(255),
             created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
             updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
         );
         
+        ALTER TABLE user_posts ADD COLUMN IF NOT EXISTS author_username VARCHAR(255);
+        ALTER TABLE user_posts ADD COLUMN IF NOT EXISTS author_display_name VARCHAR(255);
+        
         CREATE TABLE IF NOT EXISTS trading_groups (
             id SERIAL PRIMARY KEY,
             name VARCHAR(255) NOT NULL UNIQUE,
@@ -49,49 +84,210 @@ class SocialManager:
             group_type VARCHAR(50) DEFAULT 'casual',
             created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
         );
+        
+        CREATE TABLE IF NOT EXISTS group_memberships (
+            id SERIAL PRIMARY KEY,
+            group_id INTEGER NOT NULL REFERENCES trading_groups(id) ON DELETE CASCADE,
+            user_id INTEGER NOT NULL REFERENCES users(user_id) ON DELETE CASCADE,
+            role VARCHAR(20) DEFAULT 'member',
+            joined_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+            UNIQUE(group_id, user_id)
+        );
         """
         
-        return self.db_manager.execute_query(query, fetch=False)
+        created = self.db_manager.execute_query(query, fetch=False)
+        
+        ddl_queries = [
+            "CREATE INDEX IF NOT EXISTS user_friends_friend_status_idx ON user_friends(friend_id, status) WHERE status = 'pending'",
+            "CREATE INDEX IF NOT EXISTS user_friends_user_status_idx ON user_friends(user_id, status) WHERE status = 'accepted'",
+            "CREATE INDEX IF NOT EXISTS user_posts_feed_idx ON user_posts(user_id, created_at DESC, id DESC) WHERE visibility = 'public'",
+            "DROP INDEX IF EXISTS user_posts_created_idx",
+            "CREATE INDEX IF NOT EXISTS group_memberships_user_idx ON group_memberships(user_id)",
+            "CREATE INDEX IF NOT EXISTS character_discussions_created_idx ON character_discussions(created_at DESC)",
+            "ALTER TABLE character_discussions ADD COLUMN IF NOT EXISTS score INTEGER GENERATED ALWAYS AS (upvotes - downvotes) STORED",
+            "CREATE INDEX IF NOT EXISTS character_discussions_score_idx ON character_discussions(score DESC, replies_count DESC, created_at)",
+        ]
+        # One statement each: tables owned by other modules may not exist yet
+        for ddl_query in ddl_queries:
+            self.db_manager.execute_query(ddl_query, fetch=False)
+        
+        # Backfill author fields on posts written before they were denormalized
+        self.db_manager.execute_query("""
+            UPDATE user_posts p
+            SET author_username = u.username, author_display_name = u.display_name
+            FROM users u
+            WHERE u.user_id = p.user_id AND p.author_username IS NULL
+        """, fetch=False)
+        
+        self.init_leaderboard_views()
+        return created
+    
+    def init_leaderboard_views(self):
+        """Create the leaderboard materialized views and start their refresh job"""
+        # Separate statements so a failing view doesn't roll back the social tables
+        statements = [
+            """
+            CREATE MATERIALIZED VIEW IF NOT EXISTS mv_leaderboard_profit AS
+            SELECT u.user_id, u.username, u.display_name, u.virtual_currency,
+                   COALESCE(SUM(t.profit_loss), 0) as total_profit,
+                   COUNT(t.trade_id) as trade_count
+            FROM users u
+            LEFT JOIN trades t ON u.user_id = t.user_id
+            WHERE u.role != 'Banned'
+            GROUP BY u.user_id, u.username, u.display_name, u.virtual_currency
+            """,
+            "CREATE UNIQUE INDEX IF NOT EXISTS mv_leaderboard_profit_user_idx ON mv_leaderboard_profit(user_id)",
+            "CREATE INDEX IF NOT EXISTS mv_leaderboard_profit_rank_idx ON mv_leaderboard_profit(total_profit DESC)",
+            """
+            CREATE MATERIALIZED VIEW IF NOT EXISTS mv_leaderboard_achievements AS
+            SELECT u.user_id, u.username, u.display_name,
+                   COUNT(ua.achievement_id) as achievement_count
+            FROM users u
+            LEFT JOIN user_achievements ua ON u.user_id = ua.user_id
+            WHERE u.role != 'Banned'
+            GROUP BY u.user_id, u.username, u.display_name
+            """,
+            "CREATE UNIQUE INDEX IF NOT EXISTS mv_leaderboard_achievements_user_idx ON mv_leaderboard_achievements(user_id)",
+            "CREATE INDEX IF NOT EXISTS mv_leaderboard_achievements_rank_idx ON mv_leaderboard_achievements(achievement_count DESC)",
+        ]
+        for statement in statements:
+            self.db_manager.execute_query(statement, fetch=False)
+        
+        self._start_leaderboard_refresher()
+    
+    def refresh_leaderboards(self):
+        """Recompute the leaderboard views without blocking readers"""
+        for view in LEADERBOARD_VIEWS:
+            if not self.db_manager.execute_query(f"REFRESH MATERIALIZED VIEW CONCURRENTLY {view}", fetch=False):
+                self.logger.error(f"Failed to refresh {view}")
+    
+    def _start_leaderboard_refresher(self):
+        """Start one refresh/warm-up thread per process; managers are rebuilt per rerun"""
+        global _refresher_thread
+        with _refresher_lock:
+            if _refresher_thread is not None:
+                return
+            _refresher_thread = threading.Thread(
+                target=self._refresh_leaderboards_forever, name="leaderboard-refresh", daemon=True
+            )
+            _refresher_thread.start()
+    
+    def _refresh_leaderboards_forever(self):
+        # Warm straight away so the first page view after a restart isn't the one paying
+        try:
+            self._warm_caches()
+        except Exception as e:
+            self.logger.error(f"Cache warm-up error: {e}")
+        
+        stop = threading.Event()
+        while not stop.wait(LEADERBOARD_REFRESH_INTERVAL):
+            try:
+                self.refresh_leaderboards()
+                self._warm_caches()
+            except Exception as e:
+                self.logger.error(f"Leaderboard refresh error: {e}")
+    
+    def _warm_caches(self):
+        """Recompute the default leaderboard and trending cache entries"""
+        for category in ('profit', 'achievements'):
+            self._invalidate(f"v1:app:social:leaderboard:{category}:10")
+            self.get_leaderboard(category)
+        self._invalidate("v1:app:social:trending:10")
+        self.get_trending_discussions()
+    
+    def _cached(self, key, ttl, fn):
+        """Return fn()'s rows through the process and Redis caches.
+        
+        Cached rows are shared between callers and must not be mutated.
+        """
+        cache = SocialManager._query_cache
+        with self._query_cache_lock:
+            cached = cache.get(key)
+            if cached is not None and monotonic() - cached[0] < ttl:
+                cache.move_to_end(key)
+                return cached[1]
+        
+        result = self._redis_get(key)
+        if result is None:
+            result = fn()
+            # Errors come back as empty lists; don't pin those for a whole TTL
+            if not result:
+                return result
+            self._redis_set(key, result, ttl)
+        
+        with self._query_cache_lock:
+            cache[key] = (monotonic(), result)
+            cache.move_to_end(key)
+            if len(cache) > self._query_cache_size:
+                cache.popitem(last=False)
+        return result
+    
+    def _invalidate(self, key):
+        """Drop a cached result after a write that changes it"""
+        with self._query_cache_lock:
+            SocialManager._query_cache.pop(key, None)
+        if self.redis is not None:
+            try:
+                self.redis.delete(key)
+            except Exception as e:
+                self.logger.error(f"Cache invalidation error: {e}")
+    
+    def _redis_get(self, key):
+        if self.redis is None:
+            return None
+        try:
+            data = self.redis.get(key)
+            # Pickle keeps timestamps and numerics intact; only this app writes these keys
+            return pickle.loads(data) if data else None
+        except Exception as e:
+            self.logger.error(f"Cache read error: {e}")
+            return None
+    
+    def _redis_set(self, key, result, ttl):
+        if self.redis is None:
+            return
+        try:
+            self.redis.setex(key, ttl, pickle.dumps([dict(row) for row in result]))
+        except Exception as e:
+            self.logger.error(f"Cache write error: {e}")
     
     def send_friend_request(self, user_id, friend_id):
-        """Send friend request"""
+        """Send friend request, accepting it outright if friend_id already asked user_id"""
         query = """
+        WITH reverse AS (
+            UPDATE user_friends
+            SET status = 'accepted', updated_at = CURRENT_TIMESTAMP
+            WHERE user_id = %s AND friend_id = %s AND status = 'pending'
+            RETURNING 1
+        )
         INSERT INTO user_friends (user_id, friend_id, status)
-        VALUES (%s, %s, 'pending')
-        ON CONFLICT (user_id, friend_id) DO NOTHING
+        VALUES (%s, %s, CASE WHEN EXISTS (SELECT 1 FROM reverse) THEN 'accepted' ELSE 'pending' END)
+        ON CONFLICT (user_id, friend_id)
+        DO UPDATE SET status = 'accepted', updated_at = CURRENT_TIMESTAMP
+        WHERE EXCLUDED.status = 'accepted'
         """
-        return self.db_manager.execute_query(query, (user_id, friend_id), fetch=False)
+        return self.db_manager.execute_prepared(
+            "social_send_friend_request_v2", query, (friend_id, user_id, user_id, friend_id)
+        )
     
     def accept_friend_request(self, user_id, friend_id):
         """Accept friend request and create mutual friendship"""
-        conn = self.db_manager.get_connection()
-        try:
-            cursor = conn.cursor()
-            
-            # Update original request
-            cursor.execute("""
-                UPDATE user_friends 
-                SET status = 'accepted', updated_at = CURRENT_TIMESTAMP
-                WHERE user_id = %s AND friend_id = %s
-            """, (friend_id, user_id))
-            
-            # Create mutual friendship
-            cursor.execute("""
-                INSERT INTO user_friends (user_id, friend_id, status)
-                VALUES (%s, %s, 'accepted')
-                ON CONFLICT (user_id, friend_id) 
-                DO UPDATE SET status = 'accepted', updated_at = CURRENT_TIMESTAMP
-            """, (user_id, friend_id))
-            
-            conn.commit()
-            return True
-            
-        except Exception as e:
-            self.logger.error(f"Accept friend request error: {e}")
-            conn.rollback()
-            return False
-        finally:
-            self.db_manager.return_connection(conn)
+        # Both directions are written in one statement and one round-trip
+        query = """
+        WITH upd AS (
+            UPDATE user_friends
+            SET status = 'accepted', updated_at = CURRENT_TIMESTAMP
+            WHERE user_id = %s AND friend_id = %s
+            RETURNING 1
+        )
+        INSERT INTO user_friends (user_id, friend_id, status)
+        VALUES (%s, %s, 'accepted')
+        ON CONFLICT (user_id, friend_id)
+        DO UPDATE SET status = 'accepted', updated_at = CURRENT_TIMESTAMP
+        """
+        return self.db_manager.execute_query(
+            query, (friend_id, user_id, user_id, friend_id), fetch=False
+        )
     
     def get_user_friends(self, user_id):
         """Get user's friends list"""
@@ -102,7 +298,19 @@ class SocialManager:
         WHERE uf.user_id = %s AND uf.status = 'accepted'
         ORDER BY uf.created_at DESC
         """
-        return self.db_manager.execute_query(query, (user_id,))
+        return self.db_manager.execute_query(query, (user_id,), as_df=False)
+    
+    def get_friend_profiles_bulk(self, friend_ids):
+        """Get profile details for several friends in one query, keyed by user_id"""
+        if not friend_ids:
+            return {}
+        query = """
+        SELECT user_id, username, display_name, profile_photo, last_login
+        FROM users
+        WHERE user_id = ANY(%s::int[])
+        """
+        rows = self.db_manager.execute_query(query, ([int(i) for i in friend_ids],), as_df=False)
+        return {row['user_id']: row for row in rows}
     
     def get_pending_friend_requests(self, user_id):
         """Get pending friend requests"""
@@ -113,66 +321,146 @@ class SocialManager:
         WHERE uf.friend_id = %s AND uf.status = 'pending'
         ORDER BY uf.created_at DESC
         """
-        return self.db_manager.execute_query(query, (user_id,))
+        return self.db_manager.execute_query(query, (user_id,), as_df=False)
+    
+    def get_social_overview(self, user_id, feed_limit=50):
+        """Load everything the social page shows for a user, overlapping the queries"""
+        futures = {
+            'friends': _read_executor.submit(self.get_user_friends, user_id),
+            'pending_requests': _read_executor.submit(self.get_pending_friend_requests, user_id),
+            'feed': _read_executor.submit(self.get_activity_feed, user_id, feed_limit),
+            'groups': _read_executor.submit(self.get_user_groups, user_id),
+        }
+        overview = {}
+        for name, future in futures.items():
+            try:
+                overview[name] = future.result()
+            except Exception as e:
+                self.logger.error(f"Social overview {name} error: {e}")
+                overview[name] = []
+        return overview
     
     def create_post(self, user_id, post_type, content, character_mentioned=None, trade_id=None):
         """Create a new post"""
+        # Author names are copied onto the post so feed reads skip the users join
         query = """
-        INSERT INTO user_posts (user_id, post_type, content, character_mentioned, trade_id)
-        VALUES (%s, %s, %s, %s, %s)
+        INSERT INTO user_posts (user_id, post_type, content, character_mentioned, trade_id,
+                                author_username, author_display_name)
+        SELECT u.user_id, %s, %s, %s, %s::integer, u.username, u.display_name
+        FROM users u
+        WHERE u.user_id = %s
         RETURNING id
         """
-        result = self.db_manager.execute_query(
-            query, (user_id, post_type, content, character_mentioned, trade_id)
+        return self.db_manager.execute_prepared(
+            "social_create_post", query,
+            (post_type, content, character_mentioned, trade_id, user_id), scalar=True
         )
-        return result.iloc[0]['id'] if not result.empty else None
     
-    def get_activity_feed(self, user_id, limit=50):
-        """Get activity feed for user"""
-        query = """
-        SELECT p.id, p.post_type, p.content, p.character_mentioned, p.likes_count,
-               p.comments_count, p.created_at, u.username, u.display_name
-        FROM user_posts p
-        JOIN users u ON u.user_id = p.user_id
-        WHERE p.user_id IN (
-            SELECT friend_id FROM user_friends WHERE user_id = %s AND status = 'accepted'
-            UNION
-            SELECT %s
-        ) AND p.visibility = 'public'
-        ORDER BY p.created_at DESC
+    def copy_posts(self, rows):
+        """Bulk-create posts for import/admin jobs.
+        
+        rows are (user_id, post_type, content, character_mentioned, trade_id)
+        tuples; they are streamed with COPY instead of one INSERT per post.
+        """
+        return self.db_manager.copy_rows("""
+            CREATE TEMP TABLE tmp_posts (
+                user_id INTEGER, post_type VARCHAR(50), content TEXT,
+                character_mentioned VARCHAR(255), trade_id INTEGER
+            ) ON COMMIT DROP
+        """, "COPY tmp_posts FROM STDIN WITH CSV", rows, """
+            INSERT INTO user_posts (user_id, post_type, content, character_mentioned, trade_id,
+                                    author_username, author_display_name)
+            SELECT t.user_id, t.post_type, t.content, t.character_mentioned, t.trade_id,
+                   u.username, u.display_name
+            FROM tmp_posts t
+            JOIN users u ON u.user_id = t.user_id
+        """)
+    
+    def get_activity_feed(self, user_id, limit=50, cursor_ts=None, cursor_id=None):
+        """Get activity feed for user.
+        
+        Pages are keyset-paginated on (created_at, id): pass the values from
+        feed_cursor() of the previous page to fetch the next, older one.
+        """
+        # Each branch walks user_posts_feed_idx for one author set; no hash semi-join
+        page_filter = ""
+        if cursor_ts is not None:
+            page_filter = "AND (p.created_at, p.id) < (%s, %s)"
+        
+        query = f"""
+        (SELECT p.id, p.post_type, p.content, p.character_mentioned, p.likes_count,
+                p.comments_count, p.created_at,
+                p.author_username as username, p.author_display_name as display_name
+         FROM user_posts p
+         JOIN user_friends uf ON uf.friend_id = p.user_id AND uf.user_id = %s AND uf.status = 'accepted'
+         WHERE p.visibility = 'public' {page_filter}
+         ORDER BY p.created_at DESC, p.id DESC
+         LIMIT %s)
+        UNION ALL
+        (SELECT p.id, p.post_type, p.content, p.character_mentioned, p.likes_count,
+                p.comments_count, p.created_at,
+                p.author_username as username, p.author_display_name as display_name
+         FROM user_posts p
+         WHERE p.user_id = %s AND p.visibility = 'public' {page_filter}
+         ORDER BY p.created_at DESC, p.id DESC
+         LIMIT %s)
+        ORDER BY created_at DESC, id DESC
         LIMIT %s
         """
-        return self.db_manager.execute_query(query, (user_id, user_id, limit))
+        cursor_params = (cursor_ts, cursor_id) if page_filter else ()
+        params = (user_id, *cursor_params, limit, user_id, *cursor_params, limit, limit)
+        return self.db_manager.execute_query(query, params, as_df=False)
+    
+    @staticmethod
+    def feed_cursor(feed):
+        """Return the (created_at, id) cursor for the page after feed, or None at the end"""
+        if not feed:
+            return None
+        last = feed[-1]
+        return last['created_at'], last['id']
+    
+    def sync_post_authors(self, user_id):
+        """Propagate a user's current username/display name onto their posts"""
+        query = """
+        UPDATE user_posts p
+        SET author_username = u.username, author_display_name = u.display_name
+        FROM users u
+        WHERE u.user_id = %s AND p.user_id = u.user_id
+          AND (p.author_username IS DISTINCT FROM u.username
+               OR p.author_display_name IS DISTINCT FROM u.display_name)
+        """
+        return self.db_manager.execute_query(query, (user_id,), fetch=False)
     
     def like_post(self, post_id, user_id):
         """Like a post"""
-        conn = self.db_manager.get_connection()
-        try:
-            cursor = conn.cursor()
-            
-            # Add like
-            cursor.execute("""
-                INSERT INTO post_likes (post_id, user_id)
-                VALUES (%s, %s)
-                ON CONFLICT (post_id, user_id) DO NOTHING
-            """, (post_id, user_id))
-            
-            # Update like count
-            cursor.execute("""
-                UPDATE user_posts 
-                SET likes_count = (SELECT COUNT(*) FROM post_likes WHERE post_id = %s)
-                WHERE id = %s
-            """, (post_id, post_id))
-            
-            conn.commit()
-            return True
-            
-        except Exception as e:
-            self.logger.error(f"Like post error: {e}")
-            conn.rollback()
-            return False
-        finally:
-            self.db_manager.return_connection(conn)
+        # Only bump the counter when the like row was actually inserted
+        query = """
+        WITH ins AS (
+            INSERT INTO post_likes (post_id, user_id)
+            VALUES (%s, %s)
+            ON CONFLICT (post_id, user_id) DO NOTHING
+            RETURNING 1
+        )
+        UPDATE user_posts
+        SET likes_count = likes_count + (SELECT COUNT(*) FROM ins)
+        WHERE id = %s
+        """
+        return self.db_manager.execute_prepared("social_like_post", query, (post_id, user_id, post_id))
+    
+    def reconcile_like_counts(self):
+        """Repair likes_count drift against post_likes"""
+        query = """
+        UPDATE user_posts p
+        SET likes_count = counts.like_count
+        FROM (
+            SELECT p2.id, COUNT(l.post_id) as like_count
+            FROM user_posts p2
+            LEFT JOIN post_likes l ON l.post_id = p2.id
+            GROUP BY p2.id
+        ) counts
+        WHERE p.id = counts.id AND p.likes_count IS DISTINCT FROM counts.like_count
+        """
+        return self.db_manager.execute_query(query, fetch=False)
     
     def follow_user(self, follower_id, following_id):
         """Follow another user"""
@@ -181,30 +469,21 @@ class SocialManager:
         VALUES (%s, %s)
         ON CONFLICT (follower_id, following_id) DO NOTHING
         """
-        return self.db_manager.execute_query(query, (follower_id, following_id), fetch=False)
+        return self.db_manager.execute_prepared("social_follow_user", query, (follower_id, following_id))
     
     def get_leaderboard(self, category='profit', limit=10):
         """Get leaderboard for different categories"""
         if category == 'profit':
             query = """
-            SELECT u.user_id, u.username, u.display_name, u.virtual_currency,
-                   COALESCE(SUM(t.profit_loss), 0) as total_profit,
-                   COUNT(t.trade_id) as trade_count
-            FROM users u
-            LEFT JOIN trades t ON u.user_id = t.user_id
-            WHERE u.role != 'Banned'
-            GROUP BY u.user_id, u.username, u.display_name, u.virtual_currency
+            SELECT user_id, username, display_name, virtual_currency, total_profit, trade_count
+            FROM mv_leaderboard_profit
             ORDER BY total_profit DESC
             LIMIT %s
             """
         elif category == 'achievements':
             query = """
-            SELECT u.user_id, u.username, u.display_name,
-                   COUNT(ua.achievement_id) as achievement_count
-            FROM users u
-            LEFT JOIN user_achievements ua ON u.user_id = ua.user_id
-            WHERE u.role != 'Banned'
-            GROUP BY u.user_id, u.username, u.display_name
+            SELECT user_id, username, display_name, achievement_count
+            FROM mv_leaderboard_achievements
             ORDER BY achievement_count DESC
             LIMIT %s
             """
@@ -217,38 +496,64 @@ class SocialManager:
             LIMIT %s
             """
         
-        return self.db_manager.execute_query(query, (limit,))
+        return self._cached(
+            f"v1:app:social:leaderboard:{category}:{limit}", self._leaderboard_ttl,
+            lambda: self.db_manager.execute_query(query, (limit,), as_df=False)
+        )
     
     def create_trading_group(self, owner_id, name, description, is_private=False):
         """Create a new trading group"""
-        conn = self.db_manager.get_connection()
-        try:
-            cursor = conn.cursor()
-            
-            # Create group
-            cursor.execute("""
-                INSERT INTO trading_groups (name, description, owner_id, is_private)
-                VALUES (%s, %s, %s, %s)
-                RETURNING id
-            """, (name, description, owner_id, is_private))
-            
-            group_id = cursor.fetchone()[0]
-            
-            # Add owner as member
-            cursor.execute("""
-                INSERT INTO group_memberships (group_id, user_id, role)
-                VALUES (%s, %s, 'owner')
-            """, (group_id, owner_id))
-            
-            conn.commit()
-            return group_id
-            
-        except Exception as e:
-            self.logger.error(f"Create trading group error: {e}")
-            conn.rollback()
-            return None
-        finally:
-            self.db_manager.return_connection(conn)
+        # Group and owner membership are inserted in one statement
+        query = """
+        WITH g AS (
+            INSERT INTO trading_groups (name, description, owner_id, is_private)
+            VALUES (%s, %s, %s, %s)
+            RETURNING id
+        )
+        INSERT INTO group_memberships (group_id, user_id, role)
+        SELECT id, %s, 'owner' FROM g
+        RETURNING group_id
+        """
+        group_id = self.db_manager.fetch_one_scalar(
+            query, (name, description, owner_id, is_private, owner_id)
+        )
+        if group_id is not None:
+            self._invalidate(f"v1:app:social:groups:{owner_id}")
+        return group_id
+    
+    def join_trading_group(self, group_id, user_id):
+        """Join a trading group"""
+        # member_count only moves when a membership row was actually inserted
+        query = """
+        WITH ins AS (
+            INSERT INTO group_memberships (group_id, user_id, role)
+            VALUES (%s, %s, 'member')
+            ON CONFLICT (group_id, user_id) DO NOTHING
+            RETURNING 1
+        )
+        UPDATE trading_groups
+        SET member_count = member_count + (SELECT COUNT(*) FROM ins)
+        WHERE id = %s
+        """
+        joined = self.db_manager.execute_query(query, (group_id, user_id, group_id), fetch=False)
+        self._invalidate(f"v1:app:social:groups:{user_id}")
+        return joined
+    
+    def leave_trading_group(self, group_id, user_id):
+        """Leave a trading group; owners can't leave their own group"""
+        query = """
+        WITH del AS (
+            DELETE FROM group_memberships
+            WHERE group_id = %s AND user_id = %s AND role != 'owner'
+            RETURNING 1
+        )
+        UPDATE trading_groups
+        SET member_count = member_count - (SELECT COUNT(*) FROM del)
+        WHERE id = %s
+        """
+        left = self.db_manager.execute_query(query, (group_id, user_id, group_id), fetch=False)
+        self._invalidate(f"v1:app:social:groups:{user_id}")
+        return left
     
     def get_user_groups(self, user_id):
         """Get groups user is member of"""
@@ -259,7 +564,10 @@ class SocialManager:
         WHERE gm.user_id = %s
         ORDER BY tg.created_at DESC
         """
-        return self.db_manager.execute_query(query, (user_id,))
+        return self._cached(
+            f"v1:app:social:groups:{user_id}", self._groups_ttl,
+            lambda: self.db_manager.execute_query(query, (user_id,), as_df=False)
+        )
     
     def get_trending_discussions(self, limit=10):
         """Get trending character discussions"""
@@ -269,7 +577,10 @@ class SocialManager:
         FROM character_discussions cd
         JOIN users u ON cd.user_id = u.user_id
         WHERE cd.created_at > CURRENT_TIMESTAMP - INTERVAL '7 days'
-        ORDER BY (cd.upvotes - cd.downvotes) DESC, cd.replies_count DESC
+        ORDER BY cd.score DESC, cd.replies_count DESC
         LIMIT %s
         """
-        return self.db_manager.execute_query(query, (limit,))
\ No newline at end of file
+        return self._cached(
+            f"v1:app:social:trending:{limit}", self._trending_ttl,
+            lambda: self.db_manager.execute_query(query, (limit,), as_df=False)
+        )
\ No newline at end of file
@@ -1,105 +1,913 @@
 import streamlit as st
-from datetime import datetime
 import base64
 import io
-from PIL import Image
 import json
+import hashlib
+import os
+import gzip
+import pickle
+import re
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+from types import MappingProxyType
+from psycopg2 import Binary
+
+THEMES = {
+    'futuristic': {
+        'name': 'Futuristic Cyber',
+        'primary_color': '#00f5ff',
+        'secondary_color': '#ff00ff',
+        'background_color': '#0a0a0a',
+        'text_color': '#ffffff',
+        'accent_color': '#39ff14',
+        'gradient': 'linear-gradient(135deg, #0a0a0a 0%, #1a1a2e 50%, #16213e 100%)',
+        'border_style': '2px solid #00f5ff',
+        'shadow': '0 0 20px rgba(0, 245, 255, 0.3)',
+        'animation': 'glow 2s ease-in-out infinite alternate',
+        'description': 'Cyberpunk-inspired neon aesthetics'
+    },
+    'aquatic': {
+        'name': 'Ocean Depths',
+        'primary_color': '#00bfff',
+        'secondary_color': '#20b2aa',
+        'background_color': '#001a33',
+        'text_color': '#e6f3ff',
+        'accent_color': '#7fffd4',
+        'gradient': 'linear-gradient(135deg, #001a33 0%, #003366 50%, #004080 100%)',
+        'border_style': '2px solid #00bfff',
+        'shadow': '0 0 15px rgba(0, 191, 255, 0.4)',
+        'animation': 'wave 3s ease-in-out infinite',
+        'description': 'Deep ocean tranquility with flowing water effects'
+    },
+    'heavenly': {
+        'name': 'Celestial Light',
+        'primary_color': '#ffd700',
+        'secondary_color': '#fff8dc',
+        'background_color': '#f0f8ff',
+        'text_color': '#4a4a4a',
+        'accent_color': '#87ceeb',
+        'gradient': 'linear-gradient(135deg, #f0f8ff 0%, #e6f3ff 50%, #ddeeff 100%)',
+        'border_style': '2px solid #ffd700',
+        'shadow': '0 0 25px rgba(255, 215, 0, 0.2)',
+        'animation': 'shimmer 4s ease-in-out infinite',
+        'description': 'Ethereal golden light with heavenly ambiance'
+    },
+    'dark_mode': {
+        'name': 'Midnight Elite',
+        'primary_color': '#bb86fc',
+        'secondary_color': '#03dac6',
+        'background_color': '#121212',
+        'text_color': '#ffffff',
+        'accent_color': '#cf6679',
+        'gradient': 'linear-gradient(135deg, #121212 0%, #1e1e1e 50%, #2a2a2a 100%)',
+        'border_style': '2px solid #bb86fc',
+        'shadow': '0 0 10px rgba(187, 134, 252, 0.3)',
+        'animation': 'pulse 2s ease-in-out infinite',
+        'description': 'Professional dark theme with purple accents'
+    },
+    'nature': {
+        'name': 'Forest Harmony',
+        'primary_color': '#228b22',
+        'secondary_color': '#32cd32',
+        'background_color': '#f0fff0',
+        'text_color': '#2d4a2d',
+        'accent_color': '#90ee90',
+        'gradient': 'linear-gradient(135deg, #f0fff0 0%, #e8f5e8 50%, #d0e8d0 100%)',
+        'border_style': '2px solid #228b22',
+        'shadow': '0 0 15px rgba(34, 139, 34, 0.2)',
+        'animation': 'sway 3s ease-in-out infinite',
+        'description': 'Peaceful nature-inspired green theme'
+    },
+    'sunset': {
+        'name': 'Sunset Blaze',
+        'primary_color': '#ff6b35',
+        'secondary_color': '#f7931e',
+        'background_color': '#1a1a1a',
+        'text_color': '#fff5e6',
+        'accent_color': '#ffcc70',
+        'gradient': 'linear-gradient(135deg, #1a1a1a 0%, #2d1b1b 50%, #4d2a1a 100%)',
+        'border_style': '2px solid #ff6b35',
+        'shadow': '0 0 20px rgba(255, 107, 53, 0.3)',
+        'animation': 'flicker 2.5s ease-in-out infinite',
+        'description': 'Warm sunset colors with fiery accents'
+    }
+}
+
+BACKGROUND_PATTERNS = {
+    'none': 'No Pattern',
+    'dots': 'Dot Matrix',
+    'lines': 'Circuit Lines',
+    'hexagon': 'Hexagonal Grid',
+    'waves': 'Flowing Waves',
+    'stars': 'Starfield',
+    'particles': 'Floating Particles'
+}
+
+
+def _build_theme_css(theme):
+    """Core stylesheet for one theme, opening the <style> block"""
+    # Enhanced theme CSS with modern design patterns
+    return f"""
+    <style>
+    @import url('https://fonts.googleapis.com/css2?family=Inter:wght@300;400;500;600;700;800&family=JetBrains+Mono:wght@300;400;500;600&display=swap');
+    
+    /* Theme: {theme['name']} - Enhanced Design System */
+    :root {{
+        --primary-color: {theme['primary_color']};
+        --secondary-color: {theme['secondary_color']};
+        --background-color: {theme['background_color']};
+        --text-color: {theme['text_color']};
+        --accent-color: {theme['accent_color']};
+        --glass-bg: rgba(255, 255, 255, 0.08);
+        --glass-border: rgba(255, 255, 255, 0.12);
+        --shadow-light: 0 4px 16px rgba(0, 0, 0, 0.1);
+        --shadow-medium: 0 8px 32px rgba(0, 0, 0, 0.15);
+        --shadow-heavy: 0 16px 64px rgba(0, 0, 0, 0.2);
+    }}
+    
+    /* Global App Styling */
+    .stApp {{
+        background: {theme['gradient']};
+        background-attachment: fixed;
+        color: {theme['text_color']};
+        font-family: 'Inter', -apple-system, BlinkMacSystemFont, sans-serif;
+        min-height: 100vh;
+    }}
+    
+    /* Enhanced Background with Floating Elements */
+    .stApp::before {{
+        content: '';
+        position: fixed;
+        top: 0;
+        left: 0;
+        width: 100%;
+        height: 100%;
+        background-image: 
+            radial-gradient(circle at 20% 80%, {theme['primary_color']}22 0%, transparent 50%),
+            radial-gradient(circle at 80% 20%, {theme['secondary_color']}15 0%, transparent 50%),
+            radial-gradient(circle at 40% 40%, {theme['accent_color']}10 0%, transparent 50%);
+        background-size: 100% 100%;
+        pointer-events: none;
+        z-index: -1;
+        animation: floating-orbs 20s ease-in-out infinite;
+    }}
+    
+    @keyframes floating-orbs {{
+        0%, 100% {{ transform: translate(0, 0) scale(1); }}
+        25% {{ transform: translate(10px, -10px) scale(1.1); }}
+        50% {{ transform: translate(-5px, 5px) scale(0.9); }}
+        75% {{ transform: translate(-10px, -5px) scale(1.05); }}
+    }}
+    
+    /* Typography Enhancements */
+    h1, h2, h3, h4, h5, h6 {{
+        font-weight: 700;
+        letter-spacing: -0.025em;
+        line-height: 1.2;
+    }}
+    
+    .main-header {{
+        text-align: center;
+        background: linear-gradient(135deg, {theme['primary_color']}, {theme['secondary_color']}, {theme['accent_color']});
+        -webkit-background-clip: text;
+        -webkit-text-fill-color: transparent;
+        background-clip: text;
+        font-size: clamp(2rem, 5vw, 4rem);
+        font-weight: 800;
+        margin-bottom: 3rem;
+        position: relative;
+        animation: glow-pulse 3s ease-in-out infinite;
+    }}
+    
+    .main-header::after {{
+        content: '';
+        position: absolute;
+        top: 100%;
+        left: 50%;
+        transform: translateX(-50%);
+        width: 100px;
+        height: 4px;
+        background: linear-gradient(90deg, transparent, {theme['primary_color']}, transparent);
+        margin-top: 1rem;
+        border-radius: 2px;
+    }}
+    
+    @keyframes glow-pulse {{
+        0%, 100% {{ 
+            filter: brightness(1) drop-shadow(0 0 20px {theme['primary_color']}66); 
+            transform: scale(1);
+        }}
+        50% {{ 
+            filter: brightness(1.2) drop-shadow(0 0 30px {theme['primary_color']}99); 
+            transform: scale(1.02);
+        }}
+    }}
+    
+    /* Advanced Glass Morphism Cards */
+    .glass-card, .profile-card, .tier-card {{
+        background: linear-gradient(135deg, var(--glass-bg), rgba(255, 255, 255, 0.04));
+        backdrop-filter: blur(20px);
+        border: 1px solid var(--glass-border);
+        border-radius: 24px;
+        padding: 2rem;
+        box-shadow: 
+            var(--shadow-medium),
+            inset 0 1px 0 rgba(255, 255, 255, 0.1);
+        transition: all 0.4s cubic-bezier(0.4, 0, 0.2, 1);
+        position: relative;
+        overflow: hidden;
+    }}
+    
+    .glass-card::before {{
+        content: '';
+        position: absolute;
+        top: 0;
+        left: -100%;
+        width: 100%;
+        height: 100%;
+        background: linear-gradient(90deg, transparent, rgba(255, 255, 255, 0.1), transparent);
+        transition: left 0.7s ease;
+    }}
+    
+    .glass-card:hover {{
+        transform: translateY(-6px) scale(1.02);
+        box-shadow: 
+            var(--shadow-heavy),
+            inset 0 1px 0 rgba(255, 255, 255, 0.15);
+        border-color: {theme['primary_color']}66;
+    }}
+    
+    .glass-card:hover::before {{
+        left: 100%;
+    }}
+    
+    /* Enhanced Button System */
+    .stButton > button {{
+        background: linear-gradient(135deg, {theme['primary_color']}, {theme['secondary_color']});
+        color: white;
+        border: none;
+        border-radius: 16px;
+        padding: 1rem 2rem;
+        font-weight: 600;
+        font-size: 0.95rem;
+        font-family: 'Inter', sans-serif;
+        transition: all 0.3s cubic-bezier(0.4, 0, 0.2, 1);
+        box-shadow: 
+            0 4px 16px {theme['primary_color']}44,
+            0 2px 8px rgba(0, 0, 0, 0.1);
+        position: relative;
+        overflow: hidden;
+        text-transform: none;
+        letter-spacing: 0.025em;
+    }}
+    
+    .stButton > button::before {{
+        content: '';
+        position: absolute;
+        top: 0;
+        left: -100%;
+        width: 100%;
+        height: 100%;
+        background: linear-gradient(90deg, transparent, rgba(255, 255, 255, 0.25), transparent);
+        transition: left 0.5s ease;
+    }}
+    
+    .stButton > button:hover {{
+        transform: translateY(-3px);
+        box-shadow: 
+            0 8px 24px {theme['primary_color']}66,
+            0 4px 16px rgba(0, 0, 0, 0.15);
+        filter: brightness(1.1);
+    }}
+    
+    .stButton > button:hover::before {{
+        left: 100%;
+    }}
+    
+    .stButton > button:active {{
+        transform: translateY(-1px);
+        transition: transform 0.1s ease;
+    }}
+    
+    /* Enhanced Form Elements */
+    .stTextInput > div > div > input,
+    .stTextArea > div > div > textarea,
+    .stSelectbox > div > div,
+    .stNumberInput > div > div > input {{
+        background: rgba(255, 255, 255, 0.08) !important;
+        border: 2px solid rgba(255, 255, 255, 0.12) !important;
+        border-radius: 12px !important;
+        color: {theme['text_color']} !important;
+        backdrop-filter: blur(10px);
+        transition: all 0.3s ease !important;
+        font-family: 'Inter', sans-serif !important;
+        font-size: 0.95rem !important;
+    }}
+    
+    .stTextInput > div > div > input:focus,
+    .stTextArea > div > div > textarea:focus,
+    .stSelectbox > div > div:focus,
+    .stNumberInput > div > div > input:focus {{
+        border-color: {theme['primary_color']} !important;
+        box-shadow: 0 0 0 3px {theme['primary_color']}33 !important;
+        background: rgba(255, 255, 255, 0.12) !important;
+        outline: none !important;
+    }}
+    
+    /* Enhanced Metrics */
+    [data-testid="metric-container"] {{
+        background: linear-gradient(135deg, var(--glass-bg), rgba(255, 255, 255, 0.04));
+        border: 1px solid var(--glass-border);
+        border-radius: 20px;
+        padding: 1.5rem;
+        backdrop-filter: blur(15px);
+        transition: all 0.3s ease;
+        box-shadow: var(--shadow-light);
+        position: relative;
+        overflow: hidden;
+    }}
+    
+    [data-testid="metric-container"]::before {{
+        content: '';
+        position: absolute;
+        top: 0;
+        left: 0;
+        right: 0;
+        height: 2px;
+        background: linear-gradient(90deg, {theme['primary_color']}, {theme['secondary_color']});
+        opacity: 0;
+        transition: opacity 0.3s ease;
+    }}
+    
+    [data-testid="metric-container"]:hover {{
+        transform: translateY(-4px);
+        box-shadow: var(--shadow-medium);
+        border-color: {theme['primary_color']}44;
+    }}
+    
+    [data-testid="metric-container"]:hover::before {{
+        opacity: 1;
+    }}
+    
+    /* Enhanced Sidebar */
+    .css-1d391kg {{
+        background: linear-gradient(180deg, 
+            rgba(0, 0, 0, 0.85) 0%, 
+            rgba(0, 0, 0, 0.75) 100%) !important;
+        backdrop-filter: blur(20px) !important;
+        border-right: 1px solid rgba(255, 255, 255, 0.1) !important;
+    }}
+    
+    /* Enhanced Tables */
+    .stDataFrame {{
+        border-radius: 16px;
+        overflow: hidden;
+        box-shadow: var(--shadow-medium);
+        border: 1px solid var(--glass-border);
+    }}
+    
+    .stDataFrame table {{
+        background: var(--glass-bg);
+        backdrop-filter: blur(10px);
+    }}
+    
+    /* Enhanced Tabs */
+    .stTabs [data-baseweb="tab-list"] {{
+        gap: 8px;
+        background: rgba(255, 255, 255, 0.06);
+        border-radius: 16px;
+        padding: 6px;
+        backdrop-filter: blur(10px);
+        border: 1px solid var(--glass-border);
+    }}
+    
+    .stTabs [data-baseweb="tab"] {{
+        border-radius: 12px;
+        padding: 12px 24px;
+        font-weight: 600;
+        transition: all 0.3s ease;
+        border: none;
+        font-family: 'Inter', sans-serif;
+    }}
+    
+    .stTabs [data-baseweb="tab"]:hover {{
+        background: rgba(255, 255, 255, 0.1);
+        transform: translateY(-1px);
+    }}
+    
+    .stTabs [data-baseweb="tab"][aria-selected="true"] {{
+        background: linear-gradient(135deg, {theme['primary_color']}, {theme['secondary_color']});
+        color: white;
+        box-shadow: 0 4px 12px {theme['primary_color']}44;
+    }}
+    
+    /* Profile Enhancements */
+    .profile-avatar {{
+        width: 120px;
+        height: 120px;
+        border-radius: 50%;
+        border: 4px solid {theme['primary_color']};
+        object-fit: cover;
+        margin-top: -60px;
+        margin-left: 20px;
+        background: var(--glass-bg);
+        box-shadow: var(--shadow-medium);
+        transition: all 0.3s ease;
+        position: relative;
+    }}
+    
+    .profile-avatar::after {{
+        content: '';
+        position: absolute;
+        inset: -4px;
+        border-radius: 50%;
+        background: linear-gradient(135deg, {theme['primary_color']}, {theme['secondary_color']});
+        z-index: -1;
+        opacity: 0;
+        transition: opacity 0.3s ease;
+    }}
+    
+    .profile-avatar:hover {{
+        transform: scale(1.05);
+        box-shadow: var(--shadow-heavy);
+    }}
+    
+    .profile-avatar:hover::after {{
+        opacity: 0.8;
+    }}
+    
+    .profile-banner {{
+        width: 100%;
+        height: 200px;
+        object-fit: cover;
+        border-radius: 24px 24px 0 0;
+    }}
+    
+    .custom-title {{
+        font-weight: 600;
+        font-size: 1.1em;
+        margin: 10px 0;
+        text-shadow: 0 2px 4px rgba(0, 0, 0, 0.3);
+        background: linear-gradient(135deg, {theme['primary_color']}, {theme['secondary_color']});
+        -webkit-background-clip: text;
+        -webkit-text-fill-color: transparent;
+        background-clip: text;
+    }}
+    
+    .status-message {{
+        font-style: italic;
+        opacity: 0.8;
+        margin-bottom: 15px;
+        font-size: 0.9em;
+        font-weight: 300;
+    }}
+    
+    .favorite-character {{
+        display: inline-block;
+        background: var(--glass-bg);
+        border-radius: 20px;
+        padding: 8px 16px;
+        margin: 4px;
+        border: 1px solid {theme['primary_color']}44;
+        backdrop-filter: blur(10px);
+        transition: all 0.3s ease;
+        font-weight: 500;
+        font-size: 0.9em;
+    }}
+    
+    .favorite-character:hover {{
+        transform: translateY(-2px);
+        background: {theme['primary_color']}22;
+        border-color: {theme['primary_color']};
+        box-shadow: 0 4px 12px {theme['primary_color']}33;
+    }}
+    
+    /* Achievement System */
+    .achievement-badge {{
+        background: linear-gradient(135deg, {theme['primary_color']}, {theme['secondary_color']});
+        border-radius: 24px;
+        padding: 8px 20px;
+        margin: 6px;
+        display: inline-block;
+        color: white;
+        font-weight: 600;
+        box-shadow: 0 4px 16px {theme['primary_color']}44;
+        transition: all 0.3s ease;
+        position: relative;
+        overflow: hidden;
+        font-size: 0.9em;
+    }}
+    
+    .achievement-badge::before {{
+        content: '';
+        position: absolute;
+        top: 0;
+        left: -100%;
+        width: 100%;
+        height: 100%;
+        background: linear-gradient(90deg, transparent, rgba(255, 255, 255, 0.3), transparent);
+        transition: left 0.6s ease;
+    }}
+    
+    .achievement-badge:hover {{
+        transform: translateY(-2px) scale(1.05);
+        box-shadow: 0 8px 24px {theme['primary_color']}66;
+    }}
+    
+    .achievement-badge:hover::before {{
+        left: 100%;
+    }}
+    """
+
+
+def _build_pattern_css(theme, background_pattern):
+    """Background pattern overlay for one theme; empty for patterns without CSS"""
+    if background_pattern == 'dots':
+        return f"""
+        .stApp::after {{
+            content: '';
+            position: fixed;
+            top: 0;
+            left: 0;
+            width: 100%;
+            height: 100%;
+            background-image: radial-gradient({theme['primary_color']}88 1px, transparent 1px);
+            background-size: 30px 30px;
+            opacity: 0.3;
+            z-index: -1;
+            animation: dots-float 10s linear infinite;
+        }}
+        
+        @keyframes dots-float {{
+            0% {{ transform: translateY(0px); }}
+            100% {{ transform: translateY(-30px); }}
+        }}
+        """
+    elif background_pattern == 'lines':
+        return f"""
+        .stApp::after {{
+            content: '';
+            position: fixed;
+            top: 0;
+            left: 0;
+            width: 100%;
+            height: 100%;
+            background-image: 
+                linear-gradient(90deg, {theme['primary_color']}22 1px, transparent 1px),
+                linear-gradient(0deg, {theme['primary_color']}22 1px, transparent 1px);
+            background-size: 40px 40px;
+            opacity: 0.4;
+            z-index: -1;
+            animation: grid-shift 15s linear infinite;
+        }}
+        
+        @keyframes grid-shift {{
+            0% {{ transform: translate(0, 0); }}
+            100% {{ transform: translate(40px, 40px); }}
+        }}
+        """
+    elif background_pattern == 'hexagon':
+        return f"""
+        .stApp::after {{
+            content: '';
+            position: fixed;
+            top: 0;
+            left: 0;
+            width: 100%;
+            height: 100%;
+            background-image: url("data:image/svg+xml,%3Csvg width='60' height='60' viewBox='0 0 60 60' xmlns='http://www.w3.org/2000/svg'%3E%3Cg fill='none' fill-rule='evenodd'%3E%3Cg fill='{theme['primary_color'].replace('#', '%23')}' fill-opacity='0.2'%3E%3Cpath d='m36 34v-4h-2v4h-4v2h4v4h2v-4h4v-2h-4zm0-30V0h-2v4h-4v2h4v4h2V6h4V4h-4zM6 34v-4H4v4H0v2h4v4h2v-4h4v-2H6zM6 4V0H4v4H0v2h4v4h2V6h4V4H6z'/%3E%3C/g%3E%3C/g%3E%3C/svg%3E");
+            z-index: -1;
+            opacity: 0.6;
+            animation: hexagon-pulse 8s ease-in-out infinite;
+        }}
+        
+        @keyframes hexagon-pulse {{
+            0%, 100% {{ opacity: 0.3; }}
+            50% {{ opacity: 0.6; }}
+        }}
+        """
+    return ""
+
+
+def _build_responsive_css(theme):
+    """Responsive, loading and scrollbar rules appended after the pattern"""
+    return f"""
+    
+    /* Enhanced Responsive Design */
+    @media (max-width: 768px) {{
+        .main-header {{
+            font-size: 2.5rem;
+            margin-bottom: 2rem;
+        }}
+        
+        .glass-card, .profile-card, .tier-card {{
+            padding: 1.5rem;
+            margin: 1rem 0;
+            border-radius: 20px;
+        }}
+        
+        .stButton > button {{
+            width: 100%;
+            margin-bottom: 0.75rem;
+            padding: 1rem 1.5rem;
+            font-size: 1rem;
+        }}
+        
+        .profile-avatar {{
+            width: 80px;
+            height: 80px;
+            margin-top: -40px;
+        }}
+        
+        [data-testid="metric-container"] {{
+            padding: 1rem;
+            margin: 0.5rem 0;
+        }}
+    }}
+    
+    @media (max-width: 480px) {{
+        .main-header {{
+            font-size: 2rem;
+        }}
+        
+        .glass-card, .profile-card, .tier-card {{
+            padding: 1rem;
+            margin: 0.75rem 0;
+        }}
+    }}
+    
+    /* Loading States */
+    @keyframes shimmer {{
+        0% {{ transform: translateX(-100%); }}
+        100% {{ transform: translateX(100%); }}
+    }}
+    
+    .loading-shimmer {{
+        position: relative;
+        overflow: hidden;
+    }}
+    
+    .loading-shimmer::after {{
+        content: '';
+        position: absolute;
+        top: 0;
+        right: 0;
+        bottom: 0;
+        left: 0;
+        background: linear-gradient(90deg, transparent, rgba(255, 255, 255, 0.1), transparent);
+        animation: shimmer 2s infinite;
+    }}
+    
+    /* Scrollbar Styling */
+    ::-webkit-scrollbar {{
+        width: 8px;
+    }}
+    
+    ::-webkit-scrollbar-track {{
+        background: rgba(255, 255, 255, 0.05);
+        border-radius: 4px;
+    }}
+    
+    ::-webkit-scrollbar-thumb {{
+        background: {theme['primary_color']}88;
+        border-radius: 4px;
+    }}
+    
+    ::-webkit-scrollbar-thumb:hover {{
+        background: {theme['primary_color']};
+    }}
+    """
+
+
+def _minify_css(css):
+    """Strip comments and layout whitespace from generated CSS.
+    
+    Only whitespace next to { } ; , and after : is dropped, so selectors like
+    `.a :hover` keep their meaning. Not meant for user-supplied CSS.
+    """
+    css = re.sub(r'/\*.*?\*/', '', css, flags=re.S)
+    css = re.sub(r'\s+', ' ', css)
+    css = re.sub(r'\s*([{};,])\s*', r'\1', css)
+    css = re.sub(r':\s+', ':', css)
+    return css.replace(';}', '}').strip()
+
+
+# Themes are fixed at import time, so their CSS is formatted and minified once
+# here rather than re-interpolated on every render
+for _theme in THEMES.values():
+    _theme['css_base'] = _minify_css(_build_theme_css(_theme))
+    _theme['css_responsive'] = _minify_css(_build_responsive_css(_theme))
+
+_PATTERN_CSS = {
+    (theme_name, pattern): _minify_css(_build_pattern_css(theme, pattern))
+    for theme_name, theme in THEMES.items()
+    for pattern in BACKGROUND_PATTERNS
+}
+
+# Shared by every ThemeManager, so hand out read-only views
+THEMES = MappingProxyType({name: MappingProxyType(theme) for name, theme in THEMES.items()})
+BACKGROUND_PATTERNS = MappingProxyType(BACKGROUND_PATTERNS)
+
+
+@lru_cache(maxsize=None)
+def _render_theme_css(theme_name, background_pattern):
+    """Assemble the stock stylesheet for a theme/pattern pair.
+    
+    Keys are limited to THEMES x BACKGROUND_PATTERNS, so every session
+    shares one string per pair and user CSS can never evict them.
+    """
+    theme = THEMES[theme_name]
+    return theme['css_base'] + _PATTERN_CSS[(theme_name, background_pattern)] + theme['css_responsive'] + "</style>"
+
+
+@lru_cache(maxsize=64)
+def _render_custom_css(theme_name, background_pattern, custom_css):
+    """Stock stylesheet with a user's custom CSS appended"""
+    css = _render_theme_css(theme_name, background_pattern)[:-len("</style>")]
+    return css + f"\n/* Custom User CSS */\n{custom_css}\n</style>"
+
+
+def _render_css(theme_name, background_pattern, custom_css):
+    """Assemble the full theme stylesheet from the precomputed fragments"""
+    if background_pattern not in BACKGROUND_PATTERNS:
+        background_pattern = 'none'
+    if custom_css:
+        return _render_custom_css(theme_name, background_pattern, custom_css)
+    return _render_theme_css(theme_name, background_pattern)
+
+
+@lru_cache(maxsize=None)
+def _render_preview(theme_name):
+    """Build the preview card for a theme; themes are frozen, so once is enough"""
+    theme = THEMES[theme_name]
+    
+    preview_html = f"""
+    <div style="
+        background: {theme['gradient']};
+        color: {theme['text_color']};
+        padding: 20px;
+        border-radius: 15px;
+        border: {theme['border_style']};
+        box-shadow: {theme['shadow']};
+        text-align: center;
+        margin: 10px 0;
+    ">
+        <h3 style="margin: 0; color: {theme['primary_color']};">{theme['name']}</h3>
+        <p style="margin: 10px 0; font-size: 14px; opacity: 0.8;">{theme['description']}</p>
+        <div style="
+            background: linear-gradient(45deg, {theme['primary_color']}, {theme['secondary_color']});
+            color: white;
+            padding: 8px 16px;
+            border-radius: 20px;
+            display: inline-block;
+            margin: 5px;
+            font-size: 12px;
+        ">Sample Badge</div>
+    </div>
+    """
+    
+    return preview_html
+
+
+# Opt-in: publish theme stylesheets as static, content-hashed files and link
+# them instead of inlining ~15KB of CSS on every render. Needs the files to be
+# served as text/css (Streamlit's enableStaticServing, a proxy or a CDN).
+SERVE_STATIC_CSS = os.getenv('THEME_STATIC_CSS', '').lower() in ('1', 'true', 'yes')
+STATIC_THEME_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static', 'themes')
+STATIC_THEME_URL = os.getenv('THEME_STATIC_URL', '/app/static/themes')
+
+
+@lru_cache(maxsize=64)
+def _static_css_url(theme_name, background_pattern):
+    """Write the stylesheet for a theme/pattern once and return its URL, or None on failure"""
+    theme = THEMES[theme_name]
+    css = (theme['css_base'].replace('<style>', '', 1)
+           + _PATTERN_CSS.get((theme_name, background_pattern), "")
+           + theme['css_responsive'])
+    # Content hash in the name, so a changed theme busts browser caches
+    digest = hashlib.sha1(css.encode()).hexdigest()[:12]
+    filename = f"{theme_name}_{background_pattern}.{digest}.css"
+    path = os.path.join(STATIC_THEME_DIR, filename)
+    try:
+        if not os.path.exists(path):
+            os.makedirs(STATIC_THEME_DIR, exist_ok=True)
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            with open(tmp_path, 'w') as f:
+                f.write(css)
+            os.replace(tmp_path, path)
+            # Precompressed copy for servers that serve .gz siblings (gzip_static etc.)
+            with gzip.open(tmp_path, 'wt', compresslevel=9) as f:
+                f.write(css)
+            os.replace(tmp_path, f"{path}.gz")
+    except OSError as e:
+        print(f"Theme stylesheet write error: {e}")
+        return None
+    return f"{STATIC_THEME_URL}/{filename}"
+
+
+_THEME_UPSERT = """
+INSERT INTO user_theme_preferences 
+(user_id, theme_name, background_pattern, custom_background_url, 
+ custom_avatar_sha256, profile_border_style, animation_enabled, custom_css, updated_at)
+VALUES (%s, %s, %s, %s, %s, %s, %s, %s, NOW())
+ON CONFLICT (user_id) 
+DO UPDATE SET 
+    theme_name = EXCLUDED.theme_name,
+    background_pattern = EXCLUDED.background_pattern,
+    custom_background_url = EXCLUDED.custom_background_url,
+    custom_avatar_sha256 = EXCLUDED.custom_avatar_sha256,
+    profile_border_style = EXCLUDED.profile_border_style,
+    animation_enabled = EXCLUDED.animation_enabled,
+    custom_css = EXCLUDED.custom_css,
+    updated_at = NOW()
+"""
+
+_PROFILE_UPSERT = """
+INSERT INTO profile_customizations 
+(user_id, banner_image_sha256, status_message, favorite_characters, profile_visibility,
+ show_achievements, show_trading_stats, show_portfolio, custom_title, title_color, updated_at)
+VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, NOW())
+ON CONFLICT (user_id) 
+DO UPDATE SET 
+    banner_image_sha256 = EXCLUDED.banner_image_sha256,
+    status_message = EXCLUDED.status_message,
+    favorite_characters = EXCLUDED.favorite_characters,
+    profile_visibility = EXCLUDED.profile_visibility,
+    show_achievements = EXCLUDED.show_achievements,
+    show_trading_stats = EXCLUDED.show_trading_stats,
+    show_portfolio = EXCLUDED.show_portfolio,
+    custom_title = EXCLUDED.custom_title,
+    title_color = EXCLUDED.title_color,
+    updated_at = NOW()
+"""
+
+
+def _as_bytea(data):
+    """Adapt image bytes explicitly as BYTEA"""
+    return Binary(bytes(data)) if data is not None else None
+
+
+FEATURED_THEMES_QUERY = """
+SELECT ts.*, u.username, u.display_name 
+FROM theme_showcase ts
+JOIN users u ON ts.user_id = u.user_id
+WHERE ts.is_featured = TRUE
+ORDER BY ts.likes_count DESC, ts.created_at DESC
+LIMIT 10
+"""
+
+
+@st.cache_data(ttl=300)
+def _featured_themes(_db):
+    """Featured showcases, shared across sessions; they change rarely"""
+    return _db.execute_query(FEATURED_THEMES_QUERY)
+
+
+DEFAULT_THEME = MappingProxyType({
+    'theme_name': 'futuristic',
+    'background_pattern': 'none',
+    'custom_background_url': None,
+    'custom_avatar_sha256': None,
+    'profile_border_style': None,
+    'animation_enabled': True,
+    'custom_css': None
+})
+
+DEFAULT_PROFILE = MappingProxyType({
+    'banner_image_sha256': None,
+    'status_message': '',
+    'favorite_characters': (),
+    'profile_visibility': 'public',
+    'show_achievements': True,
+    'show_trading_stats': True,
+    'show_portfolio': True,
+    'custom_title': '',
+    'title_color': '#ffffff'
+})
+
 
 class ThemeManager:
-    def __init__(self, db_manager):
+    themes = THEMES
+    background_patterns = BACKGROUND_PATTERNS
+    
+    # Optional shared cache for theme/profile reads; these change rarely
+    _redis_ttl = 300
+    
+    # The schema only needs creating once per process, not per instance
+    _tables_initialized = False
+    
+    # Image blobs are immutable per hash, so they're cached for the process
+    _image_cache: "OrderedDict[str, bytes]" = OrderedDict()
+    _image_cache_size = 128
+    _image_cache_lock = threading.Lock()
+    
+    def __init__(self, db_manager, redis_client=None):
         self.db_manager = db_manager
-        self.themes = {
-            'futuristic': {
-                'name': 'Futuristic Cyber',
-                'primary_color': '#00f5ff',
-                'secondary_color': '#ff00ff',
-                'background_color': '#0a0a0a',
-                'text_color': '#ffffff',
-                'accent_color': '#39ff14',
-                'gradient': 'linear-gradient(135deg, #0a0a0a 0%, #1a1a2e 50%, #16213e 100%)',
-                'border_style': '2px solid #00f5ff',
-                'shadow': '0 0 20px rgba(0, 245, 255, 0.3)',
-                'animation': 'glow 2s ease-in-out infinite alternate',
-                'description': 'Cyberpunk-inspired neon aesthetics'
-            },
-            'aquatic': {
-                'name': 'Ocean Depths',
-                'primary_color': '#00bfff',
-                'secondary_color': '#20b2aa',
-                'background_color': '#001a33',
-                'text_color': '#e6f3ff',
-                'accent_color': '#7fffd4',
-                'gradient': 'linear-gradient(135deg, #001a33 0%, #003366 50%, #004080 100%)',
-                'border_style': '2px solid #00bfff',
-                'shadow': '0 0 15px rgba(0, 191, 255, 0.4)',
-                'animation': 'wave 3s ease-in-out infinite',
-                'description': 'Deep ocean tranquility with flowing water effects'
-            },
-            'heavenly': {
-                'name': 'Celestial Light',
-                'primary_color': '#ffd700',
-                'secondary_color': '#fff8dc',
-                'background_color': '#f0f8ff',
-                'text_color': '#4a4a4a',
-                'accent_color': '#87ceeb',
-                'gradient': 'linear-gradient(135deg, #f0f8ff 0%, #e6f3ff 50%, #ddeeff 100%)',
-                'border_style': '2px solid #ffd700',
-                'shadow': '0 0 25px rgba(255, 215, 0, 0.2)',
-                'animation': 'shimmer 4s ease-in-out infinite',
-                'description': 'Ethereal golden light with heavenly ambiance'
-            },
-            'dark_mode': {
-                'name': 'Midnight Elite',
-                'primary_color': '#bb86fc',
-                'secondary_color': '#03dac6',
-                'background_color': '#121212',
-                'text_color': '#ffffff',
-                'accent_color': '#cf6679',
-                'gradient': 'linear-gradient(135deg, #121212 0%, #1e1e1e 50%, #2a2a2a 100%)',
-                'border_style': '2px solid #bb86fc',
-                'shadow': '0 0 10px rgba(187, 134, 252, 0.3)',
-                'animation': 'pulse 2s ease-in-out infinite',
-                'description': 'Professional dark theme with purple accents'
-            },
-            'nature': {
-                'name': 'Forest Harmony',
-                'primary_color': '#228b22',
-                'secondary_color': '#32cd32',
-                'background_color': '#f0fff0',
-                'text_color': '#2d4a2d',
-                'accent_color': '#90ee90',
-                'gradient': 'linear-gradient(135deg, #f0fff0 0%, #e8f5e8 50%, #d0e8d0 100%)',
-                'border_style': '2px solid #228b22',
-                'shadow': '0 0 15px rgba(34, 139, 34, 0.2)',
-                'animation': 'sway 3s ease-in-out infinite',
-                'description': 'Peaceful nature-inspired green theme'
-            },
-            'sunset': {
-                'name': 'Sunset Blaze',
-                'primary_color': '#ff6b35',
-                'secondary_color': '#f7931e',
-                'background_color': '#1a1a1a',
-                'text_color': '#fff5e6',
-                'accent_color': '#ffcc70',
-                'gradient': 'linear-gradient(135deg, #1a1a1a 0%, #2d1b1b 50%, #4d2a1a 100%)',
-                'border_style': '2px solid #ff6b35',
-                'shadow': '0 0 20px rgba(255, 107, 53, 0.3)',
-                'animation': 'flicker 2.5s ease-in-out infinite',
-                'description': 'Warm sunset colors with fiery accents'
-            }
-        }
+        self.redis = redis_client
         
-        self.background_patterns = {
-            'none': 'No Pattern',
-            'dots': 'Dot Matrix',
-            'lines': 'Circuit Lines',
-            'hexagon': 'Hexagonal Grid',
-            'waves': 'Flowing Waves',
-            'stars': 'Starfield',
-            'particles': 'Floating Particles'
-        }
-        
-        self.init_theme_tables()
+        if not ThemeManager._tables_initialized:
+            ThemeManager._tables_initialized = bool(self.init_theme_tables())
     
     def init_theme_tables(self):
         """Initialize theme-related database tables"""
@@ -110,8 +918,9 @@ class ThemeManager:
         try:
             cursor = conn.cursor()
             
-            # User theme preferences table
+            # All theme DDL in one round-trip
             cursor.execute("""
+                -- User theme preferences table
                 CREATE TABLE IF NOT EXISTS user_theme_preferences (
                     id SERIAL PRIMARY KEY,
                     user_id INTEGER NOT NULL REFERENCES users(user_id) ON DELETE CASCADE,
@@ -125,11 +934,9 @@ class ThemeManager:
                     created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
                     updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
                     UNIQUE(user_id)
-                )
-            """)
-            
-            # Theme showcase gallery
-            cursor.execute("""
+                );
+                
+                -- Theme showcase gallery
                 CREATE TABLE IF NOT EXISTS theme_showcase (
                     id SERIAL PRIMARY KEY,
                     user_id INTEGER REFERENCES users(user_id) ON DELETE CASCADE,
@@ -139,11 +946,9 @@ class ThemeManager:
                     likes_count INTEGER DEFAULT 0,
                     is_featured BOOLEAN DEFAULT FALSE,
                     created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
-                )
-            """)
-            
-            # User profile customizations
-            cursor.execute("""
+                );
+                
+                -- User profile customizations
                 CREATE TABLE IF NOT EXISTS profile_customizations (
                     id SERIAL PRIMARY KEY,
                     user_id INTEGER NOT NULL REFERENCES users(user_id) ON DELETE CASCADE,
@@ -159,7 +964,51 @@ class ThemeManager:
                     created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
                     updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
                     UNIQUE(user_id)
-                )
+                );
+                
+                -- Images are stored once, keyed by content hash; the rows above
+                -- only carry the hash so point reads stay small
+                CREATE TABLE IF NOT EXISTS theme_images (
+                    sha256 CHAR(64) PRIMARY KEY,
+                    data BYTEA NOT NULL,
+                    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+                );
+                
+                ALTER TABLE user_theme_preferences ADD COLUMN IF NOT EXISTS custom_avatar_sha256 CHAR(64);
+                ALTER TABLE profile_customizations ADD COLUMN IF NOT EXISTS banner_image_sha256 CHAR(64);
+                ALTER TABLE theme_showcase ADD COLUMN IF NOT EXISTS showcase_image_sha256 CHAR(64);
+                
+                CREATE INDEX IF NOT EXISTS idx_theme_showcase_created
+                ON theme_showcase(created_at DESC, id DESC);
+                
+                -- Lets get_featured_themes read its top 10 in order, with no sort
+                CREATE INDEX IF NOT EXISTS idx_theme_showcase_featured
+                ON theme_showcase(is_featured, likes_count DESC, created_at DESC);
+                
+                -- UNIQUE(user_id) already serves get_user_theme; the old covering index
+                -- carried unbounded TEXT columns that could overflow a btree row
+                DROP INDEX IF EXISTS idx_user_theme_preferences_covering;
+                
+                -- Move blobs that older versions stored inline
+                INSERT INTO theme_images (sha256, data)
+                SELECT encode(sha256(img), 'hex'), img FROM (
+                    SELECT custom_avatar AS img FROM user_theme_preferences WHERE custom_avatar IS NOT NULL
+                    UNION ALL
+                    SELECT banner_image FROM profile_customizations WHERE banner_image IS NOT NULL
+                    UNION ALL
+                    SELECT showcase_image FROM theme_showcase WHERE showcase_image IS NOT NULL
+                ) legacy
+                ON CONFLICT (sha256) DO NOTHING;
+                
+                UPDATE user_theme_preferences
+                SET custom_avatar_sha256 = encode(sha256(custom_avatar), 'hex'), custom_avatar = NULL
+                WHERE custom_avatar IS NOT NULL;
+                UPDATE profile_customizations
+                SET banner_image_sha256 = encode(sha256(banner_image), 'hex'), banner_image = NULL
+                WHERE banner_image IS NOT NULL;
+                UPDATE theme_showcase
+                SET showcase_image_sha256 = encode(sha256(showcase_image), 'hex'), showcase_image = NULL
+                WHERE showcase_image IS NOT NULL;
             """)
             
             conn.commit()
@@ -172,770 +1021,394 @@ class ThemeManager:
         finally:
             self.db_manager.return_connection(conn)
     
+    @staticmethod
+    def _redis_key(user_id, kind):
+        return f"v1:app:user:{user_id}:{kind}"
+    
+    def _cache_get(self, user_id, kind):
+        """Read a cached theme/profile dict from Redis, or None on a miss or error"""
+        if self.redis is None:
+            return None
+        try:
+            data = self.redis.get(self._redis_key(user_id, kind))
+            return pickle.loads(data) if data else None
+        except Exception as e:
+            print(f"Theme cache read error: {e}")
+            return None
+    
+    def _cache_set(self, user_id, kind, value):
+        if self.redis is None:
+            return
+        try:
+            self.redis.setex(self._redis_key(user_id, kind), self._redis_ttl, pickle.dumps(value))
+        except Exception as e:
+            print(f"Theme cache write error: {e}")
+    
+    def _cache_delete(self, user_id, kind):
+        if self.redis is None:
+            return
+        try:
+            self.redis.delete(self._redis_key(user_id, kind))
+        except Exception as e:
+            print(f"Theme cache invalidation error: {e}")
+    
+    def store_image(self, data):
+        """Store image bytes once by content hash and return the hash.
+        
+        Returns None for no image and False if the image couldn't be stored.
+        """
+        if data is None:
+            return None
+        data = bytes(data)
+        sha256 = hashlib.sha256(data).hexdigest()
+        if sha256 in ThemeManager._image_cache:
+            return sha256
+        
+        stored = self.db_manager.execute_query(
+            "INSERT INTO theme_images (sha256, data) VALUES (%s, %s) ON CONFLICT (sha256) DO NOTHING",
+            (sha256, _as_bytea(data)), fetch=False
+        )
+        if not stored:
+            return False
+        self._cache_image(sha256, data)
+        return sha256
+    
+    def get_image(self, sha256):
+        """Load image bytes by content hash"""
+        if not sha256:
+            return None
+        cache = ThemeManager._image_cache
+        with self._image_cache_lock:
+            data = cache.get(sha256)
+            if data is not None:
+                cache.move_to_end(sha256)
+                return data
+        
+        data = self.db_manager.fetch_one_scalar("SELECT data FROM theme_images WHERE sha256 = %s", (sha256,))
+        if data is None:
+            return None
+        data = bytes(data)
+        self._cache_image(sha256, data)
+        return data
+    
+    def _cache_image(self, sha256, data):
+        cache = ThemeManager._image_cache
+        with self._image_cache_lock:
+            cache[sha256] = data
+            cache.move_to_end(sha256)
+            if len(cache) > self._image_cache_size:
+                cache.popitem(last=False)
+    
+    def _with_image(self, row, field):
+        """Return a copy of row with field filled from the image its <field>_sha256 points at"""
+        row = dict(row)
+        row[field] = self.get_image(row.get(f"{field}_sha256"))
+        return row
+    
     def get_user_theme(self, user_id):
         """Get user's current theme preferences"""
+        cached = self._cache_get(user_id, 'theme')
+        if cached is not None:
+            return self._with_image(cached, 'custom_avatar')
+        
         query = """
         SELECT theme_name, background_pattern, custom_background_url, 
-               custom_avatar, profile_border_style, animation_enabled, custom_css
+               custom_avatar_sha256, profile_border_style, animation_enabled, custom_css
         FROM user_theme_preferences 
         WHERE user_id = %s
         """
-        result = self.db_manager.execute_query(query, (user_id,))
-        
-        if not result.empty:
-            return result.iloc[0].to_dict()
-        else:
-            # Return default theme
-            return {
-                'theme_name': 'futuristic',
-                'background_pattern': 'none',
-                'custom_background_url': None,
-                'custom_avatar': None,
-                'profile_border_style': None,
-                'animation_enabled': True,
-                'custom_css': None
-            }
+        theme = self.db_manager.execute_prepared("themes_get_user_theme", query, (user_id,), one=True)
+        
+        if theme is None:
+            # Lookup failed: fall back to the default theme without caching it
+            return self._with_image(DEFAULT_THEME, 'custom_avatar')
+        
+        if not theme:
+            # No saved preferences: return default theme
+            theme = dict(DEFAULT_THEME)
+        
+        self._cache_set(user_id, 'theme', theme)
+        return self._with_image(theme, 'custom_avatar')
+    
+    def get_user_appearance(self, user_id):
+        """Get theme preferences and profile customization in one round-trip.
+        
+        Returns {'theme': ..., 'profile': ...}, each shaped like the result of
+        get_user_theme / get_profile_customization.
+        """
+        theme = self._cache_get(user_id, 'theme')
+        profile = self._cache_get(user_id, 'profile')
+        
+        if theme is None or profile is None:
+            query = """
+            SELECT t.user_id IS NOT NULL AS has_theme, p.user_id IS NOT NULL AS has_profile,
+                   t.theme_name, t.background_pattern, t.custom_background_url,
+                   t.custom_avatar_sha256, t.profile_border_style, t.animation_enabled, t.custom_css,
+                   p.banner_image_sha256, p.status_message, p.favorite_characters, p.profile_visibility,
+                   p.show_achievements, p.show_trading_stats, p.show_portfolio, p.custom_title, p.title_color
+            FROM users u
+            LEFT JOIN user_theme_preferences t ON t.user_id = u.user_id
+            LEFT JOIN profile_customizations p ON p.user_id = u.user_id
+            WHERE u.user_id = %s
+            """
+            row = self.db_manager.execute_prepared("themes_get_user_appearance", query, (user_id,), one=True)
+            # On a failed lookup serve the defaults, but don't cache them
+            loaded = row is not None
+            row = row or {}
+            
+            if theme is None:
+                theme = {k: row[k] for k in DEFAULT_THEME} if row.get('has_theme') else dict(DEFAULT_THEME)
+                if loaded:
+                    self._cache_set(user_id, 'theme', theme)
+            if profile is None:
+                if row.get('has_profile'):
+                    profile = {k: row[k] for k in DEFAULT_PROFILE}
+                else:
+                    profile = dict(DEFAULT_PROFILE, favorite_characters=[])
+                if loaded:
+                    self._cache_set(user_id, 'profile', profile)
+        
+        return {
+            'theme': self._with_image(theme, 'custom_avatar'),
+            'profile': self._with_image(profile, 'banner_image'),
+        }
+    
+    def _theme_params(self, user_id, theme_name, background_pattern='none',
+                      custom_background_url=None, custom_avatar=None,
+                      profile_border_style=None, animation_enabled=True, custom_css=None):
+        """Parameters for _THEME_UPSERT, or None if the avatar couldn't be stored"""
+        avatar_sha256 = self.store_image(custom_avatar)
+        if avatar_sha256 is False:
+            return None
+        return (
+            user_id, theme_name, background_pattern, custom_background_url,
+            avatar_sha256, profile_border_style, animation_enabled, custom_css
+        )
     
     def save_user_theme(self, user_id, theme_name, background_pattern='none', 
                        custom_background_url=None, custom_avatar=None,
                        profile_border_style=None, animation_enabled=True, custom_css=None):
         """Save user theme preferences"""
-        query = """
-        INSERT INTO user_theme_preferences 
-        (user_id, theme_name, background_pattern, custom_background_url, 
-         custom_avatar, profile_border_style, animation_enabled, custom_css, updated_at)
-        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, NOW())
-        ON CONFLICT (user_id) 
-        DO UPDATE SET 
-            theme_name = EXCLUDED.theme_name,
-            background_pattern = EXCLUDED.background_pattern,
-            custom_background_url = EXCLUDED.custom_background_url,
-            custom_avatar = EXCLUDED.custom_avatar,
-            profile_border_style = EXCLUDED.profile_border_style,
-            animation_enabled = EXCLUDED.animation_enabled,
-            custom_css = EXCLUDED.custom_css,
-            updated_at = NOW()
-        """
-        
-        return self.db_manager.execute_query(query, (
+        params = self._theme_params(
             user_id, theme_name, background_pattern, custom_background_url,
             custom_avatar, profile_border_style, animation_enabled, custom_css
-        ), fetch=False)
+        )
+        if params is None:
+            return False
+        
+        saved = self.db_manager.execute_prepared("themes_save_user_theme", _THEME_UPSERT, params)
+        if saved:
+            self._cache_delete(user_id, 'theme')
+        return saved
     
     def get_profile_customization(self, user_id):
         """Get user's profile customization settings"""
+        cached = self._cache_get(user_id, 'profile')
+        if cached is not None:
+            return self._with_image(cached, 'banner_image')
+        
         query = """
-        SELECT banner_image, status_message, favorite_characters, profile_visibility,
+        SELECT banner_image_sha256, status_message, favorite_characters, profile_visibility,
                show_achievements, show_trading_stats, show_portfolio, custom_title, title_color
         FROM profile_customizations 
         WHERE user_id = %s
         """
-        result = self.db_manager.execute_query(query, (user_id,))
-        
-        if not result.empty:
-            return result.iloc[0].to_dict()
-        else:
-            return {
-                'banner_image': None,
-                'status_message': '',
-                'favorite_characters': [],
-                'profile_visibility': 'public',
-                'show_achievements': True,
-                'show_trading_stats': True,
-                'show_portfolio': True,
-                'custom_title': '',
-                'title_color': '#ffffff'
-            }
-    
-    def save_profile_customization(self, user_id, **kwargs):
-        """Save user profile customization settings"""
-        query = """
-        INSERT INTO profile_customizations 
-        (user_id, banner_image, status_message, favorite_characters, profile_visibility,
-         show_achievements, show_trading_stats, show_portfolio, custom_title, title_color, updated_at)
-        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, NOW())
-        ON CONFLICT (user_id) 
-        DO UPDATE SET 
-            banner_image = EXCLUDED.banner_image,
-            status_message = EXCLUDED.status_message,
-            favorite_characters = EXCLUDED.favorite_characters,
-            profile_visibility = EXCLUDED.profile_visibility,
-            show_achievements = EXCLUDED.show_achievements,
-            show_trading_stats = EXCLUDED.show_trading_stats,
-            show_portfolio = EXCLUDED.show_portfolio,
-            custom_title = EXCLUDED.custom_title,
-            title_color = EXCLUDED.title_color,
-            updated_at = NOW()
-        """
+        profile = self.db_manager.execute_prepared("themes_get_profile_customization", query, (user_id,), one=True)
+        
+        if profile is None:
+            # Lookup failed: fall back to the defaults without caching them
+            return self._with_image(dict(DEFAULT_PROFILE, favorite_characters=[]), 'banner_image')
+        
+        if not profile:
+            profile = dict(DEFAULT_PROFILE, favorite_characters=[])
         
-        return self.db_manager.execute_query(query, (
+        self._cache_set(user_id, 'profile', profile)
+        return self._with_image(profile, 'banner_image')
+    
+    def _profile_params(self, user_id, **kwargs):
+        """Parameters for _PROFILE_UPSERT, or None if the banner couldn't be stored"""
+        banner_sha256 = self.store_image(kwargs.get('banner_image'))
+        if banner_sha256 is False:
+            return None
+        favorite_characters = kwargs.get('favorite_characters') or []
+        return (
             user_id,
-            kwargs.get('banner_image'),
+            banner_sha256,
             kwargs.get('status_message', ''),
-            json.dumps(kwargs.get('favorite_characters', [])),
+            json.dumps(favorite_characters, separators=(',', ':')) if favorite_characters else '[]',
             kwargs.get('profile_visibility', 'public'),
             kwargs.get('show_achievements', True),
             kwargs.get('show_trading_stats', True),
             kwargs.get('show_portfolio', True),
             kwargs.get('custom_title', ''),
             kwargs.get('title_color', '#ffffff')
-        ), fetch=False)
+        )
     
-    def apply_theme_css(self, theme_name, background_pattern='none', custom_css=None):
-        """Generate and apply enhanced theme CSS with modern design"""
-        if theme_name not in self.themes:
-            theme_name = 'futuristic'
-        
-        theme = self.themes[theme_name]
-        
-        # Enhanced theme CSS with modern design patterns
-        css = f"""
-        <style>
-        @import url('https://fonts.googleapis.com/css2?family=Inter:wght@300;400;500;600;700;800&family=JetBrains+Mono:wght@300;400;500;600&display=swap');
-        
-        /* Theme: {theme['name']} - Enhanced Design System */
-        :root {{
-            --primary-color: {theme['primary_color']};
-            --secondary-color: {theme['secondary_color']};
-            --background-color: {theme['background_color']};
-            --text-color: {theme['text_color']};
-            --accent-color: {theme['accent_color']};
-            --glass-bg: rgba(255, 255, 255, 0.08);
-            --glass-border: rgba(255, 255, 255, 0.12);
-            --shadow-light: 0 4px 16px rgba(0, 0, 0, 0.1);
-            --shadow-medium: 0 8px 32px rgba(0, 0, 0, 0.15);
-            --shadow-heavy: 0 16px 64px rgba(0, 0, 0, 0.2);
-        }}
-        
-        /* Global App Styling */
-        .stApp {{
-            background: {theme['gradient']};
-            background-attachment: fixed;
-            color: {theme['text_color']};
-            font-family: 'Inter', -apple-system, BlinkMacSystemFont, sans-serif;
-            min-height: 100vh;
-        }}
-        
-        /* Enhanced Background with Floating Elements */
-        .stApp::before {{
-            content: '';
-            position: fixed;
-            top: 0;
-            left: 0;
-            width: 100%;
-            height: 100%;
-            background-image: 
-                radial-gradient(circle at 20% 80%, {theme['primary_color']}22 0%, transparent 50%),
-                radial-gradient(circle at 80% 20%, {theme['secondary_color']}15 0%, transparent 50%),
-                radial-gradient(circle at 40% 40%, {theme['accent_color']}10 0%, transparent 50%);
-            background-size: 100% 100%;
-            pointer-events: none;
-            z-index: -1;
-            animation: floating-orbs 20s ease-in-out infinite;
-        }}
-        
-        @keyframes floating-orbs {{
-            0%, 100% {{ transform: translate(0, 0) scale(1); }}
-            25% {{ transform: translate(10px, -10px) scale(1.1); }}
-            50% {{ transform: translate(-5px, 5px) scale(0.9); }}
-            75% {{ transform: translate(-10px, -5px) scale(1.05); }}
-        }}
-        
-        /* Typography Enhancements */
-        h1, h2, h3, h4, h5, h6 {{
-            font-weight: 700;
-            letter-spacing: -0.025em;
-            line-height: 1.2;
-        }}
-        
-        .main-header {{
-            text-align: center;
-            background: linear-gradient(135deg, {theme['primary_color']}, {theme['secondary_color']}, {theme['accent_color']});
-            -webkit-background-clip: text;
-            -webkit-text-fill-color: transparent;
-            background-clip: text;
-            font-size: clamp(2rem, 5vw, 4rem);
-            font-weight: 800;
-            margin-bottom: 3rem;
-            position: relative;
-            animation: glow-pulse 3s ease-in-out infinite;
-        }}
-        
-        .main-header::after {{
-            content: '';
-            position: absolute;
-            top: 100%;
-            left: 50%;
-            transform: translateX(-50%);
-            width: 100px;
-            height: 4px;
-            background: linear-gradient(90deg, transparent, {theme['primary_color']}, transparent);
-            margin-top: 1rem;
-            border-radius: 2px;
-        }}
-        
-        @keyframes glow-pulse {{
-            0%, 100% {{ 
-                filter: brightness(1) drop-shadow(0 0 20px {theme['primary_color']}66); 
-                transform: scale(1);
-            }}
-            50% {{ 
-                filter: brightness(1.2) drop-shadow(0 0 30px {theme['primary_color']}99); 
-                transform: scale(1.02);
-            }}
-        }}
-        
-        /* Advanced Glass Morphism Cards */
-        .glass-card, .profile-card, .tier-card {{
-            background: linear-gradient(135deg, var(--glass-bg), rgba(255, 255, 255, 0.04));
-            backdrop-filter: blur(20px);
-            border: 1px solid var(--glass-border);
-            border-radius: 24px;
-            padding: 2rem;
-            box-shadow: 
-                var(--shadow-medium),
-                inset 0 1px 0 rgba(255, 255, 255, 0.1);
-            transition: all 0.4s cubic-bezier(0.4, 0, 0.2, 1);
-            position: relative;
-            overflow: hidden;
-        }}
-        
-        .glass-card::before {{
-            content: '';
-            position: absolute;
-            top: 0;
-            left: -100%;
-            width: 100%;
-            height: 100%;
-            background: linear-gradient(90deg, transparent, rgba(255, 255, 255, 0.1), transparent);
-            transition: left 0.7s ease;
-        }}
-        
-        .glass-card:hover {{
-            transform: translateY(-6px) scale(1.02);
-            box-shadow: 
-                var(--shadow-heavy),
-                inset 0 1px 0 rgba(255, 255, 255, 0.15);
-            border-color: {theme['primary_color']}66;
-        }}
-        
-        .glass-card:hover::before {{
-            left: 100%;
-        }}
-        
-        /* Enhanced Button System */
-        .stButton > button {{
-            background: linear-gradient(135deg, {theme['primary_color']}, {theme['secondary_color']});
-            color: white;
-            border: none;
-            border-radius: 16px;
-            padding: 1rem 2rem;
-            font-weight: 600;
-            font-size: 0.95rem;
-            font-family: 'Inter', sans-serif;
-            transition: all 0.3s cubic-bezier(0.4, 0, 0.2, 1);
-            box-shadow: 
-                0 4px 16px {theme['primary_color']}44,
-                0 2px 8px rgba(0, 0, 0, 0.1);
-            position: relative;
-            overflow: hidden;
-            text-transform: none;
-            letter-spacing: 0.025em;
-        }}
-        
-        .stButton > button::before {{
-            content: '';
-            position: absolute;
-            top: 0;
-            left: -100%;
-            width: 100%;
-            height: 100%;
-            background: linear-gradient(90deg, transparent, rgba(255, 255, 255, 0.25), transparent);
-            transition: left 0.5s ease;
-        }}
-        
-        .stButton > button:hover {{
-            transform: translateY(-3px);
-            box-shadow: 
-                0 8px 24px {theme['primary_color']}66,
-                0 4px 16px rgba(0, 0, 0, 0.15);
-            filter: brightness(1.1);
-        }}
-        
-        .stButton > button:hover::before {{
-            left: 100%;
-        }}
-        
-        .stButton > button:active {{
-            transform: translateY(-1px);
-            transition: transform 0.1s ease;
-        }}
-        
-        /* Enhanced Form Elements */
-        .stTextInput > div > div > input,
-        .stTextArea > div > div > textarea,
-        .stSelectbox > div > div,
-        .stNumberInput > div > div > input {{
-            background: rgba(255, 255, 255, 0.08) !important;
-            border: 2px solid rgba(255, 255, 255, 0.12) !important;
-            border-radius: 12px !important;
-            color: {theme['text_color']} !important;
-            backdrop-filter: blur(10px);
-            transition: all 0.3s ease !important;
-            font-family: 'Inter', sans-serif !important;
-            font-size: 0.95rem !important;
-        }}
-        
-        .stTextInput > div > div > input:focus,
-        .stTextArea > div > div > textarea:focus,
-        .stSelectbox > div > div:focus,
-        .stNumberInput > div > div > input:focus {{
-            border-color: {theme['primary_color']} !important;
-            box-shadow: 0 0 0 3px {theme['primary_color']}33 !important;
-            background: rgba(255, 255, 255, 0.12) !important;
-            outline: none !important;
-        }}
-        
-        /* Enhanced Metrics */
-        [data-testid="metric-container"] {{
-            background: linear-gradient(135deg, var(--glass-bg), rgba(255, 255, 255, 0.04));
-            border: 1px solid var(--glass-border);
-            border-radius: 20px;
-            padding: 1.5rem;
-            backdrop-filter: blur(15px);
-            transition: all 0.3s ease;
-            box-shadow: var(--shadow-light);
-            position: relative;
-            overflow: hidden;
-        }}
-        
-        [data-testid="metric-container"]::before {{
-            content: '';
-            position: absolute;
-            top: 0;
-            left: 0;
-            right: 0;
-            height: 2px;
-            background: linear-gradient(90deg, {theme['primary_color']}, {theme['secondary_color']});
-            opacity: 0;
-            transition: opacity 0.3s ease;
-        }}
-        
-        [data-testid="metric-container"]:hover {{
-            transform: translateY(-4px);
-            box-shadow: var(--shadow-medium);
-            border-color: {theme['primary_color']}44;
-        }}
-        
-        [data-testid="metric-container"]:hover::before {{
-            opacity: 1;
-        }}
-        
-        /* Enhanced Sidebar */
-        .css-1d391kg {{
-            background: linear-gradient(180deg, 
-                rgba(0, 0, 0, 0.85) 0%, 
-                rgba(0, 0, 0, 0.75) 100%) !important;
-            backdrop-filter: blur(20px) !important;
-            border-right: 1px solid rgba(255, 255, 255, 0.1) !important;
-        }}
-        
-        /* Enhanced Tables */
-        .stDataFrame {{
-            border-radius: 16px;
-            overflow: hidden;
-            box-shadow: var(--shadow-medium);
-            border: 1px solid var(--glass-border);
-        }}
-        
-        .stDataFrame table {{
-            background: var(--glass-bg);
-            backdrop-filter: blur(10px);
-        }}
-        
-        /* Enhanced Tabs */
-        .stTabs [data-baseweb="tab-list"] {{
-            gap: 8px;
-            background: rgba(255, 255, 255, 0.06);
-            border-radius: 16px;
-            padding: 6px;
-            backdrop-filter: blur(10px);
-            border: 1px solid var(--glass-border);
-        }}
-        
-        .stTabs [data-baseweb="tab"] {{
-            border-radius: 12px;
-            padding: 12px 24px;
-            font-weight: 600;
-            transition: all 0.3s ease;
-            border: none;
-            font-family: 'Inter', sans-serif;
-        }}
-        
-        .stTabs [data-baseweb="tab"]:hover {{
-            background: rgba(255, 255, 255, 0.1);
-            transform: translateY(-1px);
-        }}
-        
-        .stTabs [data-baseweb="tab"][aria-selected="true"] {{
-            background: linear-gradient(135deg, {theme['primary_color']}, {theme['secondary_color']});
-            color: white;
-            box-shadow: 0 4px 12px {theme['primary_color']}44;
-        }}
-        
-        /* Profile Enhancements */
-        .profile-avatar {{
-            width: 120px;
-            height: 120px;
-            border-radius: 50%;
-            border: 4px solid {theme['primary_color']};
-            object-fit: cover;
-            margin-top: -60px;
-            margin-left: 20px;
-            background: var(--glass-bg);
-            box-shadow: var(--shadow-medium);
-            transition: all 0.3s ease;
-            position: relative;
-        }}
-        
-        .profile-avatar::after {{
-            content: '';
-            position: absolute;
-            inset: -4px;
-            border-radius: 50%;
-            background: linear-gradient(135deg, {theme['primary_color']}, {theme['secondary_color']});
-            z-index: -1;
-            opacity: 0;
-            transition: opacity 0.3s ease;
-        }}
-        
-        .profile-avatar:hover {{
-            transform: scale(1.05);
-            box-shadow: var(--shadow-heavy);
-        }}
-        
-        .profile-avatar:hover::after {{
-            opacity: 0.8;
-        }}
-        
-        .profile-banner {{
-            width: 100%;
-            height: 200px;
-            object-fit: cover;
-            border-radius: 24px 24px 0 0;
-        }}
-        
-        .custom-title {{
-            font-weight: 600;
-            font-size: 1.1em;
-            margin: 10px 0;
-            text-shadow: 0 2px 4px rgba(0, 0, 0, 0.3);
-            background: linear-gradient(135deg, {theme['primary_color']}, {theme['secondary_color']});
-            -webkit-background-clip: text;
-            -webkit-text-fill-color: transparent;
-            background-clip: text;
-        }}
-        
-        .status-message {{
-            font-style: italic;
-            opacity: 0.8;
-            margin-bottom: 15px;
-            font-size: 0.9em;
-            font-weight: 300;
-        }}
-        
-        .favorite-character {{
-            display: inline-block;
-            background: var(--glass-bg);
-            border-radius: 20px;
-            padding: 8px 16px;
-            margin: 4px;
-            border: 1px solid {theme['primary_color']}44;
-            backdrop-filter: blur(10px);
-            transition: all 0.3s ease;
-            font-weight: 500;
-            font-size: 0.9em;
-        }}
-        
-        .favorite-character:hover {{
-            transform: translateY(-2px);
-            background: {theme['primary_color']}22;
-            border-color: {theme['primary_color']};
-            box-shadow: 0 4px 12px {theme['primary_color']}33;
-        }}
-        
-        /* Achievement System */
-        .achievement-badge {{
-            background: linear-gradient(135deg, {theme['primary_color']}, {theme['secondary_color']});
-            border-radius: 24px;
-            padding: 8px 20px;
-            margin: 6px;
-            display: inline-block;
-            color: white;
-            font-weight: 600;
-            box-shadow: 0 4px 16px {theme['primary_color']}44;
-            transition: all 0.3s ease;
-            position: relative;
-            overflow: hidden;
-            font-size: 0.9em;
-        }}
-        
-        .achievement-badge::before {{
-            content: '';
-            position: absolute;
-            top: 0;
-            left: -100%;
-            width: 100%;
-            height: 100%;
-            background: linear-gradient(90deg, transparent, rgba(255, 255, 255, 0.3), transparent);
-            transition: left 0.6s ease;
-        }}
+    def save_profile_customization(self, user_id, **kwargs):
+        """Save user profile customization settings"""
+        params = self._profile_params(user_id, **kwargs)
+        if params is None:
+            return False
         
-        .achievement-badge:hover {{
-            transform: translateY(-2px) scale(1.05);
-            box-shadow: 0 8px 24px {theme['primary_color']}66;
-        }}
+        saved = self.db_manager.execute_prepared("themes_save_profile_customization", _PROFILE_UPSERT, params)
+        if saved:
+            self._cache_delete(user_id, 'profile')
+        return saved
+    
+    def save_all(self, user_id, theme_kwargs, profile_kwargs):
+        """Save theme preferences and profile customization together.
         
-        .achievement-badge:hover::before {{
-            left: 100%;
-        }}
+        theme_kwargs/profile_kwargs are the keyword arguments of save_user_theme
+        and save_profile_customization; both upserts go out as one statement.
         """
+        theme_params = self._theme_params(user_id, **theme_kwargs)
+        profile_params = self._profile_params(user_id, **profile_kwargs)
+        if theme_params is None or profile_params is None:
+            return False
         
-        # Add enhanced background patterns
-        if background_pattern == 'dots':
-            css += f"""
-            .stApp::after {{
-                content: '';
-                position: fixed;
-                top: 0;
-                left: 0;
-                width: 100%;
-                height: 100%;
-                background-image: radial-gradient({theme['primary_color']}88 1px, transparent 1px);
-                background-size: 30px 30px;
-                opacity: 0.3;
-                z-index: -1;
-                animation: dots-float 10s linear infinite;
-            }}
-            
-            @keyframes dots-float {{
-                0% {{ transform: translateY(0px); }}
-                100% {{ transform: translateY(-30px); }}
-            }}
-            """
-        elif background_pattern == 'lines':
-            css += f"""
-            .stApp::after {{
-                content: '';
-                position: fixed;
-                top: 0;
-                left: 0;
-                width: 100%;
-                height: 100%;
-                background-image: 
-                    linear-gradient(90deg, {theme['primary_color']}22 1px, transparent 1px),
-                    linear-gradient(0deg, {theme['primary_color']}22 1px, transparent 1px);
-                background-size: 40px 40px;
-                opacity: 0.4;
-                z-index: -1;
-                animation: grid-shift 15s linear infinite;
-            }}
-            
-            @keyframes grid-shift {{
-                0% {{ transform: translate(0, 0); }}
-                100% {{ transform: translate(40px, 40px); }}
-            }}
-            """
-        elif background_pattern == 'hexagon':
-            css += f"""
-            .stApp::after {{
-                content: '';
-                position: fixed;
-                top: 0;
-                left: 0;
-                width: 100%;
-                height: 100%;
-                background-image: url("data:image/svg+xml,%3Csvg width='60' height='60' viewBox='0 0 60 60' xmlns='http://www.w3.org/2000/svg'%3E%3Cg fill='none' fill-rule='evenodd'%3E%3Cg fill='{theme['primary_color'].replace('#', '%23')}' fill-opacity='0.2'%3E%3Cpath d='m36 34v-4h-2v4h-4v2h4v4h2v-4h4v-2h-4zm0-30V0h-2v4h-4v2h4v4h2V6h4V4h-4zM6 34v-4H4v4H0v2h4v4h2v-4h4v-2H6zM6 4V0H4v4H0v2h4v4h2V6h4V4H6z'/%3E%3C/g%3E%3C/g%3E%3C/svg%3E");
-                z-index: -1;
-                opacity: 0.6;
-                animation: hexagon-pulse 8s ease-in-out infinite;
-            }}
-            
-            @keyframes hexagon-pulse {{
-                0%, 100% {{ opacity: 0.3; }}
-                50% {{ opacity: 0.6; }}
-            }}
-            """
-        
-        # Add responsive design improvements
-        css += f"""
-        
-        /* Enhanced Responsive Design */
-        @media (max-width: 768px) {{
-            .main-header {{
-                font-size: 2.5rem;
-                margin-bottom: 2rem;
-            }}
-            
-            .glass-card, .profile-card, .tier-card {{
-                padding: 1.5rem;
-                margin: 1rem 0;
-                border-radius: 20px;
-            }}
-            
-            .stButton > button {{
-                width: 100%;
-                margin-bottom: 0.75rem;
-                padding: 1rem 1.5rem;
-                font-size: 1rem;
-            }}
-            
-            .profile-avatar {{
-                width: 80px;
-                height: 80px;
-                margin-top: -40px;
-            }}
-            
-            [data-testid="metric-container"] {{
-                padding: 1rem;
-                margin: 0.5rem 0;
-            }}
-        }}
-        
-        @media (max-width: 480px) {{
-            .main-header {{
-                font-size: 2rem;
-            }}
-            
-            .glass-card, .profile-card, .tier-card {{
-                padding: 1rem;
-                margin: 0.75rem 0;
-            }}
-        }}
-        
-        /* Loading States */
-        @keyframes shimmer {{
-            0% {{ transform: translateX(-100%); }}
-            100% {{ transform: translateX(100%); }}
-        }}
-        
-        .loading-shimmer {{
-            position: relative;
-            overflow: hidden;
-        }}
-        
-        .loading-shimmer::after {{
-            content: '';
-            position: absolute;
-            top: 0;
-            right: 0;
-            bottom: 0;
-            left: 0;
-            background: linear-gradient(90deg, transparent, rgba(255, 255, 255, 0.1), transparent);
-            animation: shimmer 2s infinite;
-        }}
-        
-        /* Scrollbar Styling */
-        ::-webkit-scrollbar {{
-            width: 8px;
-        }}
+        query = f"WITH theme AS ({_THEME_UPSERT} RETURNING 1)\n{_PROFILE_UPSERT}"
+        saved = self.db_manager.execute_prepared("themes_save_all", query, theme_params + profile_params)
+        if saved:
+            self._cache_delete(user_id, 'theme')
+            self._cache_delete(user_id, 'profile')
+        return saved
+    
+    def apply_theme_css(self, theme_name, background_pattern='none', custom_css=None):
+        """Generate and apply enhanced theme CSS with modern design"""
+        if theme_name not in self.themes:
+            theme_name = 'futuristic'
         
-        ::-webkit-scrollbar-track {{
-            background: rgba(255, 255, 255, 0.05);
-            border-radius: 4px;
-        }}
+        if SERVE_STATIC_CSS and background_pattern in self.background_patterns:
+            url = _static_css_url(theme_name, background_pattern)
+            if url:
+                link = f'<link rel="stylesheet" href="{url}">'
+                if custom_css:
+                    link += f"<style>\n/* Custom User CSS */\n{custom_css}\n</style>"
+                return link
         
-        ::-webkit-scrollbar-thumb {{
-            background: {theme['primary_color']}88;
-            border-radius: 4px;
-        }}
+        return _render_css(theme_name, background_pattern, custom_css)
+    
+    def inject_theme_css(self, theme_name, background_pattern='none', custom_css=None):
+        """Render the theme stylesheet into the current page.
         
-        ::-webkit-scrollbar-thumb:hover {{
-            background: {theme['primary_color']};
-        }}
+        Must run on every rerun: Streamlit drops elements a rerun doesn't emit,
+        so a once-per-session injection would strip the theme. The memoized
+        CSS is the same string object each time, so the frontend sees an
+        unchanged element and keeps its existing <style> node.
         """
-        
-        # Add custom CSS if provided
-        if custom_css:
-            css += f"\n/* Custom User CSS */\n{custom_css}\n"
-        
-        css += "</style>"
-        
-        return css
+        st.markdown(self.apply_theme_css(theme_name, background_pattern, custom_css), unsafe_allow_html=True)
     
     def get_theme_preview(self, theme_name):
         """Generate theme preview"""
         if theme_name not in self.themes:
             return None
         
-        theme = self.themes[theme_name]
-        
-        preview_html = f"""
-        <div style="
-            background: {theme['gradient']};
-            color: {theme['text_color']};
-            padding: 20px;
-            border-radius: 15px;
-            border: {theme['border_style']};
-            box-shadow: {theme['shadow']};
-            text-align: center;
-            margin: 10px 0;
-        ">
-            <h3 style="margin: 0; color: {theme['primary_color']};">{theme['name']}</h3>
-            <p style="margin: 10px 0; font-size: 14px; opacity: 0.8;">{theme['description']}</p>
-            <div style="
-                background: linear-gradient(45deg, {theme['primary_color']}, {theme['secondary_color']});
-                color: white;
-                padding: 8px 16px;
-                border-radius: 20px;
-                display: inline-block;
-                margin: 5px;
-                font-size: 12px;
-            ">Sample Badge</div>
-        </div>
-        """
-        
-        return preview_html
+        return _render_preview(theme_name)
     
-    def process_uploaded_image(self, uploaded_file, max_size=(800, 600)):
-        """Process uploaded image for profile customization"""
+    def _compress_upload(self, uploaded_file, max_size):
+        """Resize and JPEG-encode an upload into a BytesIO, or None"""
         if uploaded_file is not None:
+            # Pillow is only needed on upload, so keep it off the import path
+            from PIL import Image
+            
             try:
                 image = Image.open(uploaded_file)
+                # Let libjpeg decode straight at a reduced scale (no-op for other formats)
+                image.draft('RGB', max_size)
+                image.load()
                 
-                # Resize if necessary
-                if image.size[0] > max_size[0] or image.size[1] > max_size[1]:
-                    image.thumbnail(max_size, Image.Resampling.LANCZOS)
-                
-                # Convert to RGB if necessary
-                if image.mode in ('RGBA', 'P'):
+                # Convert to RGB first so the resize filters 3 channels, not 4
+                if image.mode not in ('RGB', 'L'):
                     image = image.convert('RGB')
                 
-                # Convert to bytes
-                img_buffer = io.BytesIO()
-                image.save(img_buffer, format='JPEG', quality=85)
-                img_bytes = img_buffer.getvalue()
+                # Resize if necessary; after draft's downscale BILINEAR looks the same as LANCZOS
+                if image.size[0] > max_size[0] or image.size[1] > max_size[1]:
+                    image.thumbnail(max_size, Image.Resampling.BILINEAR)
                 
-                return img_bytes
+                img_buffer = io.BytesIO()
+                image.save(img_buffer, format='JPEG', quality=82, optimize=True, progressive=True)
+                return img_buffer
             except Exception as e:
                 st.error(f"Error processing image: {e}")
                 return None
         return None
     
+    def process_uploaded_image(self, uploaded_file, max_size=(800, 600)):
+        """Process uploaded image for profile customization"""
+        img_buffer = self._compress_upload(uploaded_file, max_size)
+        return img_buffer.getvalue() if img_buffer else None
+    
+    def process_uploaded_image_to_b64(self, uploaded_file, max_size=(800, 600)):
+        """Process an uploaded image straight to a base64 string.
+        
+        Encodes from the buffer's memoryview, skipping the bytes copy that
+        process_uploaded_image + image_to_base64 make.
+        """
+        img_buffer = self._compress_upload(uploaded_file, max_size)
+        if img_buffer:
+            return base64.b64encode(img_buffer.getbuffer()).decode('ascii')
+        return None
+    
     def image_to_base64(self, img_bytes):
         """Convert image bytes to base64 string"""
         if img_bytes:
             return base64.b64encode(img_bytes).decode()
         return None
     
-    def get_featured_themes(self):
-        """Get featured theme showcases"""
-        query = """
-        SELECT ts.*, u.username, u.display_name 
+    def bulk_insert_showcases(self, rows):
+        """Bulk-load theme showcase entries, e.g. for admin seeding.
+        
+        rows are (user_id, theme_name, showcase_image, description) tuples. The
+        distinct images go in one batched insert and the entries are streamed
+        with COPY instead of one INSERT per row.
+        """
+        images = {}
+        staged = []
+        for user_id, theme_name, image, description in rows:
+            sha256 = None
+            if image is not None:
+                image = bytes(image)
+                sha256 = hashlib.sha256(image).hexdigest()
+                images[sha256] = image
+            staged.append((user_id, theme_name, sha256, description))
+        
+        if images and not self.db_manager.execute_values(
+            "INSERT INTO theme_images (sha256, data) VALUES %s ON CONFLICT (sha256) DO NOTHING",
+            [(sha256, _as_bytea(data)) for sha256, data in images.items()], page_size=50
+        ):
+            return False
+        
+        return self.db_manager.copy_rows("""
+            CREATE TEMP TABLE tmp_theme_showcase (
+                user_id INTEGER, theme_name VARCHAR(50),
+                showcase_image_sha256 CHAR(64), description TEXT
+            ) ON COMMIT DROP
+        """, "COPY tmp_theme_showcase FROM STDIN WITH CSV", staged, """
+            INSERT INTO theme_showcase (user_id, theme_name, showcase_image_sha256, description)
+            SELECT user_id, theme_name, showcase_image_sha256, description
+            FROM tmp_theme_showcase
+        """)
+    
+    def get_showcases(self, cursor_ts=None, cursor_id=None, limit=20):
+        """Get a page of theme showcases, newest first.
+        
+        Keyset-paginated on (created_at, id): pass the last row's created_at and
+        id to get the next page. Rows carry the image hash; load the bytes
+        with get_image only for entries actually shown.
+        """
+        page_filter = "WHERE (ts.created_at, ts.id) < (%s, %s)" if cursor_ts is not None else ""
+        query = f"""
+        SELECT ts.id, ts.user_id, ts.theme_name, ts.showcase_image_sha256, ts.description,
+               ts.likes_count, ts.is_featured, ts.created_at, u.username, u.display_name
         FROM theme_showcase ts
         JOIN users u ON ts.user_id = u.user_id
-        WHERE ts.is_featured = TRUE
-        ORDER BY ts.likes_count DESC, ts.created_at DESC
-        LIMIT 10
+        {page_filter}
+        ORDER BY ts.created_at DESC, ts.id DESC
+        LIMIT %s
         """
-        return self.db_manager.execute_query(query)
\ No newline at end of file
+        params = (cursor_ts, cursor_id, limit) if page_filter else (limit,)
+        return self.db_manager.execute_query(query, params, as_df=False)
+    
+    def get_featured_themes(self):
+        """Get featured theme showcases"""
+        return _featured_themes(self.db_manager)
\ No newline at end of file
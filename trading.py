@@ -1,10 +1,54 @@
 import pandas as pd
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 import streamlit as st
+from achievements import AchievementManager
+
+# Achievement checks run after the trade is acknowledged; one pool per process
+_achievement_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="trade-achievements")
+
+# Row count above which trade history is read through COPY instead of the cursor
+BULK_READ_THRESHOLD = 1000
+
+MARKET_TRENDS_QUERY = """
+    SELECT c.name, c.tier, c.value, c.demand, c.trend,
+           COUNT(t.trade_id) as trade_count,
+           SUM(CASE WHEN t.action = 'BUY' THEN t.quantity ELSE 0 END) as buy_volume,
+           SUM(CASE WHEN t.action = 'SELL' THEN t.quantity ELSE 0 END) as sell_volume
+    FROM characters c
+    LEFT JOIN trades t ON c.name = t.character_name
+        AND t.trade_date >= NOW() - INTERVAL '7 days'
+    GROUP BY c.name, c.tier, c.value, c.demand, c.trend
+    ORDER BY trade_count DESC, c.value DESC
+    LIMIT 20
+"""
+
+@st.cache_data(ttl=60)
+def _market_trends(_db):
+    """7-day market trends, shared across sessions; slightly stale is fine here"""
+    return _db.execute_query(MARKET_TRENDS_QUERY)
 
 class TradingManager:
+    # Indexes only need creating once per process, not per instance
+    _indexes_initialized = False
+    
     def __init__(self, db_manager):
         self.db = db_manager
+        self.achievements = AchievementManager(db_manager)
+        
+        if not TradingManager._indexes_initialized:
+            # Flag first: a failed build (e.g. duplicate holdings) shouldn't be retried every rerun
+            TradingManager._indexes_initialized = True
+            self.init_trading_indexes()
+    
+    def init_trading_indexes(self):
+        """Index the (user_id, character_name) lookups every trade makes"""
+        # INCLUDE makes quantity/average_price reads index-only
+        return self.db.execute_query("""
+            CREATE UNIQUE INDEX IF NOT EXISTS portfolios_user_char_uk
+            ON portfolios(user_id, character_name) INCLUDE (quantity, average_price)
+        """, fetch=False)
     
     def get_user_portfolio(self, user_id):
         """Get user's current portfolio"""
@@ -17,224 +61,154 @@ class TradingManager:
     
     def get_owned_quantity(self, user_id, character_name):
         """Get quantity of character owned by user"""
-        result = self.db.execute_query("""
+        quantity = self.db.execute_prepared("trading_owned_quantity", """
             SELECT quantity FROM portfolios
             WHERE user_id = %s AND character_name = %s
-        """, (user_id, character_name))
+        """, (user_id, character_name), scalar=True)
         
-        if not result.empty:
-            return result.iloc[0]['quantity']
-        return 0
+        return quantity or 0
+    
+    def _check_achievements(self, user_id):
+        """Award any achievements unlocked by the user's latest trade"""
+        try:
+            self.achievements.check_and_award_achievements(user_id)
+        except:
+            pass  # Don't fail trades if achievement system has issues
     
     def buy_character(self, user_id, character_name, quantity, price):
         """Buy character"""
         total_cost = price * quantity
         
-        # Check if user has enough currency
-        user_data = self.db.execute_query("""
-            SELECT virtual_currency FROM users WHERE user_id = %s
-        """, (user_id,))
-        
-        if user_data.empty or user_data.iloc[0]['virtual_currency'] < total_cost:
-            return False
-        
-        # Update user currency
-        new_balance = int(user_data.iloc[0]['virtual_currency']) - int(total_cost)
-        self.db.execute_query("""
-            UPDATE users SET virtual_currency = %s WHERE user_id = %s
-        """, (new_balance, user_id), fetch=False)
-        
-        # Update portfolio
-        existing = self.db.execute_query("""
-            SELECT quantity, average_price FROM portfolios
-            WHERE user_id = %s AND character_name = %s
-        """, (user_id, character_name))
-        
-        if existing.empty:
-            # Create new portfolio entry
-            self.db.execute_query("""
+        # Debit, portfolio upsert and trade record in one statement: nothing is
+        # written unless the balance covers the cost. Parameters carry explicit
+        # casts because a prepared statement can't infer them from the values.
+        trade_id = self.db.execute_prepared("trading_buy_character", """
+            WITH debited AS (
+                UPDATE users SET virtual_currency = virtual_currency - %s::bigint
+                WHERE user_id = %s::integer AND virtual_currency >= %s::bigint
+                RETURNING user_id
+            ), updated AS (
+                UPDATE portfolios
+                SET quantity = quantity + %s::integer,
+                    average_price = ((average_price * quantity) + (%s::numeric * %s::integer)) / (quantity + %s::integer),
+                    updated_at = CURRENT_TIMESTAMP
+                WHERE user_id = %s::integer AND character_name = %s::text
+                  AND EXISTS (SELECT 1 FROM debited)
+                RETURNING user_id
+            ), inserted AS (
                 INSERT INTO portfolios (user_id, character_name, quantity, average_price)
-                VALUES (%s, %s, %s, %s)
-            """, (user_id, character_name, quantity, price), fetch=False)
-        else:
-            # Update existing entry
-            current_qty = existing.iloc[0]['quantity']
-            current_avg = existing.iloc[0]['average_price']
-            
-            new_qty = current_qty + quantity
-            new_avg = ((current_avg * current_qty) + (price * quantity)) / new_qty
-            
-            self.db.execute_query("""
-                UPDATE portfolios 
-                SET quantity = %s, average_price = %s, updated_at = CURRENT_TIMESTAMP
-                WHERE user_id = %s AND character_name = %s
-            """, (new_qty, new_avg, user_id, character_name), fetch=False)
-        
-        # Record trade
-        self.db.execute_query("""
+                SELECT user_id, %s::text, %s::integer, %s::numeric FROM debited
+                WHERE NOT EXISTS (SELECT 1 FROM updated)
+            )
             INSERT INTO trades (user_id, character_name, action, quantity, price, total_value)
-            VALUES (%s, %s, 'BUY', %s, %s, %s)
-        """, (user_id, character_name, quantity, price, total_cost), fetch=False)
+            SELECT user_id, %s::text, 'BUY', %s::integer, %s::numeric, %s::numeric FROM debited
+            RETURNING trade_id
+        """, (int(total_cost), user_id, int(total_cost),
+              quantity, price, quantity, quantity, user_id, character_name,
+              character_name, quantity, price,
+              character_name, quantity, price, total_cost), scalar=True)
+        
+        if trade_id is None:
+            return False
         
-        # Check for achievements after successful trade
-        try:
-            from achievements import AchievementManager
-            achievement_manager = AchievementManager(self.db)
-            achievement_manager.check_and_award_achievements(user_id)
-        except:
-            pass  # Don't fail trades if achievement system has issues
+        # Check for achievements after successful trade, off the request path
+        _achievement_executor.submit(self._check_achievements, user_id)
         
         return True
     
     def sell_character(self, user_id, character_name, quantity, price):
         """Sell character"""
-        # Check if user owns enough
-        owned_qty = self.get_owned_quantity(user_id, character_name)
-        if owned_qty < quantity:
-            return False
-        
         total_value = price * quantity
         
-        # Get average purchase price for profit/loss calculation
-        portfolio_data = self.db.execute_query("""
-            SELECT average_price FROM portfolios
-            WHERE user_id = %s AND character_name = %s
-        """, (user_id, character_name))
-        
-        profit_loss = 0
-        if not portfolio_data.empty:
-            avg_price = portfolio_data.iloc[0]['average_price']
-            profit_loss = (price - avg_price) * quantity
-        
-        # Update user currency
-        user_data = self.db.execute_query("""
-            SELECT virtual_currency FROM users WHERE user_id = %s
-        """, (user_id,))
-        
-        if not user_data.empty:
-            new_balance = int(user_data.iloc[0]['virtual_currency']) + int(total_value)
-            self.db.execute_query("""
-                UPDATE users SET virtual_currency = %s WHERE user_id = %s
-            """, (new_balance, user_id), fetch=False)
-        
-        # Update portfolio
-        new_qty = owned_qty - quantity
-        if new_qty == 0:
-            # Remove from portfolio
-            self.db.execute_query("""
-                UPDATE portfolios SET quantity = 0
-                WHERE user_id = %s AND character_name = %s
-            """, (user_id, character_name), fetch=False)
-        else:
-            # Update quantity
-            self.db.execute_query("""
-                UPDATE portfolios 
-                SET quantity = %s, updated_at = CURRENT_TIMESTAMP
-                WHERE user_id = %s AND character_name = %s
-            """, (new_qty, user_id, character_name), fetch=False)
-        
-        # Record trade
-        self.db.execute_query("""
+        # Portfolio decrement, credit and trade record in one statement: nothing
+        # is written unless the user owns enough
+        trade_id = self.db.execute_prepared("trading_sell_character", """
+            WITH held AS (
+                UPDATE portfolios
+                SET quantity = quantity - %s::integer, updated_at = CURRENT_TIMESTAMP
+                WHERE user_id = %s::integer AND character_name = %s::text AND quantity >= %s::integer
+                RETURNING user_id, average_price
+            ), credited AS (
+                UPDATE users SET virtual_currency = virtual_currency + %s::bigint
+                WHERE user_id IN (SELECT user_id FROM held)
+            )
             INSERT INTO trades (user_id, character_name, action, quantity, price, total_value, profit_loss)
-            VALUES (%s, %s, 'SELL', %s, %s, %s, %s)
-        """, (user_id, character_name, quantity, price, total_value, profit_loss), fetch=False)
+            SELECT user_id, %s::text, 'SELL', %s::integer, %s::numeric, %s::numeric,
+                   (%s::numeric - average_price) * %s::integer
+            FROM held
+            RETURNING trade_id
+        """, (quantity, user_id, character_name, quantity,
+              int(total_value),
+              character_name, quantity, price, total_value, price, quantity), scalar=True)
+        
+        if trade_id is None:
+            return False
         
-        # Check for achievements after successful trade
-        try:
-            from achievements import AchievementManager
-            achievement_manager = AchievementManager(self.db)
-            achievement_manager.check_and_award_achievements(user_id)
-        except:
-            pass  # Don't fail trades if achievement system has issues
+        # Check for achievements after successful trade, off the request path
+        _achievement_executor.submit(self._check_achievements, user_id)
         
         return True
     
     def get_user_trades(self, user_id, limit=100):
         """Get user's trading history"""
-        return self.db.execute_query("""
+        query = """
             SELECT trade_id, character_name, action, quantity, price, total_value, profit_loss, trade_date
             FROM trades
             WHERE user_id = %s
             ORDER BY trade_date DESC
             LIMIT %s
-        """, (user_id, limit))
+        """
+        # Long histories come back as CSV and are parsed in bulk
+        if limit > BULK_READ_THRESHOLD:
+            return self.db.read_via_copy(query, (user_id, limit), parse_dates=['trade_date'])
+        return self.db.execute_query(query, (user_id, limit))
     
     def get_trading_statistics(self, user_id):
         """Get user's trading statistics"""
-        stats = {}
-        
-        # Total trades
-        trades = self.db.execute_query("""
+        stats = self.db.execute_query("""
             SELECT COUNT(*) as total_trades,
                    SUM(CASE WHEN action = 'BUY' THEN total_value ELSE 0 END) as total_bought,
                    SUM(CASE WHEN action = 'SELL' THEN total_value ELSE 0 END) as total_sold,
-                   SUM(profit_loss) as total_profit_loss
+                   SUM(profit_loss) as total_profit_loss,
+                   COUNT(CASE WHEN profit_loss > 0 THEN 1 END) as profitable_trades
             FROM trades
             WHERE user_id = %s
-        """, (user_id,))
-        
-        if not trades.empty:
-            stats.update(trades.iloc[0].to_dict())
-        
-        # Win/Loss ratio
-        profitable_trades = self.db.execute_query("""
-            SELECT COUNT(*) as profitable_trades
-            FROM trades
-            WHERE user_id = %s AND profit_loss > 0
-        """, (user_id,))
+        """, (user_id,), as_df=False)
         
-        if not profitable_trades.empty:
-            stats['profitable_trades'] = profitable_trades.iloc[0]['profitable_trades']
-        
-        return stats
+        return dict(stats[0]) if stats else {}
     
     def get_market_trends(self):
         """Get market trends and popular characters"""
-        return self.db.execute_query("""
-            SELECT c.name, c.tier, c.value, c.demand, c.trend,
-                   COUNT(t.trade_id) as trade_count,
-                   SUM(CASE WHEN t.action = 'BUY' THEN t.quantity ELSE 0 END) as buy_volume,
-                   SUM(CASE WHEN t.action = 'SELL' THEN t.quantity ELSE 0 END) as sell_volume
-            FROM characters c
-            LEFT JOIN trades t ON c.name = t.character_name
-                AND t.trade_date >= NOW() - INTERVAL '7 days'
-            GROUP BY c.name, c.tier, c.value, c.demand, c.trend
-            ORDER BY trade_count DESC, c.value DESC
-            LIMIT 20
-        """)
+        return _market_trends(self.db)
     
     def simulate_market_fluctuation(self):
         """Simulate market price fluctuations (for realism)"""
         # This would be called periodically to update character values
         # based on trading activity and demand
-        import random
-        
         characters = self.db.execute_query("SELECT name, value, demand FROM characters")
-        
-        for _, char in characters.iterrows():
-            # Small random fluctuation based on demand
-            base_change = random.uniform(-0.05, 0.05)  # ±5% base change
-            demand_multiplier = char['demand'] / 10  # Higher demand = more volatility
-            
-            change_factor = 1 + (base_change * demand_multiplier)
-            new_value = max(1, int(char['value'] * change_factor))
-            
-            # Update character value
-            self.db.execute_query("""
-                UPDATE characters SET value = %s WHERE name = %s
-            """, (new_value, char['name']), fetch=False)
+        if characters.empty:
+            return
+        
+        # Small random fluctuation based on demand: ±5% base change,
+        # higher demand = more volatility
+        base_change = np.random.uniform(-0.05, 0.05, len(characters))
+        change_factor = 1 + base_change * (characters['demand'].to_numpy() / 10)
+        new_values = np.maximum(1, (characters['value'].to_numpy() * change_factor).astype(int))
+        
+        # Update all character values in one statement
+        self.db.execute_values("""
+            UPDATE characters SET value = v.new_value
+            FROM (VALUES %s) AS v(name, new_value)
+            WHERE characters.name = v.name
+        """, list(zip(characters['name'].tolist(), new_values.tolist())), page_size=len(characters))
     
     def get_portfolio_value(self, user_id):
         """Calculate total portfolio value"""
-        portfolio = self.get_user_portfolio(user_id)
-        total_value = 0
-        
-        for _, item in portfolio.iterrows():
-            current_price = self.db.execute_query("""
-                SELECT value FROM characters WHERE name = %s
-            """, (item['character_name'],))
-            
-            if not current_price.empty:
-                total_value += current_price.iloc[0]['value'] * item['quantity']
-        
-        return total_value
+        total_value = self.db.execute_prepared("trading_portfolio_value", """
+            SELECT SUM(c.value * p.quantity)::bigint
+            FROM portfolios p
+            JOIN characters c ON c.name = p.character_name
+            WHERE p.user_id = %s AND p.quantity > 0
+        """, (user_id,), scalar=True)
+        
+        return total_value or 0